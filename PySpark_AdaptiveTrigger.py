@@ -0,0 +1,205 @@
+from pyspark.sql.types import IntegerType
+import json
+import os
+import time
+
+#-----------------------------------------------------------------------------------------------
+'''
+Adaptive micro-batch sizing for file source Structured Streaming
+----------------------------------------------------------------
+.option("maxFilesPerTrigger",1) + .trigger(processingTime=...) is fixed for the whole life of the
+query:
+- with a backlog of 1000 files we drain ONE file per trigger and fall hours behind
+- with no data we keep firing triggers (listing the directory) for nothing
+
+maxFilesPerTrigger and the trigger interval cannot be changed on a running query in Spark 2.4
+(maxBytesPerTrigger does not exist for the file source in open source Spark either). So the
+controller restarts the query from the SAME checkpoint with new settings - the file source log in
+the checkpoint remembers which files were already processed, nothing is read twice.
+
+How the next setting is chosen (every poll_secs):
+- cost per file  = EWMA of (batch duration / files in that batch)   (from lastProgress + source log)
+- backlog        = files in the directory - files already in the checkpoint's source log
+- files/trigger  = target_latency / cost per file, clamped to [min_files, max_files]
+                   Bytes target: max_bytes / avg file size also caps it (for very uneven files)
+- trigger        = short (min_trigger) while there is backlog, long (idle_trigger) when idle
+- restart only if files/trigger changes by more than 2x or the trigger changes, and not more
+  often than once per cooldown_secs (a restart costs a few seconds)
+
+A restart stops the running batch; it is re-run from the checkpoint, so the sink has to be
+idempotent (console, foreachBatch keyed by batchId, file sink).
+'''
+#-----------------------------------------------------------------------------------------------
+
+
+def _local_path(path):
+    # The source log keeps URIs ("file:/Users/..." or "file:///Users/...")
+    if path.startswith('file:'):
+        path = '/' + path[len('file:'):].lstrip('/')
+    return path
+
+
+def _read_log_entries(path):
+    with open(path) as f:
+        lines = f.read().split('\n')
+    return [json.loads(l) for l in lines[1:] if l.strip()]     # first line is the version "v1"
+
+
+def processed_files(checkpoint_dir):
+    log_dir = os.path.join(checkpoint_dir, 'sources', '0')
+    files = set()
+    if not os.path.isdir(log_dir):
+        return files
+    for name in os.listdir(log_dir):
+        if name.startswith('.') or name.endswith('.tmp'):
+            continue
+        for entry in _read_log_entries(os.path.join(log_dir, name)):
+            files.add(_local_path(entry['path']))
+    return files
+
+
+def files_in_batch(checkpoint_dir, log_offset):
+    log_dir = os.path.join(checkpoint_dir, 'sources', '0')
+    for name in (str(log_offset), str(log_offset) + '.compact'):
+        path = os.path.join(log_dir, name)
+        if os.path.exists(path):
+            # A compact file holds ALL files so far - only the uncompacted file is one batch
+            return None if name.endswith('.compact') else len(_read_log_entries(path))
+    return None
+
+
+def list_source_files(source_dir):
+    files = []
+    for name in os.listdir(source_dir):
+        if name.startswith('.') or name.startswith('_'):
+            continue
+        path = os.path.join(source_dir, name)
+        if os.path.isfile(path):
+            files.append((os.path.abspath(path), os.path.getsize(path)))
+    return files
+
+
+class AdaptiveFileStream(object):
+
+    def __init__(self, start_query, source_dir, checkpoint_dir, target_latency=30, min_files=1,
+                 max_files=1000, max_bytes=None, min_trigger=1, idle_trigger=60, poll_secs=10,
+                 cooldown_secs=60):
+        # start_query(max_files_per_trigger, trigger_secs) -> StreamingQuery
+        self.start_query = start_query
+        self.source_dir = source_dir
+        self.checkpoint_dir = checkpoint_dir
+        self.target_latency = target_latency
+        self.min_files, self.max_files = min_files, max_files
+        self.max_bytes = max_bytes
+        self.min_trigger, self.idle_trigger = min_trigger, idle_trigger
+        self.poll_secs = poll_secs
+        self.cooldown_secs = cooldown_secs
+        self.cost_per_file = None
+        self.files_per_trigger = min_files
+        self.trigger_secs = idle_trigger
+        self.query = None
+        self.last_restart = 0
+        self.seen_batches = set()
+        self.history = []
+
+    def _observe(self):
+        for progress in self.query.recentProgress:
+            if progress['batchId'] in self.seen_batches or not progress.get('numInputRows'):
+                continue
+            self.seen_batches.add(progress['batchId'])
+            end_offset = progress['sources'][0]['endOffset']
+            if isinstance(end_offset, str):
+                end_offset = json.loads(end_offset)
+            n_files = files_in_batch(self.checkpoint_dir, end_offset['logOffset']) or self.files_per_trigger
+            cost = progress['durationMs']['triggerExecution'] / 1000.0 / max(n_files, 1)
+            self.cost_per_file = cost if self.cost_per_file is None else 0.7 * self.cost_per_file + 0.3 * cost
+            self.history.append((progress['batchId'], n_files, progress['numInputRows'],
+                                 progress['durationMs']['triggerExecution']))
+
+    def _decide(self):
+        done = processed_files(self.checkpoint_dir)
+        pending = [(p, size) for p, size in list_source_files(self.source_dir) if p not in done]
+        if not pending:
+            return self.files_per_trigger, self.idle_trigger, 0
+
+        if self.cost_per_file is None:
+            files = self.min_files
+        else:
+            files = int(self.target_latency / max(self.cost_per_file, 1e-3))
+        if self.max_bytes:
+            avg_size = float(sum(size for _, size in pending)) / len(pending)
+            files = min(files, int(self.max_bytes / max(avg_size, 1)))
+        files = max(self.min_files, min(self.max_files, files))
+        return files, self.min_trigger, len(pending)
+
+    def _restart(self, files, trigger_secs):
+        if self.query is not None:
+            self.query.stop()
+        self.files_per_trigger, self.trigger_secs = files, trigger_secs
+        self.query = self.start_query(files, trigger_secs)
+        self.last_restart = time.time()
+
+    def run(self, timeout=None):
+        started = time.time()
+        self._restart(self.files_per_trigger, self.trigger_secs)
+        while timeout is None or time.time() - started < timeout:
+            time.sleep(self.poll_secs)
+            if self.query.exception() is not None:
+                raise self.query.exception()
+            self._observe()
+            files, trigger_secs, backlog = self._decide()
+            big_change = files >= 2 * self.files_per_trigger or files * 2 <= self.files_per_trigger
+            print("backlog {:>6} files | files/trigger {:>5} -> {:>5} | trigger {}s -> {}s | cost/file {}".format(
+                backlog, self.files_per_trigger, files, self.trigger_secs, trigger_secs,
+                None if self.cost_per_file is None else round(self.cost_per_file, 3)))
+            if (big_change or trigger_secs != self.trigger_secs) and \
+                    time.time() - self.last_restart >= self.cooldown_secs:
+                self._restart(files, trigger_secs)
+        self.query.stop()
+
+
+if __name__ == "__main__":
+    from pyspark.sql.types import StructType, StructField, StringType
+    from PySpark_Session import get_session
+
+    spark = get_session('AdaptiveTrigger')
+
+    stream_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/streamFiles/'
+    checkpoint_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/checkPointDir/adaptive'
+
+    carSchema = StructType(
+        [
+            StructField("product_id", IntegerType(), True),
+            StructField("sales_person_id", StringType(), True),
+            StructField("sales_person_name", StringType(), True),
+            StructField("product_name", StringType(), True),
+            StructField("price", StringType(), True),
+            StructField("quantity_sold", IntegerType(), True),
+            StructField("product_make", StringType(), True),
+            StructField("product_color", StringType(), True),
+            StructField("model_year", StringType(), True),
+            StructField("region_sold_in", StringType(), True),
+            StructField("state_sold_in", StringType(), True),
+            StructField("country_sold_in", StringType(), True),
+            StructField("buyer_gender", StringType(), True),
+            StructField("currency", StringType(), True),
+            StructField("credit_card_type", StringType(), True),
+            StructField("Car_VIN", StringType(), True)
+        ]
+    )
+
+    def start_query(max_files, trigger_secs):
+        from pyspark.sql.functions import sum       # local, so the builtin sum() above is not shadowed
+        streamProcessing = spark.readStream.format("csv") \
+                                           .schema(carSchema) \
+                                           .option("maxFilesPerTrigger", max_files) \
+                                           .load(stream_dir)
+        df1 = streamProcessing.select("product_name", "quantity_sold", "model_year", "country_sold_in")
+        df2 = df1.groupBy("product_name", "model_year", "country_sold_in").agg(sum("quantity_sold").alias("tot_qty_sold"))
+        return df2.writeStream.format("console") \
+                              .outputMode("update") \
+                              .option("checkpointLocation", checkpoint_dir) \
+                              .trigger(processingTime='{} seconds'.format(trigger_secs)) \
+                              .start()
+
+    AdaptiveFileStream(start_query, stream_dir, checkpoint_dir, target_latency=20).run()
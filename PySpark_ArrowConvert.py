@@ -0,0 +1,242 @@
+from pyspark.serializers import NoOpSerializer
+from pyspark.sql import DataFrame, Row
+from pyspark.sql.types import TimestampType, StructType, to_arrow_type
+from datetime import datetime
+import calendar
+import os
+import time
+
+#-----------------------------------------------------------------------------------------------
+'''
+Arrow-backed RDD <-> DataFrame conversion
+-----------------------------------------
+inputRdd2 = sc.textFile(emp_file).map(convert_to_list)
+inputDf   = ss.createDataFrame(inputRdd2, schema=schema)           (PySpark_Dataframes.py)
+Every row is turned into its internal form by schema.toInternal, pickled, and unpickled +
+converted to an InternalRow by the JVM - one row at a time, on both sides.
+
+inputDf = arrow_dataframe(ss, inputRdd2, schema)
+- each partition builds Arrow record batches in the Python worker (max_records rows per batch,
+  spark.sql.execution.arrow.maxRecordsPerBatch by default): rows -> columns -> pa.array with the
+  Arrow type of each schema field
+- the batches leave the worker as raw bytes (NoOpSerializer, no pickle) and the JVM reads them
+  as columnar batches (PythonSQLUtils.toDataFrame - the same reader createDataFrame(pandas_df)
+  uses, but fed by an RDD instead of the driver)
+- nothing goes through the driver
+
+The other direction:
+collect_arrow(df) -> pyarrow.Table        collect_rows(df) -> [Row, ...] like df.collect()
+to_pandas(df)     -> pandas.DataFrame       (df.toPandas() with the Arrow path switched on)
+Spark sends Arrow batches to Python instead of pickled rows (df._collectAsArrow()).
+
+Types: numbers, strings, booleans, binary, decimal, date, timestamp (naive datetimes are local
+time, like createDataFrame). Nested types (array/map/struct) are not supported by the Spark 2.4
+Arrow code - use createDataFrame for those.
+
+pyarrow >= 0.15 writes a new IPC format that the Arrow 0.10 reader in Spark 2.4 cannot read, so
+the batches are written with use_legacy_format=True and ARROW_PRE_0_15_IPC_FORMAT=1 is set for
+Spark's own Arrow code (toPandas, pandas_udf).
+'''
+#-----------------------------------------------------------------------------------------------
+
+os.environ.setdefault('ARROW_PRE_0_15_IPC_FORMAT', '1')
+
+
+def _to_utc(value):
+    # naive datetime = local time (TimestampType.toInternal); Arrow timestamps are UTC
+    if value is None or value.tzinfo is not None:
+        return value
+    return datetime.utcfromtimestamp(time.mktime(value.timetuple())).replace(microsecond=value.microsecond)
+
+
+def _from_utc(value):
+    if value is None:
+        return None
+    return datetime.fromtimestamp(calendar.timegm(value.utctimetuple())).replace(microsecond=value.microsecond)
+
+
+def arrow_schema(schema):
+    import pyarrow as pa
+
+    return pa.schema([pa.field(f.name, to_arrow_type(f.dataType), f.nullable) for f in schema.fields])
+
+
+def _batch_bytes(batch, schema_bytes):
+    # Encapsulated record batch message (legacy IPC format) = stream minus schema message and EOS;
+    # schema_bytes must be the length of the schema message of batch.schema
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    writer = pa.RecordBatchStreamWriter(sink, batch.schema, use_legacy_format=True)
+    writer.write_batch(batch)
+    writer.close()
+    return sink.getvalue().to_pybytes()[schema_bytes:-4]
+
+
+def check_batch_bytes(message, schema):
+    # the sliced bytes must read back as a record batch of schema (catches a wrong header length)
+    import pyarrow as pa
+
+    return pa.read_record_batch(pa.py_buffer(message), schema)
+
+
+def _schema_bytes(schema):
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    pa.RecordBatchStreamWriter(sink, schema, use_legacy_format=True).close()
+    return sink.size() - 4
+
+
+def arrow_batches(rows, schema, max_records=10000):
+    # Python side: iterator of rows (tuples/lists/Rows in schema order) -> serialized batches
+    import pyarrow as pa
+
+    target = arrow_schema(schema)
+    header = _schema_bytes(target)
+    timestamps = [i for i, f in enumerate(schema.fields) if isinstance(f.dataType, TimestampType)]
+    chunk, checked = [], False
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == max_records:
+            message = _to_batch(pa, chunk, target, timestamps, header)
+            if not checked:
+                check_batch_bytes(message, target)
+                checked = True
+            yield message
+            chunk = []
+    if chunk:
+        message = _to_batch(pa, chunk, target, timestamps, header)
+        if not checked:
+            check_batch_bytes(message, target)
+        yield message
+
+
+def _to_batch(pa, chunk, target, timestamps, header):
+    columns = [list(c) for c in zip(*chunk)]
+    for i in timestamps:
+        columns[i] = [_to_utc(v) for v in columns[i]]
+    arrays = [pa.array(values, type=field.type) for values, field in zip(columns, target)]
+    # schema=target: the batch carries target's nullability/metadata, so header (computed from
+    # target) is the length of this batch's own schema message
+    return _batch_bytes(pa.RecordBatch.from_arrays(arrays, schema=target), header)
+
+
+#-----------------------------------------------------------------------------------------------
+# RDD -> DataFrame
+#-----------------------------------------------------------------------------------------------
+def arrow_dataframe(ss, rdd, schema, max_records=None):
+    if not isinstance(schema, StructType):
+        raise TypeError('schema must be a StructType, got {}'.format(type(schema).__name__))
+    arrow_schema(schema)        # fail on the driver for types Arrow cannot carry
+    if max_records is None:
+        max_records = int(ss.conf.get('spark.sql.execution.arrow.maxRecordsPerBatch', '10000'))
+
+    batches = rdd.mapPartitions(lambda rows: arrow_batches(rows, schema, max_records))
+    batches._jrdd_deserializer = NoOpSerializer()        # bytes go to the JVM as they are
+    jdf = ss._jvm.PythonSQLUtils.toDataFrame(batches._jrdd, schema.json(), ss._wrapped._jsqlContext)
+    return DataFrame(jdf, ss._wrapped)
+
+
+def arrow_text_dataframe(ss, path, schema, parse, max_records=None):
+    # sc.textFile(path).map(parse) + arrow_dataframe, parse(line) -> tuple in schema order
+    return arrow_dataframe(ss, ss.sparkContext.textFile(path).map(parse), schema, max_records)
+
+
+#-----------------------------------------------------------------------------------------------
+# DataFrame -> Python
+#-----------------------------------------------------------------------------------------------
+def collect_arrow(df):
+    import pyarrow as pa
+
+    batches = df._collectAsArrow()
+    if not batches:
+        return arrow_schema(df.schema).empty_table()
+    return pa.Table.from_batches(batches)
+
+
+def table_rows(table, schema):
+    # pyarrow.Table -> [Row, ...] with the Python types of schema (timestamps back to local time)
+    columns = []
+    for i, field in enumerate(schema.fields):
+        values = table.column(i).to_pylist()
+        if isinstance(field.dataType, TimestampType):
+            values = [_from_utc(v) for v in values]
+        columns.append(values)
+    row = Row(*schema.names)
+    return [row(*values) for values in zip(*columns)]
+
+
+def collect_rows(df):
+    return table_rows(collect_arrow(df), df.schema)
+
+
+def to_pandas(df):
+    ss = df.sql_ctx.sparkSession
+    previous = ss.conf.get('spark.sql.execution.arrow.enabled')
+    ss.conf.set('spark.sql.execution.arrow.enabled', 'true')
+    try:
+        return df.toPandas()
+    finally:
+        ss.conf.set('spark.sql.execution.arrow.enabled', previous)
+
+
+#-----------------------------------------------------------------------------------------------
+# Benchmark against createDataFrame(rdd) / collect()
+#-----------------------------------------------------------------------------------------------
+def _timed(name, fn):
+    start_time = datetime.now()
+    result = fn()
+    print("{:40} {}".format(name, datetime.now() - start_time))
+    return result
+
+
+def benchmark(ss, path, schema, parse, copies=50):
+    sc = ss.sparkContext
+    lines = sc.textFile(path)
+    rows = sc.union([lines] * copies).map(parse).cache()
+    print("Rows in benchmark: ", rows.count())
+
+    pickled = _timed('createDataFrame(rdd) + count', lambda: ss.createDataFrame(rows, schema).count())
+    arrow = _timed('arrow_dataframe(rdd) + count', lambda: arrow_dataframe(ss, rows, schema).count())
+    assert pickled == arrow, (pickled, arrow)
+
+    df = arrow_dataframe(ss, rows, schema).cache()
+    df.count()
+    _timed('collect()', df.collect)
+    _timed('collect_rows() (arrow)', lambda: collect_rows(df))
+    previous = ss.conf.get('spark.sql.execution.arrow.enabled')
+    ss.conf.set('spark.sql.execution.arrow.enabled', 'false')
+    _timed('toPandas() (pickled rows)', df.toPandas)
+    _timed('toPandas() (arrow)', lambda: to_pandas(df))
+    ss.conf.set('spark.sql.execution.arrow.enabled', previous)
+    df.unpersist()
+    rows.unpersist()
+
+
+if __name__ == "__main__":
+    from pyspark.sql.types import StringType, StructField, IntegerType
+    from PySpark_Session import get_session
+
+    ss = get_session('ArrowConvert')
+
+    input_file_csv = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/emp_data.csv'
+    schema = StructType(
+        [
+            StructField("dept_id", IntegerType(), False),
+            StructField("first_name", StringType(), False),
+            StructField("last_name", StringType(), False),
+            StructField("email", StringType(), False),
+            StructField("role", StringType(), False),
+        ]
+    )
+
+    def convert_to_list(x):
+        x = x.split(',')
+        return int(x[0]), x[1], x[2], x[3], x[4]
+
+    inputDf = arrow_text_dataframe(ss, input_file_csv, schema, convert_to_list)
+    inputDf.show()
+    print(collect_rows(inputDf)[:5])
+
+    benchmark(ss, input_file_csv, schema, convert_to_list)
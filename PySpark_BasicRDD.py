@@ -1,7 +1,10 @@
 from pyspark import SparkContext, SparkConf
 
-conf = SparkConf().setMaster('local').setAppName('Intellipaat')
-sc = SparkContext(conf=conf)
+from PySpark_Session import get_context
+
+# conf = SparkConf().setMaster('local').setAppName('Intellipaat')
+# sc = SparkContext(conf=conf)
+sc = get_context('Intellipaat')
 
 
 #-----------------------------------------------------------------------------------------------
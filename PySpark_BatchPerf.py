@@ -4,10 +4,16 @@ import os
 
 # spark-submit
 
-conf = SparkConf()
-sc = SparkContext(conf=conf)
+from PySpark_Session import get_session
+
+# conf = SparkConf()
+# sc = SparkContext(conf=conf)
 # ss = SparkSession.builder.config('spark.sql.shuffle.partitions','4').getOrCreate()
-ss = SparkSession.builder.getOrCreate()
+# Instead of hand-setting 4 (or living with 200): size shuffle partitions per query from the input (PySpark_PartitionPlanner.py)
+# from PySpark_PartitionPlanner import PartitionPlanner; planner = PartitionPlanner(ss); planner.run('query', df, lambda d: d.collect())
+# ss = SparkSession.builder.getOrCreate()
+ss = get_session('BatchPerf')        # under spark-submit --master/--conf still decide
+sc = ss.sparkContext
 
 '''
 Submit the application using spark-submit --master local PySpark_BatchPerf.py
@@ -145,6 +151,12 @@ carDf = ss.read.format('json').option('inferSchema','true').load(car_file)
 # #
 # # # df5.explain(True)
 # #
+# # Spill / GC / peak execution memory per stage + driver JVM heap (PySpark_JobProfiler.py):
+# # from PySpark_JobProfiler import JobProfiler, maybe_profile
+# # with JobProfiler(ss, report_dir='<dir>').profile('demo4'):     # or maybe_profile(ss, 'demo4') + PYSPARK_PROFILE_JOBS=1
+# #     df7.show()
+# # -> <dir>/demo4-<ts>.profile.json/.txt (with output_path=<write dir> the report goes into that dir as _profile.*)
+# #
 # end_time = datetime.now()
 # print("total time taken: ",end_time - start_time)
 
@@ -0,0 +1,213 @@
+from pyspark.sql.functions import col, sum
+import json
+import os
+import shutil
+import threading
+
+#-----------------------------------------------------------------------------------------------
+'''
+Idempotent foreachBatch Parquet sink with background compaction
+---------------------------------------------------------------
+writeStream.foreachBatch(<func(batchDf, batchId)>) hands every micro-batch to normal batch code.
+
+Layout under <out>:
+  batch=00000007/<partition cols>/part-*.parquet          one micro-batch
+  batch=00000000-00000006/<partition cols>/part-*.parquet merged by the compactor
+  _manifest.json                                         the directories readers should see
+  _commits/<batchId>                                     batch fully written
+
+Exactly once on replays: after a failure Spark re-runs the last batch with the SAME batchId.
+- If _commits/<batchId> exists the batch is skipped.
+- Otherwise batch=<batchId> is written with mode('overwrite'), so a half written attempt is
+  simply replaced, then the manifest and LAST the commit marker are written. A crash between the
+  two re-runs the batch: same directory, same manifest entry - nothing is skipped or doubled.
+
+Compaction: a background thread merges committed directories into one with fewer, bigger files:
+- compact_min_batches single batches -> one range directory
+- compact_min_batches range directories -> one bigger range directory (the oldest history is
+  rewritten once every compact_min_batches compactions), so the directory/file count stays
+  bounded (< 2 x compact_min_batches directories) however long the query runs
+The new directory replaces the old ones in the manifest with one atomic rename, then the old
+directories are deleted. A merged directory left behind by a crash before its manifest update is
+simply replaced by the next attempt. Readers that go through read_sink() never see a batch twice
+or miss one.
+
+Local / mounted file systems only (uses os.rename for the manifest).
+'''
+#-----------------------------------------------------------------------------------------------
+
+MANIFEST = '_manifest.json'
+COMMITS = '_commits'
+
+
+def _batch_dir(first, last=None):
+    if last is None or last == first:
+        return 'batch={:08d}'.format(first)
+    return 'batch={:08d}-{:08d}'.format(first, last)
+
+
+def _batch_range(name):
+    ids = name[len('batch='):].split('-')
+    return int(ids[0]), int(ids[-1])
+
+
+def read_manifest(out_path):
+    path = os.path.join(out_path, MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+class ParquetBatchSink(object):
+
+    def __init__(self, out_path, partition_cols=None, files_per_batch=1, compact_min_batches=10,
+                 compact_files=None, compact_interval=60):
+        self.out_path = out_path
+        self.partition_cols = partition_cols or []
+        self.files_per_batch = files_per_batch
+        self.compact_min_batches = compact_min_batches
+        self.compact_files = compact_files
+        self.compact_interval = compact_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        for d in (out_path, os.path.join(out_path, COMMITS)):
+            if not os.path.isdir(d):
+                os.makedirs(d)
+
+    #-------------------------------------------------------------------------------------------
+    # Manifest and commit log
+    #-------------------------------------------------------------------------------------------
+    def read_manifest(self):
+        return read_manifest(self.out_path)
+
+    def _write_manifest(self, dirs):
+        path = os.path.join(self.out_path, MANIFEST)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(sorted(dirs), f)
+        os.rename(path + '.tmp', path)
+
+    def is_committed(self, batch_id):
+        return os.path.exists(os.path.join(self.out_path, COMMITS, str(batch_id)))
+
+    #-------------------------------------------------------------------------------------------
+    # foreachBatch function
+    #-------------------------------------------------------------------------------------------
+    def __call__(self, df, batch_id):
+        if self.is_committed(batch_id):
+            print("batch {} already committed - skipped (replay)".format(batch_id))
+            return
+        target = os.path.join(self.out_path, _batch_dir(batch_id))
+        writer = df.coalesce(self.files_per_batch).write.format('parquet').mode('overwrite')
+        if self.partition_cols:
+            writer = writer.partitionBy(*self.partition_cols)
+        writer.save(target)
+
+        with self._lock:
+            self._write_manifest(set(self.read_manifest()) | {_batch_dir(batch_id)})
+            open(os.path.join(self.out_path, COMMITS, str(batch_id)), 'w').close()
+
+    #-------------------------------------------------------------------------------------------
+    # Compaction
+    #-------------------------------------------------------------------------------------------
+    def _committed(self, d):
+        first, last = _batch_range(d)
+        return all(self.is_committed(b) for b in (first, last))
+
+    def _compaction_group(self, live):
+        # committed single batches first, then range directories once there are enough of them
+        committed = [d for d in live if self._committed(d)]
+        singles = sorted((d for d in committed if '-' not in d), key=_batch_range)
+        if len(singles) >= self.compact_min_batches:
+            return singles
+        ranges = sorted((d for d in committed if '-' in d), key=_batch_range)
+        if len(ranges) >= self.compact_min_batches:
+            return ranges
+        return None
+
+    def compact_once(self, ss):
+        with self._lock:
+            live = self.read_manifest()
+        group = self._compaction_group(live)
+        if group is None:
+            return None
+
+        first, last = _batch_range(group[0])[0], _batch_range(group[-1])[1]
+        name = _batch_dir(first, last)
+        paths = [os.path.join(self.out_path, d) for d in group]
+        merged = ss.read.format('parquet').load(*paths)
+        if self.partition_cols:
+            merged = merged.repartition(self.compact_files or 1, *self.partition_cols)
+        else:
+            merged = merged.coalesce(self.compact_files or 1)
+
+        tmp = os.path.join(self.out_path, '_tmp_' + name)
+        writer = merged.write.format('parquet').mode('overwrite')
+        if self.partition_cols:
+            writer = writer.partitionBy(*self.partition_cols)
+        writer.save(tmp)
+        target = os.path.join(self.out_path, name)
+        if os.path.exists(target) and name not in live:
+            shutil.rmtree(target)       # left over by a crash before the manifest update
+        os.rename(tmp, target)
+
+        with self._lock:
+            current = set(self.read_manifest())
+            self._write_manifest((current - set(group)) | {name})
+        for d in group:
+            shutil.rmtree(os.path.join(self.out_path, d), ignore_errors=True)
+        print("compacted {} directories into {}".format(len(group), name))
+        return name
+
+    def start_compactor(self, ss):
+        def loop():
+            while not self._stop.wait(self.compact_interval):
+                try:
+                    self.compact_once(ss)
+                except Exception as e:      # keep the sink running, try again next interval
+                    print("compaction failed: {}".format(e))
+
+        self._thread = threading.Thread(target=loop, name='parquet-sink-compactor')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def read_sink(ss, out_path):
+    dirs = read_manifest(out_path)
+    if not dirs:
+        return None
+    return ss.read.format('parquet').option('basePath', out_path) \
+             .load(*[os.path.join(out_path, d) for d in dirs])
+
+
+if __name__ == "__main__":
+    from PySpark_StockParsing import stock_csv_schema
+    from PySpark_Session import get_session
+
+    spark = get_session('BatchSink')
+
+    stock_json = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/streaming-stock-data-json/'
+    out_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/OutputFile/stock_units_sink'
+    checkpoint_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/checkPointDir/stock_units_sink'
+
+    fileStreaming = spark.readStream.format("json").schema(stock_csv_schema).option("maxFilesPerTrigger", 1).load(stock_json)
+    df1 = fileStreaming.groupBy('ticker').agg(sum('units_bought').alias('units_bought'), sum('units_sold').alias('units_sold')) \
+                       .withColumn('ticker_initial', col('ticker').substr(1, 1))
+
+    sink = ParquetBatchSink(out_dir, partition_cols=['ticker_initial'], compact_min_batches=5, compact_interval=30)
+    sink.start_compactor(spark)
+    query = df1.writeStream.foreachBatch(sink) \
+                           .outputMode("update") \
+                           .option("checkpointLocation", checkpoint_dir) \
+                           .trigger(processingTime="10 seconds") \
+                           .start()
+    query.awaitTermination(300)
+    query.stop()
+    sink.stop()
+    read_sink(spark, out_dir).groupBy('batch').count().show()
@@ -0,0 +1,232 @@
+from pyspark.sql.functions import col, input_file_name
+import hashlib
+import math
+import os
+import struct
+from urllib.parse import unquote
+
+#-----------------------------------------------------------------------------------------------
+'''
+Bloom Filter Sidecar Index for point lookups
+--------------------------------------------
+A lookup on one Car_VIN or one sales_person_id (PairRDD QNS 13 uses rdd.lookup()) has to open
+every file of the dataset. A Bloom filter is a small bit array that answers "is this key maybe in
+the file?" with no false negatives and a configurable false positive rate (fpp).
+
+- write_with_bloom_index(df, path, columns) > writes Parquet as usual, then builds one Bloom
+                                              filter per data file per column and stores it under
+                                              <path>/_bloom_index/<column>/<data file path
+                                              relative to path>.bloom (partition dirs kept:
+                                              country=US/part-00000... and country=JP/part-00000...
+                                              are different sidecars)
+- BloomIndex(path).candidate_files(column, key) > only the files that MIGHT contain the key
+- lookup(ss, path, column, key)  > reads ONLY the candidate files and filters on the key
+                                   (an empty DataFrame with the table schema when none match)
+
+Data files without a sidecar (appended after the index was built) are always candidates - they
+cost a read, but never hide a key. Run build_bloom_index() again to index them.
+
+Files/directories starting with "_" are ignored by the Parquet reader, so the sidecars never
+show up in ss.read.parquet(path).
+
+Sizing: bits per file  m = -n * ln(fpp) / (ln 2)^2
+        hash functions k = m / n * ln 2
+'''
+#-----------------------------------------------------------------------------------------------
+
+INDEX_DIR = '_bloom_index'
+HEADER = struct.Struct('>QI')       # no. of bits, no. of hash functions
+
+
+class BloomFilter(object):
+
+    def __init__(self, expected_items, fpp=0.01, num_bits=None, num_hashes=None, bits=None):
+        expected_items = max(int(expected_items), 1)
+        if num_bits is None:
+            num_bits = int(math.ceil(-expected_items * math.log(fpp) / (math.log(2) ** 2)))
+            num_bits = max(num_bits, 64)
+        if num_hashes is None:
+            num_hashes = max(int(round(float(num_bits) / expected_items * math.log(2))), 1)
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+
+    # Python's hash() is salted per process, so use md5 to get the same bits on every executor.
+    # Two 64 bit halves are combined as h1 + i*h2 (double hashing) to get k positions.
+    def _positions(self, key):
+        digest = hashlib.md5(str(key).encode('utf-8')).digest()
+        h1, h2 = struct.unpack('>QQ', digest)
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        return self
+
+    def might_contain(self, key):
+        for pos in self._positions(key):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def merge(self, other):
+        if (self.num_bits, self.num_hashes) != (other.num_bits, other.num_hashes):
+            raise ValueError('Cannot merge Bloom filters of different sizes')
+        for i in range(len(self.bits)):
+            self.bits[i] |= other.bits[i]
+        return self
+
+    def to_bytes(self):
+        return HEADER.pack(self.num_bits, self.num_hashes) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        num_bits, num_hashes = HEADER.unpack_from(data)
+        return cls(1, num_bits=num_bits, num_hashes=num_hashes, bits=bytearray(data[HEADER.size:]))
+
+
+#-----------------------------------------------------------------------------------------------
+# Build the index at write time
+#-----------------------------------------------------------------------------------------------
+def _local_path(path):
+    return path[len('file://'):] if path.startswith('file://') else path
+
+
+def build_bloom_index(ss, path, columns, fpp=0.01):
+    df = ss.read.parquet(path).select(input_file_name().alias('_file'), *columns)
+
+    # Items per file decide the size of each filter - small files get small filters
+    file_counts = dict((r['_file'], r['count']) for r in df.groupBy('_file').count().collect())
+    counts = ss.sparkContext.broadcast(file_counts)
+
+    def build_partition(rows):
+        filters = {}
+        for row in rows:
+            for c in columns:
+                value = row[c]
+                if value is None:
+                    continue
+                key = (row['_file'], c)
+                if key not in filters:
+                    filters[key] = BloomFilter(counts.value[row['_file']], fpp)
+                filters[key].add(value)
+        return iter(filters.items())
+
+    # One partial filter per (file, column) per partition, OR-ed together by reduceByKey
+    merged = df.rdd.mapPartitions(build_partition) \
+                   .reduceByKey(lambda x, y: x.merge(y)) \
+                   .collect()
+
+    root = _local_path(path)
+    index_root = os.path.join(root, INDEX_DIR)
+    for (data_file, c), bloom in merged:
+        # input_file_name() is a URI - %-escaped, the walk in BloomIndex sees the decoded names
+        sidecar = os.path.join(index_root, c, os.path.relpath(unquote(_local_path(data_file)), root) + '.bloom')
+        if not os.path.isdir(os.path.dirname(sidecar)):
+            os.makedirs(os.path.dirname(sidecar))
+        with open(sidecar, 'wb') as f:
+            f.write(bloom.to_bytes())
+    counts.unpersist()
+    return len(merged)
+
+
+def write_with_bloom_index(df, path, columns, mode='overwrite', fpp=0.01, partitions=None):
+    if partitions is not None:
+        df = df.repartition(partitions)
+    df.write.format('parquet').mode(mode).save(path)
+    return build_bloom_index(df.sql_ctx.sparkSession, path, columns, fpp)
+
+
+#-----------------------------------------------------------------------------------------------
+# Use the index at read time
+#-----------------------------------------------------------------------------------------------
+class BloomIndex(object):
+
+    def __init__(self, path):
+        self.path = _local_path(path)
+        self._filters = {}
+
+    def _load(self, column):
+        if column not in self._filters:
+            column_dir = os.path.join(self.path, INDEX_DIR, column)
+            if not os.path.isdir(column_dir):
+                raise ValueError('No Bloom index for column {} under {}'.format(column, self.path))
+            filters = {}
+            for root, dirs, names in os.walk(column_dir):
+                for name in names:
+                    if name.endswith('.bloom'):
+                        sidecar = os.path.join(root, name)
+                        with open(sidecar, 'rb') as f:
+                            filters[os.path.relpath(sidecar, column_dir)[:-len('.bloom')]] = BloomFilter.from_bytes(f.read())
+            self._filters[column] = filters
+        return self._filters[column]
+
+    def data_files(self):
+        # {path relative to the table root: path} of every data file, skipping _/. files and
+        # dirs like the reader
+        files = {}
+        for root, dirs, names in os.walk(self.path):
+            dirs[:] = [d for d in dirs if not d.startswith(('_', '.'))]
+            for name in names:
+                if not name.startswith(('_', '.')):
+                    full = os.path.join(root, name)
+                    files[os.path.relpath(full, self.path)] = full
+        return files
+
+    def candidate_files(self, column, key):
+        filters = self._load(column)
+        return sorted(path for name, path in self.data_files().items()
+                      if name not in filters or filters[name].might_contain(key))
+
+    def total_files(self):
+        return len(self.data_files())
+
+
+def lookup(ss, path, column, key, index=None):
+    index = index or BloomIndex(path)
+    files = index.candidate_files(column, key)
+    if not files:
+        return ss.createDataFrame(ss.sparkContext.emptyRDD(), ss.read.parquet(path).schema)
+    return ss.read.parquet(*files).filter(col(column) == key)
+
+
+if __name__ == "__main__":
+    from datetime import datetime
+    from pyspark.sql.types import StructType, StructField, IntegerType, StringType
+    from PySpark_Session import get_session
+
+    ss = get_session('BloomIndex')
+
+    car_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/car_sales_data.csv'
+    out_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/OutputFile/car_sales_bloom'
+
+    carSchema = StructType(
+        [
+            StructField("product_id", IntegerType(), True),
+            StructField("sales_person_id", StringType(), True),
+            StructField("sales_person_name", StringType(), True),
+            StructField("product_name", StringType(), True),
+            StructField("price", StringType(), True),
+            StructField("quantity_sold", IntegerType(), True),
+            StructField("product_make", StringType(), True),
+            StructField("product_color", StringType(), True),
+            StructField("model_year", StringType(), True),
+            StructField("region_sold_in", StringType(), True),
+            StructField("state_sold_in", StringType(), True),
+            StructField("country_sold_in", StringType(), True),
+            StructField("buyer_gender", StringType(), True),
+            StructField("currency", StringType(), True),
+            StructField("credit_card_type", StringType(), True),
+            StructField("Car_VIN", StringType(), True)
+        ]
+    )
+    carDf = ss.read.format('csv').schema(carSchema).load(car_file)
+    write_with_bloom_index(carDf, out_file, ['Car_VIN', 'sales_person_id'], partitions=16)
+
+    index = BloomIndex(out_file)
+    start_time = datetime.now()
+    files = index.candidate_files('sales_person_id', '845774333-3')
+    print("files to open: {} of {} ({})".format(len(files), index.total_files(),
+                                                 datetime.now() - start_time))
+    lookup(ss, out_file, 'sales_person_id', '845774333-3', index).show()
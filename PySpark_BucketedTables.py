@@ -0,0 +1,155 @@
+from pyspark.sql.types import StructType, StructField, IntegerType, StringType
+from PySpark_ConcurrentQueries import finished_stage_attempts
+
+#-----------------------------------------------------------------------------------------------
+'''
+Bucketed table layout and bucket-aware joins
+--------------------------------------------
+df.write.format().bucketBy(<no. of buckets>,<list of cols>).sortBy(<cols>).saveAsTable(<table>)
+
+Bucketing hashes the rows on the bucket columns ONCE at write time and stores bucket N of every
+table in file(s) named ..._0000N. When two tables are bucketed on the join keys with the SAME no.
+of buckets, a sort merge join reads bucket N of both sides in the same task - no Exchange
+(shuffle) is needed on either side. sortBy() also lets Spark skip the Sort if each bucket is one
+file.
+
+Rules to get a join without Exchange:
+- Both sides bucketed on exactly the join columns, same no. of buckets, same column types
+- spark.sql.sources.bucketing.enabled=true (default)
+- Only works with saveAsTable() - bucket info lives in the metastore, not in the files
+  (use enableHiveSupport() so the tables survive the session)
+
+Datasets published here:
+- emp / dept                > bucketed on dept_id
+- inspections / violations  > bucketed on location_id, date
+'''
+#-----------------------------------------------------------------------------------------------
+
+emp_schema = StructType(
+    [
+        StructField('dept_id', IntegerType(), True),
+        StructField('first_name', StringType(), True),
+        StructField('last_name', StringType(), True),
+        StructField('email', StringType(), True),
+        StructField('role', StringType(), True)
+    ]
+)
+
+dept_schema = StructType(
+    [
+        StructField('dept_id', IntegerType(), True),
+        StructField('duns_number', StringType(), True),
+        StructField('dept_name', StringType(), True),
+        StructField('caption', StringType(), True)
+    ]
+)
+
+inspection_schema = StructType(
+    [
+        StructField('location_id', IntegerType(), True),
+        StructField('inspection_id', IntegerType(), True),
+        StructField('inspection_date', StringType(), True),
+        StructField('description', StringType(), True),
+    ]
+)
+
+violations_schema = StructType(
+    [
+        StructField('location_id', IntegerType(), True),
+        StructField('violation_date', StringType(), True),
+        StructField('violation_code', IntegerType(), True),
+        StructField('violation_category', StringType(), True),
+        StructField('violation_desc', StringType(), True)
+    ]
+)
+
+
+def publish_bucketed(df, table, bucket_cols, num_buckets, sort_cols=None, fmt='parquet'):
+    # repartition on the bucket columns first so each task writes ONE file per bucket
+    writer = df.repartition(num_buckets, *bucket_cols).write.format(fmt).mode('overwrite')
+    writer = writer.bucketBy(num_buckets, *bucket_cols).sortBy(*(sort_cols or bucket_cols))
+    writer.saveAsTable(table)
+
+
+def publish_join_tables(ss, sample_dir, database='bucketdb', num_buckets=8):
+    ss.sql("create database if not exists {}".format(database))
+
+    empDf = ss.read.format('csv').option('header', 'true').schema(emp_schema).load(sample_dir + '/emp_data_ORIG.csv')
+    deptDf = ss.read.format('csv').option('header', 'true').schema(dept_schema).load(sample_dir + '/dept_data.csv')
+    publish_bucketed(empDf, database + '.emp', ['dept_id'], num_buckets)
+    publish_bucketed(deptDf, database + '.dept', ['dept_id'], num_buckets)
+
+    inspectionDf = ss.read.format('csv').schema(inspection_schema).load(sample_dir + '/inspections_plus.csv') \
+                     .withColumnRenamed('inspection_date', 'date')
+    violationsDf = ss.read.format('csv').schema(violations_schema).load(sample_dir + '/violations_plus.csv') \
+                     .withColumnRenamed('violation_date', 'date')
+    publish_bucketed(inspectionDf, database + '.inspections', ['location_id', 'date'], num_buckets)
+    publish_bucketed(violationsDf, database + '.violations', ['location_id', 'date'], num_buckets)
+
+
+#-----------------------------------------------------------------------------------------------
+# Plan check and shuffle measurement
+#-----------------------------------------------------------------------------------------------
+def executed_plan(df):
+    return df._jdf.queryExecution().executedPlan().toString()
+
+
+def has_shuffle(df):
+    # BroadcastExchange is not a shuffle, only "Exchange hashpartitioning/rangepartitioning" is
+    return any(line.strip().lstrip('+- :').startswith('Exchange ')
+               for line in executed_plan(df).split('\n'))
+
+
+def shuffle_write_bytes(sc, job_group):
+    # Stage metrics from the UI REST API (driver UI must be enabled - it is by default), once
+    # every stage of the group is finished; skipped stages (output reused) are never submitted
+    return sum(attempt.get('shuffleWriteBytes', 0) for attempt in finished_stage_attempts(sc, job_group))
+
+
+def measure_join(ss, left, right, keys, label):
+    sc = ss.sparkContext
+    sc.setJobGroup(label, label)
+    left.join(right, keys, 'inner').count()
+    shuffled = shuffle_write_bytes(sc, label)
+    sc.setLocalProperty('spark.jobGroup.id', None)
+    return shuffled
+
+
+def compare_joins(ss, sample_dir, database='bucketdb'):
+    # Without this the small dept table is broadcast and the comparison means nothing
+    ss.conf.set('spark.sql.autoBroadcastJoinThreshold', -1)
+
+    cases = [
+        ('emp-dept', ['dept_id'],
+         ss.read.format('csv').option('header', 'true').schema(emp_schema).load(sample_dir + '/emp_data_ORIG.csv'),
+         ss.read.format('csv').option('header', 'true').schema(dept_schema).load(sample_dir + '/dept_data.csv'),
+         ss.table(database + '.emp'), ss.table(database + '.dept')),
+        ('inspections-violations', ['location_id', 'date'],
+         ss.read.format('csv').schema(inspection_schema).load(sample_dir + '/inspections_plus.csv')
+           .withColumnRenamed('inspection_date', 'date'),
+         ss.read.format('csv').schema(violations_schema).load(sample_dir + '/violations_plus.csv')
+           .withColumnRenamed('violation_date', 'date'),
+         ss.table(database + '.inspections'), ss.table(database + '.violations')),
+    ]
+
+    for name, keys, raw_left, raw_right, bucket_left, bucket_right in cases:
+        bucketed_join = bucket_left.join(bucket_right, keys, 'inner')
+        if has_shuffle(bucketed_join):
+            print("WARNING: {} still plans an Exchange:\n{}".format(name, executed_plan(bucketed_join)))
+        raw_bytes = measure_join(ss, raw_left, raw_right, keys, name + '-raw')
+        bucket_bytes = measure_join(ss, bucket_left, bucket_right, keys, name + '-bucketed')
+        print("{:25} shuffle bytes raw: {:>12,}  bucketed: {:>12,}  saved: {:>12,}".format(
+            name, raw_bytes, bucket_bytes, raw_bytes - bucket_bytes))
+
+
+if __name__ == "__main__":
+    from PySpark_Session import get_session
+
+    ss = get_session('BucketedTables', hive=True)
+
+    sample_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata'
+
+    publish_join_tables(ss, sample_dir)
+    compare_joins(ss, sample_dir)
+
+    ss.table('bucketdb.emp').join(ss.table('bucketdb.dept'), ['dept_id'], 'inner').explain()
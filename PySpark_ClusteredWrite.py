@@ -0,0 +1,157 @@
+from pyspark.sql.functions import col, least, lit, shiftLeft, shiftRight
+from pyspark.ml.feature import Bucketizer
+import glob
+import os
+
+#-----------------------------------------------------------------------------------------------
+'''
+Clustered writes - Linear sort and Z-order
+------------------------------------------
+Parquet keeps min/max statistics per file and per row group. A filter like
+quantity_sold > 100000 can skip a row group only when its whole [min, max] range is outside the
+predicate. Rows written in arbitrary order give every row group nearly the full range, so
+nothing is skipped.
+
+- mode='linear' > repartitionByRange(<files>, cols) + sortWithinPartitions(cols)
+                  Best when filters are mostly on the FIRST column.
+- mode='zorder' > Each column is mapped to its quantile bucket (0 .. 2^bits-1) and the bucket
+                  bits are interleaved into one z-value (c1 bit0, c2 bit0, c1 bit1, c2 bit1 ...).
+                  Rows are range partitioned and sorted on the z-value, so ranges stay fairly
+                  tight on EVERY clustered column, not just the first.
+
+Z-order columns must be numeric (cast strings such as model_year before clustering).
+Use row_group_bytes to get more (smaller) row groups so the effect is visible on small files.
+'''
+#-----------------------------------------------------------------------------------------------
+
+ZVALUE_COL = '_zvalue'
+
+
+def _bucket_col(c):
+    return '_zbucket_' + c
+
+
+def add_zvalue(df, columns, bits=8, relative_error=0.001):
+    # Quantile boundaries make the buckets equally populated, even for skewed columns
+    quantiles = [float(i) / (2 ** bits) for i in range(1, 2 ** bits)]
+    cast_df = df
+    for c in columns:
+        cast_df = cast_df.withColumn(_bucket_col(c), col(c).cast('double'))
+    boundaries = cast_df.approxQuantile([_bucket_col(c) for c in columns], quantiles, relative_error)
+
+    top_bucket = 2 ** bits - 1
+    for c, bounds in zip(columns, boundaries):
+        if not bounds:
+            # all values null - no quantiles, Bucketizer needs at least 3 splits
+            cast_df = cast_df.withColumn(_bucket_col(c), lit(0).cast('long'))
+            continue
+        splits = [float('-inf')] + sorted(set(bounds)) + [float('inf')]
+        bucketizer = Bucketizer(splits=splits, inputCol=_bucket_col(c), outputCol=_bucket_col(c) + '_idx',
+                                handleInvalid='keep')
+        # 'keep' puts nulls in one extra bucket (len(splits) - 1), which can be 2^bits - clamp it
+        cast_df = bucketizer.transform(cast_df) \
+                            .drop(_bucket_col(c)) \
+                            .withColumnRenamed(_bucket_col(c) + '_idx', _bucket_col(c)) \
+                            .withColumn(_bucket_col(c), least(col(_bucket_col(c)).cast('long'), lit(top_bucket)))
+
+    # Interleave bits: bit b of column i lands at position b * n + i
+    n = len(columns)
+    zvalue = lit(0).cast('long')
+    for b in range(bits):
+        for i, c in enumerate(columns):
+            bit = shiftRight(col(_bucket_col(c)), b).bitwiseAND(1)
+            zvalue = zvalue.bitwiseOR(shiftLeft(bit, b * n + i))
+
+    cast_df = cast_df.withColumn(ZVALUE_COL, zvalue)
+    return cast_df.drop(*[_bucket_col(c) for c in columns])
+
+
+def cluster(df, columns, mode='zorder', num_files=None, bits=8):
+    if isinstance(columns, str):
+        columns = [columns]
+    num_files = num_files or df.rdd.getNumPartitions()
+
+    if mode == 'linear':
+        return df.repartitionByRange(num_files, *columns).sortWithinPartitions(*columns)
+    elif mode == 'zorder':
+        if len(columns) == 1:
+            return cluster(df, columns, 'linear', num_files)
+        zdf = add_zvalue(df, columns, bits)
+        return zdf.repartitionByRange(num_files, ZVALUE_COL) \
+                  .sortWithinPartitions(ZVALUE_COL) \
+                  .drop(ZVALUE_COL)
+    else:
+        raise ValueError("mode should be 'linear' or 'zorder', got {}".format(mode))
+
+
+def write_clustered(df, path, columns, mode='zorder', num_files=None, row_group_bytes=None,
+                    write_mode='overwrite', bits=8):
+    writer = cluster(df, columns, mode, num_files, bits).write.format('parquet').mode(write_mode)
+    if row_group_bytes:
+        writer = writer.option('parquet.block.size', row_group_bytes)
+    writer.save(path)
+
+
+#-----------------------------------------------------------------------------------------------
+# Benchmark - count row groups that Parquet statistics allow the reader to skip
+# predicate = (column, low, high) meaning low <= column <= high (None for open ended)
+#-----------------------------------------------------------------------------------------------
+def _overlaps(stats_min, stats_max, low, high):
+    if low is not None and stats_max < low:
+        return False
+    if high is not None and stats_min > high:
+        return False
+    return True
+
+
+def row_groups_skipped(path, predicates):
+    import pyarrow.parquet as pq
+
+    total, skipped = 0, 0
+    for f in sorted(glob.glob(os.path.join(path, '**', 'part-*.parquet'), recursive=True)):
+        meta = pq.ParquetFile(f).metadata
+        names = [meta.schema.column(j).name for j in range(meta.num_columns)]
+        for i in range(meta.num_row_groups):
+            row_group = meta.row_group(i)
+            total += 1
+            for c, low, high in predicates:
+                stats = row_group.column(names.index(c)).statistics
+                if stats is not None and stats.has_min_max and \
+                        not _overlaps(stats.min, stats.max, low, high):
+                    skipped += 1
+                    break
+    return skipped, total
+
+
+def benchmark(df, base_path, columns, predicates, num_files=8, row_group_bytes=64 * 1024):
+    results = []
+    for mode in ['none', 'linear', 'zorder']:
+        path = os.path.join(base_path, 'clustered_' + mode)
+        if mode == 'none':
+            writer = df.repartition(num_files).write.format('parquet').mode('overwrite')
+            writer.option('parquet.block.size', row_group_bytes).save(path)
+        else:
+            write_clustered(df, path, columns, mode, num_files, row_group_bytes)
+        for predicate in predicates:
+            skipped, total = row_groups_skipped(path, [predicate])
+            results.append((mode, predicate, skipped, total))
+            print("{:7} {:45} skipped {:4} of {:4} row groups".format(mode, str(predicate), skipped, total))
+    return results
+
+
+if __name__ == "__main__":
+    from PySpark_Session import get_session
+
+    ss = get_session('ClusteredWrite')
+
+    car_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/car_sales_data.json'
+    out_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/OutputFile'
+
+    carDf = ss.read.format('json').option('inferSchema', 'true').load(car_file) \
+              .withColumn('model_year', col('model_year').cast('int'))
+
+    # Typical predicates from PySpark_WriteAPIs.py and BatchPerf Demo 1
+    benchmark(carDf, out_dir, ['quantity_sold', 'model_year'],
+              [('quantity_sold', 100001, None),
+               ('model_year', 2001, None),
+               ('model_year', 2000, 2010)])
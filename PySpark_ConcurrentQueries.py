@@ -0,0 +1,219 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import urlopen
+import json
+import time
+import traceback
+
+#-----------------------------------------------------------------------------------------------
+'''
+Concurrent SQL workload runner with FAIR scheduler pools
+--------------------------------------------------------
+The analyses in PySpark_SQL.py / PySpark_Dataframes.py are independent, but run one after the
+other, and with the default FIFO scheduler a small query also waits behind a big one when they
+ARE submitted together.
+
+FAIR scheduling: spark.scheduler.mode=FAIR + spark.scheduler.allocation.file (pools, weight,
+minShare). A thread picks its pool with sc.setLocalProperty('spark.scheduler.pool', <pool>).
+Both confs are read when the SparkContext starts - use fair_session() before anything else
+creates the session (a FIFO session only prints a warning).
+
+pools   = {'interactive': {'weight': 3, 'minShare': 2}, 'batch': {'weight': 1}}
+queries = [Query('top_sales', "select ... from car_table where quantity_sold > 100000", 'interactive'),
+           Query('by_country', lambda ss: ss.table('car_table').groupBy('country_sold_in').count().collect(), 'batch')]
+ss = fair_session('Workload', pools, '/tmp/fairscheduler.xml')
+compare(ss, queries, max_workers=4)
+
+A query is SQL text (collected) or a function(ss). compare() runs the workload once unmeasured
+(warm-up: file listing, JIT, page cache - otherwise the serial run pays for them and the
+concurrent run looks faster than it is), then serially (FIFO order, one at a time) and then
+concurrently from a thread pool, and reports, per query, latency in both runs and the pool its
+stages really ran in, plus:
+- wall time of both runs
+- utilization = task time of all executors / (wall time x total cores), from the REST API
+
+Limitation: PySpark 2.4 does not pin a Python thread to one JVM thread, so a local property set
+in one Python thread can end up on a JVM thread another query uses (and a later action of the
+same query can run on a JVM thread without it). The runner sets the group and pool once per
+query, right before the action for SQL text, but cannot guarantee them - a function(ss) with
+several actions is the most exposed. Each query's report lists the pools its stages really
+ran in, so a misplaced query is visible rather than silently wrong.
+'''
+#-----------------------------------------------------------------------------------------------
+
+Query = namedtuple('Query', ['name', 'query', 'pool'])
+
+
+def write_allocation_file(pools, path):
+    lines = ['<?xml version="1.0"?>', '<allocations>']
+    for name, settings in sorted(pools.items()):
+        lines.append('  <pool name="{}">'.format(name))
+        lines.append('    <schedulingMode>{}</schedulingMode>'.format(settings.get('schedulingMode', 'FAIR')))
+        lines.append('    <weight>{}</weight>'.format(settings.get('weight', 1)))
+        lines.append('    <minShare>{}</minShare>'.format(settings.get('minShare', 0)))
+        lines.append('  </pool>')
+    lines.append('</allocations>')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
+
+
+def fair_session(app_name, pools, allocation_file, hive=False):
+    from PySpark_Session import get_session
+
+    write_allocation_file(pools, allocation_file)
+    ss = get_session(app_name, hive=hive, conf={'spark.scheduler.mode': 'FAIR',
+                                                'spark.scheduler.allocation.file': allocation_file})
+    if ss.sparkContext.getConf().get('spark.scheduler.mode', 'FIFO') != 'FAIR':
+        print("WARNING: session was started before fair_session() - scheduler is FIFO, pools have no effect")
+    return ss
+
+
+#-----------------------------------------------------------------------------------------------
+# Metrics from the UI REST API
+#-----------------------------------------------------------------------------------------------
+def rest_json(sc, path):
+    url = '{}/api/v1/applications/{}/{}'.format(sc.uiWebUrl, sc.applicationId, path)
+    return json.loads(urlopen(url).read().decode('utf-8'))
+
+
+def executor_totals(sc):
+    # (task milliseconds, cores) over all executors; waits until the listener has caught up
+    previous = None
+    for attempt in range(10):
+        executors = rest_json(sc, 'executors')
+        totals = (sum(e['totalDuration'] for e in executors), sum(e['totalCores'] for e in executors))
+        if totals == previous:
+            break
+        previous = totals
+        time.sleep(0.5)
+    return previous
+
+
+def stage_attempts(sc, job_group):
+    # REST stage data (all attempts) of every stage run by the jobs of a job group
+    tracker = sc.statusTracker()
+    stage_ids = set()
+    for job_id in tracker.getJobIdsForGroup(job_group):
+        stage_ids.update(tracker.getJobInfo(job_id).stageIds)
+    attempts = []
+    for stage_id in sorted(stage_ids):
+        try:
+            attempts.extend(rest_json(sc, 'stages/{}'.format(stage_id)))
+        except HTTPError:
+            continue        # skipped stage, never submitted
+    return attempts
+
+
+def finished_stage_attempts(sc, job_group, timeout=30, interval=0.5):
+    # stage_attempts once the UI listener (asynchronous) has caught up: no stage ACTIVE/PENDING
+    # and the same numbers in two polls in a row, like executor_totals
+    deadline = time.time() + timeout
+    previous = None
+    while True:
+        attempts = stage_attempts(sc, job_group)
+        finished = all(a.get('status') not in ('ACTIVE', 'PENDING') for a in attempts)
+        if (finished and attempts == previous) or time.time() > deadline:
+            return attempts
+        previous = attempts
+        time.sleep(interval)
+
+
+def stage_pools(sc, job_group):
+    return sorted(set(a.get('schedulingPool') for a in finished_stage_attempts(sc, job_group) if a.get('schedulingPool')))
+
+
+#-----------------------------------------------------------------------------------------------
+# Runner
+#-----------------------------------------------------------------------------------------------
+def _set_group(sc, group, query):
+    sc.setJobGroup(group, query.name)
+    sc.setLocalProperty('spark.scheduler.pool', query.pool)
+
+
+def run_query(ss, query, run_label, t0):
+    sc = ss.sparkContext
+    group = '{}-{}'.format(run_label, query.name)
+    start = time.time()
+    error = None
+    try:
+        if callable(query.query):
+            _set_group(sc, group, query)
+            query.query(ss)
+        else:
+            df = ss.sql(query.query)        # parse/analyze first, properties right before the action
+            _set_group(sc, group, query)
+            df.collect()
+    except Exception:
+        error = traceback.format_exc(limit=1)
+    finally:
+        sc.setLocalProperty('spark.scheduler.pool', None)
+        sc.setLocalProperty('spark.jobGroup.id', None)
+    end = time.time()
+    return {'name': query.name, 'pool': query.pool, 'group': group,
+            'started_at': round(start - t0, 3), 'latency': round(end - start, 3), 'error': error}
+
+
+def run_workload(ss, queries, max_workers=None, label='concurrent'):
+    sc = ss.sparkContext
+    task_ms_before, cores = executor_totals(sc)
+    t0 = time.time()
+    if max_workers == 1:
+        results = [run_query(ss, q, label, t0) for q in queries]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers or len(queries)) as pool:
+            results = list(pool.map(lambda q: run_query(ss, q, label, t0), queries))
+    wall = time.time() - t0
+    task_ms_after, cores = executor_totals(sc)
+    for result in results:
+        result['actual_pools'] = stage_pools(sc, result['group'])
+    utilization = (task_ms_after - task_ms_before) / (wall * 1000 * cores) if wall and cores else None
+    return {'label': label, 'wall_secs': round(wall, 3), 'cores': cores,
+            'utilization': round(utilization, 3) if utilization is not None else None,
+            'queries': results}
+
+
+def compare(ss, queries, max_workers=None, warmup=True):
+    if warmup:
+        t0 = time.time()
+        for q in queries:
+            run_query(ss, q, 'warmup', t0)
+    serial = run_workload(ss, queries, max_workers=1, label='serial')
+    concurrent = run_workload(ss, queries, max_workers=max_workers, label='concurrent')
+
+    print("{:25} {:12} {:>10} {:>12}  {}".format('query', 'pool', 'serial s', 'concurrent s', 'stages ran in'))
+    for s, c in zip(serial['queries'], concurrent['queries']):
+        print("{:25} {:12} {:>10} {:>12}  {}{}".format(s['name'], s['pool'], s['latency'], c['latency'],
+                                                     ','.join(c['actual_pools']),
+                                                     '  ERROR ' + c['error'].strip() if c['error'] else ''))
+    for run in (serial, concurrent):
+        print("{:10} wall {:>8} s  utilization {} of {} cores".format(run['label'], run['wall_secs'],
+                                                                    run['utilization'], run['cores']))
+    if concurrent['wall_secs']:
+        print("speedup: {:.2f}x".format(serial['wall_secs'] / concurrent['wall_secs']))
+    return serial, concurrent
+
+
+if __name__ == "__main__":
+    from pyspark.sql.functions import col
+
+    pools = {'interactive': {'weight': 3, 'minShare': 2}, 'batch': {'weight': 1}}
+    ss = fair_session('ConcurrentQueries', pools,
+                      '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/fairscheduler.xml')
+
+    car_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/car_sales_information.json'
+    emp_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/emp_data_ORIG.csv'
+    dept_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/dept_data.csv'
+    ss.read.format('json').option('inferSchema', 'true').load(car_file).createOrReplaceTempView('car_table')
+    ss.read.format('csv').option('header', 'true').load(emp_file).createOrReplaceTempView('emp')
+    ss.read.format('csv').option('header', 'true').load(dept_file).createOrReplaceTempView('dept')
+
+    queries = [
+        Query('top_sales', "select product_name, quantity_sold from car_table where quantity_sold > 100000 order by quantity_sold desc", 'interactive'),
+        Query('sales_by_country', lambda s: s.table('car_table').groupBy('country_sold_in')
+              .agg({'quantity_sold': 'sum'}).orderBy(col('sum(quantity_sold)').desc()).collect(), 'batch'),
+        Query('emp_dept', "select d.dept_name, count(*) from emp e join dept d on e.dept_id = d.dept_id group by d.dept_name", 'batch'),
+        Query('car_count', "select count(*) from car_table", 'interactive'),
+    ]
+    compare(ss, queries)
@@ -25,7 +25,9 @@ SparkSession can be created from an existing SparkContext using SQLContext
 '''
 #-----------------------------------------------------------------------------------------------
 # ss = sql.sparkSession # From PREVIOUS SPARKCONTEXT
-ss = SparkSession.builder.appName('Intellipaat-Dataframes').config('spark.sql.join.preferSortMergeJoin','True').master('local').getOrCreate()
+# ss = SparkSession.builder.appName('Intellipaat-Dataframes').config('spark.sql.join.preferSortMergeJoin','True').master('local').getOrCreate()
+from PySpark_Session import get_session
+ss = get_session('Intellipaat-Dataframes', conf={'spark.sql.join.preferSortMergeJoin': 'True'})
 # ss = SparkSession.builder.master('local').getOrCreate()
 
 # ss2 = ss.newSession()
@@ -70,6 +72,14 @@ write modes = "append" | "overwrite" | "errorIfExists" | "ignore"
 # df1.printSchema()
 # df1.show()
 
+## Note: businesses_plus.csv is UTF-16 (with BOM), the CSV reader gives garbage with NULs >>>
+##       Transcode it to UTF-8 and write typed Parquet using PySpark_TranscodeIngest.py
+# from PySpark_TranscodeIngest import ingest_to_parquet, business_schema
+# input_file_utf16 = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/businesses_plus.csv'
+# output_file_parquet = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/OutputFile/businesses_plus_parquet'
+# df1 = ingest_to_parquet(ss, input_file_utf16, output_file_parquet, business_schema)
+# df1.show()
+
 # input_file_json = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/car_sales_information.json'
 # input_file_json = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/restaurants.json'
 # df1 = ss.read.format('json').option('inferSchema','true').load(input_file_json)
@@ -202,6 +212,11 @@ from pyspark.sql.types import StringType, StructField, StructType, IntegerType
 # inputRdd1 = sc.textFile(input_file_csv)
 # inputRdd2 = inputRdd1.map(lambda x: convert_to_list(x))
 # inputDf = ss.createDataFrame(inputRdd2,schema=schema)
+## Note: createDataFrame(rdd) pickles every row and converts it in the JVM one at a time. Build Arrow
+##       batches per partition instead (PySpark_ArrowConvert.py, benchmark() there compares both) >>>
+# from PySpark_ArrowConvert import arrow_dataframe, collect_rows
+# inputDf = arrow_dataframe(ss, inputRdd2, schema)
+# rows = collect_rows(inputDf)        # collect() over Arrow batches
 # inputDf.show()
 
 # inputDf2 = inputRdd2.toDF(["deptid","firstname","lastname","email","role"])
@@ -370,6 +385,12 @@ How to see EXPLAIN PLAN
 # joined_data.explain()     ## To check only the physical plan
 # joined_data.explain(True) ## To get all plans
 
+## Note: Streaming DataFrame joined with a static DataFrame re-reads the static side on every micro-batch >>>
+##       Keep it cached + broadcast and refresh it on a schedule/file change (see PySpark_StreamEnrichment.py)
+# from PySpark_StreamEnrichment import ReferenceTable, enrich_foreach_batch
+# dept = ReferenceTable(ss, dept_data_file, 'dept_id', ['dept_name'], refresh_secs=300, header='true')
+# empStream.writeStream.foreachBatch(enrich_foreach_batch(dept, ['dept_id'], lambda df, batch_id: df.show())).start()
+
 
 # LIT function
 #------------------
@@ -460,6 +481,10 @@ from pyspark.sql.functions import lit, to_date, to_timestamp, min
 # using car sales dataset
 car_sales_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/car_sales_information.json'
 carDf = ss.read.format('json').option('inferSchema','true').load(car_sales_file)
+## Note: Re-running the script parses the JSON again every time. Use the local Arrow cache >>>
+# from PySpark_DatasetCache import DatasetCache
+# cache = DatasetCache('/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/DatasetCache')
+# carDf = cache.read(ss, car_sales_file, 'json', inferSchema='true')
 carDf.printSchema()
 
 #?? QNS 1 >>> Which product was sold the most by Quantity - find top 5
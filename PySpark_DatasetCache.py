@@ -0,0 +1,182 @@
+from pyspark.sql.types import StructType
+import hashlib
+import json
+import os
+import time
+
+#-----------------------------------------------------------------------------------------------
+'''
+Local columnar dataset cache (Arrow IPC, memory-mapped)
+-------------------------------------------------------
+The same sampledata CSV/JSON files are parsed from scratch on every run of the scripts. This
+cache keeps the PARSED + TYPED form of each source file as an Arrow IPC file on local disk.
+
+Cache key = absolute path + file size + mtime + schema + reader options
+- Changing the file (mtime/size) or the schema gives a new key, the old entry becomes stale and
+  is removed on the next put.
+- A hit memory-maps the Arrow file (pa.memory_map), so reading the cached table itself does not
+  copy the column buffers into the Python heap (get_table() callers get that for free). read()
+  still converts the table to pandas and createDataFrame re-encodes it to Arrow batches for the
+  JVM, so a DataFrame hit costs one pandas copy - the saving is the parsing, not the copy.
+  Arrow is switched on for the createDataFrame/toPandas calls only and restored afterwards.
+- A miss parses the source once (toPandas), caches it and returns a DataFrame built from those
+  parsed rows.
+- The cache is bounded by max_bytes and evicts the Least Recently Used entries first.
+
+Meant for the small/medium sample files that are re-read dozens of times a day. The data goes
+through the driver, so do not point it at files that do not fit in driver memory.
+'''
+#-----------------------------------------------------------------------------------------------
+
+INDEX_FILE = '_index.json'
+
+
+class DatasetCache(object):
+
+    def __init__(self, cache_dir, max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self._index = self._load_index()
+
+    #-------------------------------------------------------------------------------------------
+    # Index bookkeeping - {key: {source, mtime, bytes, last_access, schema}}
+    #-------------------------------------------------------------------------------------------
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    def _load_index(self):
+        if os.path.exists(self._index_path()):
+            with open(self._index_path()) as f:
+                return json.load(f)
+        return {}
+
+    def _save_index(self):
+        tmp = self._index_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._index, f)
+        os.rename(tmp, self._index_path())
+
+    def _data_path(self, key):
+        return os.path.join(self.cache_dir, key + '.arrow')
+
+    @staticmethod
+    def make_key(path, schema=None, fmt='csv', options=None):
+        stat = os.stat(path)
+        parts = [os.path.abspath(path), str(stat.st_size), str(stat.st_mtime), fmt,
+                 schema.json() if schema is not None else '',
+                 json.dumps(options or {}, sort_keys=True)]
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def total_bytes(self):
+        return sum(e['bytes'] for e in self._index.values())
+
+    def _remove(self, key):
+        entry = self._index.pop(key, None)
+        if entry is not None and os.path.exists(self._data_path(key)):
+            os.remove(self._data_path(key))
+
+    def _evict(self, source=None, keep=None):
+        # Entries of an older version of the same source file can never be hit again
+        if source is not None:
+            for key in [k for k, e in self._index.items() if e['source'] == source and k != keep]:
+                self._remove(key)
+        # LRU - drop the oldest last_access until we are under the cap
+        for key in sorted(self._index, key=lambda k: self._index[k]['last_access']):
+            if self.total_bytes() <= self.max_bytes:
+                break
+            if key != keep:
+                self._remove(key)
+
+    #-------------------------------------------------------------------------------------------
+    # Get / Put
+    #-------------------------------------------------------------------------------------------
+    def get_table(self, key):
+        import pyarrow as pa
+
+        entry = self._index.get(key)
+        if entry is None or not os.path.exists(self._data_path(key)):
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry['last_access'] = time.time()
+        self._save_index()
+        source = pa.memory_map(self._data_path(key), 'r')
+        return pa.ipc.open_file(source).read_all()
+
+    def _write_entry(self, key, table, source, mtime, schema):
+        # Arrow IPC file written to a tmp name and renamed, then indexed (the caller evicts/saves)
+        import pyarrow as pa
+
+        tmp = self._data_path(key) + '.tmp'
+        with pa.OSFile(tmp, 'wb') as sink:
+            writer = pa.RecordBatchFileWriter(sink, table.schema)
+            writer.write_table(table)
+            writer.close()
+        os.rename(tmp, self._data_path(key))
+        self._index[key] = {'source': source,
+                            'mtime': mtime,
+                            'bytes': os.path.getsize(self._data_path(key)),
+                            'last_access': time.time(),
+                            'schema': schema.json()}
+
+    def put_table(self, key, source, table, schema):
+        self._write_entry(key, table, os.path.abspath(source), os.path.getmtime(source), schema)
+        self._evict(os.path.abspath(source), keep=key)
+        self._save_index()
+
+    #-------------------------------------------------------------------------------------------
+    # DataFrame API - drop in replacement for ss.read.format(fmt).schema(schema).load(path)
+    #-------------------------------------------------------------------------------------------
+    def read(self, ss, path, fmt='csv', schema=None, **options):
+        previous = ss.conf.get('spark.sql.execution.arrow.enabled')
+        ss.conf.set('spark.sql.execution.arrow.enabled', 'true')
+        try:
+            return self._read(ss, path, fmt, schema, options)
+        finally:
+            ss.conf.set('spark.sql.execution.arrow.enabled', previous)
+
+    def _read(self, ss, path, fmt, schema, options):
+        import pyarrow as pa
+
+        key = self.make_key(path, schema, fmt, options)
+        table = self.get_table(key)
+        if table is not None:
+            cached_schema = StructType.fromJson(json.loads(self._index[key]['schema']))
+            return ss.createDataFrame(table.to_pandas(), schema=cached_schema)
+
+        reader = ss.read.format(fmt).options(**options)
+        if schema is not None:
+            reader = reader.schema(schema)
+        df = reader.load(path)
+        pdf = df.toPandas()
+        self.put_table(key, path, pa.Table.from_pandas(pdf, preserve_index=False), df.schema)
+        # the parsed rows, not the lazy reader - returning df would parse the source a second time
+        return ss.createDataFrame(pdf, schema=df.schema)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._index),
+                'bytes': self.total_bytes(), 'max_bytes': self.max_bytes}
+
+
+if __name__ == "__main__":
+    from datetime import datetime
+    from PySpark_Session import get_session
+
+    ss = get_session('DatasetCache')
+
+    cache_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/DatasetCache'
+    car_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/car_sales_data.json'
+    emp_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/emp_data_ORIG.csv'
+
+    cache = DatasetCache(cache_dir, max_bytes=256 * 1024 * 1024)
+    for run in range(2):
+        start_time = datetime.now()
+        carDf = cache.read(ss, car_file, 'json', inferSchema='true')
+        empDf = cache.read(ss, emp_file, 'csv', header='true')
+        print("run {} - {} car rows, {} emp rows in {}".format(run, carDf.count(), empDf.count(),
+                                                               datetime.now() - start_time))
+    print(cache.stats())
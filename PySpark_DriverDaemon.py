@@ -0,0 +1,297 @@
+import argparse
+import binascii
+import io
+import json
+import os
+import runpy
+import subprocess
+import sys
+import time
+import traceback
+from contextlib import contextmanager, redirect_stdout, redirect_stderr
+from multiprocessing.connection import Client, Listener
+
+#-----------------------------------------------------------------------------------------------
+'''
+Warm driver daemon - run scripts without paying JVM + SparkSession startup every time
+-------------------------------------------------------------------------------------
+python PySpark_Dataframes.py starts a JVM, a SparkContext and a SparkSession (several seconds)
+before any work. In an edit/run loop that is most of the wall time.
+
+  Start  > python PySpark_DriverDaemon.py start [--port 15002] [--hive] [--max-rss-mb 4096]
+  Submit > python PySpark_DriverDaemon.py run PySpark_SQL.py [script args]
+  Status > python PySpark_DriverDaemon.py status
+  Stop   > python PySpark_DriverDaemon.py stop
+
+The daemon keeps ONE warm SparkSession (PySpark_Session.get_session) and runs each submitted
+script in-process with runpy, one request at a time. The client gets back stdout/stderr, the
+error (if any) and the elapsed time.
+
+Isolation per request:
+- every request gets ss.newSession() - own temp views, UDFs and SQL confs, but the same
+  SparkContext and shared state, so cached tables/DataFrames and the Hive catalog stay warm
+  across requests (that is the point - unpersist explicitly if a script should not leave any)
+- get_session()/get_context() inside the script return that request session (use_session)
+- ss.stop() / sc.stop() in a script (also on SparkSession.builder.getOrCreate() or
+  SparkContext.getOrCreate() objects) only ends the request, the warm context keeps running
+- the script's own modules (PySpark_*.py next to it) are re-imported on every request, so edits
+  are picked up like a normal run
+- temp views created by the request are dropped afterwards
+
+Recycling: after each request the worker checks its RSS and the JVM heap in use. Over
+--max-rss-mb / --max-heap-mb (or after --max-requests) it replies, exits with RECYCLE_EXIT, and
+the supervisor ('start') starts a fresh worker.
+
+Scripts that start a StreamingContext (awaitTermination) block the daemon - run those normally.
+Listens on localhost only. Requests are unpickled and run arbitrary scripts, so every client
+must know the auth key: PYSPARK_DAEMON_KEY, or else a random key generated once into
+~/.pyspark_daemon_key (mode 0600, refused if group/other can read it).
+RSS is the current resident size where /proc exists; on macOS only the PEAK is available and
+it is reported (and used for recycling) as peak_rss_mb.
+'''
+#-----------------------------------------------------------------------------------------------
+
+RECYCLE_EXIT = 75
+DEFAULT_PORT = 15002
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+KEY_FILE = os.path.join(os.path.expanduser('~'), '.pyspark_daemon_key')
+
+
+def _authkey():
+    if os.environ.get('PYSPARK_DAEMON_KEY'):
+        return os.environ['PYSPARK_DAEMON_KEY'].encode('utf-8')
+    try:
+        fd = os.open(KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(binascii.hexlify(os.urandom(32)).decode('ascii'))
+    except OSError:
+        pass        # already there
+    if os.stat(KEY_FILE).st_mode & 0o077:
+        raise RuntimeError('{} is readable by other users - chmod 600 it'.format(KEY_FILE))
+    with open(KEY_FILE) as f:
+        return f.read().strip().encode('utf-8')
+
+
+def rss_mb():
+    # current resident size, None where /proc is not available (macOS)
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) // 1024
+    except IOError:
+        pass
+    return None
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss      # KB on Linux, bytes on macOS
+    return peak // (1024 * 1024) if sys.platform == 'darwin' else peak // 1024
+
+
+@contextmanager
+def _guard_stop():
+    # scripts may stop whatever session/context they get hold of - keep the warm one alive
+    from pyspark import SparkContext
+    from pyspark.sql import SparkSession
+
+    def ignored(self):
+        print("[warm driver] stop() ignored, the daemon keeps the context running")
+
+    saved = SparkSession.stop, SparkContext.stop
+    SparkSession.stop, SparkContext.stop = ignored, ignored
+    try:
+        yield
+    finally:
+        SparkSession.stop, SparkContext.stop = saved
+
+
+def jvm_heap_mb(sc):
+    runtime = sc._jvm.java.lang.Runtime.getRuntime()
+    return (runtime.totalMemory() - runtime.freeMemory()) // (1024 * 1024)
+
+
+#-----------------------------------------------------------------------------------------------
+# Worker - owns the warm session
+#-----------------------------------------------------------------------------------------------
+class DriverWorker(object):
+
+    def __init__(self, hive=False, max_rss_mb=4096, max_heap_mb=None, max_requests=None):
+        from PySpark_Session import get_session
+        self.ss = get_session('DriverDaemon', hive=hive)
+        self.max_rss_mb = max_rss_mb
+        self.max_heap_mb = max_heap_mb
+        self.max_requests = max_requests
+        self.requests = 0
+        self.started = time.time()
+
+    def _purge_modules(self, script_dir):
+        # Re-import the script's helper modules on every run; PySpark_Session holds the warm session
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, '__file__', None) or ''
+            if name in ('__main__', 'PySpark_Session', __name__) or not path:
+                continue
+            if os.path.dirname(os.path.abspath(path)) in (script_dir, HERE):
+                del sys.modules[name]
+
+    def _request_session(self):
+        return self.ss.newSession()
+
+    def _cleanup(self, session):
+        for table in session.catalog.listTables():
+            if table.isTemporary and table.database is None:       # global temp views are shared
+                session.catalog.dropTempView(table.name)
+
+    def run(self, script, args):
+        from PySpark_Session import use_session
+        script = os.path.abspath(script)
+        script_dir = os.path.dirname(script)
+        out, err = io.StringIO(), io.StringIO()
+        error = None
+        start = time.time()
+        session = self._request_session()
+        self.ss.sparkContext.setJobGroup('daemon-request-{}'.format(self.requests), script)
+
+        old_argv, old_path = sys.argv, list(sys.path)
+        sys.argv = [script] + list(args)
+        sys.path.insert(0, script_dir)
+        self._purge_modules(script_dir)
+        try:
+            with use_session(session), _guard_stop(), redirect_stdout(out), redirect_stderr(err):
+                runpy.run_path(script, run_name='__main__')
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                error = 'SystemExit({})'.format(e.code)
+        except BaseException:
+            error = traceback.format_exc()
+        finally:
+            sys.argv, sys.path[:] = old_argv, old_path
+            self.ss.sparkContext._jsc.clearJobGroup()
+            self._cleanup(session)
+
+        self.requests += 1
+        return {'script': script, 'stdout': out.getvalue(), 'stderr': err.getvalue(), 'error': error,
+                'elapsed_secs': round(time.time() - start, 3)}
+
+    def status(self):
+        return {'pid': os.getpid(), 'requests': self.requests,
+                'uptime_secs': int(time.time() - self.started), 'rss_mb': rss_mb(),
+                'peak_rss_mb': peak_rss_mb(),
+                'jvm_heap_mb': jvm_heap_mb(self.ss.sparkContext),
+                'master': self.ss.sparkContext.master, 'app_id': self.ss.sparkContext.applicationId}
+
+    def needs_recycle(self):
+        if self.max_requests and self.requests >= self.max_requests:
+            return 'max requests'
+        if self.max_rss_mb:
+            current = rss_mb()
+            if current is not None and current > self.max_rss_mb:
+                return 'rss {} MB'.format(current)
+            if current is None and peak_rss_mb() > self.max_rss_mb:
+                return 'peak rss {} MB'.format(peak_rss_mb())
+        if self.max_heap_mb:
+            self.ss.sparkContext._jvm.System.gc()
+            heap = jvm_heap_mb(self.ss.sparkContext)
+            if heap > self.max_heap_mb:
+                return 'jvm heap {} MB'.format(heap)
+        return None
+
+
+def serve(port, hive, max_rss_mb, max_heap_mb, max_requests):
+    worker = DriverWorker(hive, max_rss_mb, max_heap_mb, max_requests)
+    listener = Listener(('localhost', port), authkey=_authkey())
+    print("warm driver ready on port {} (pid {})".format(port, os.getpid()))
+    try:
+        while True:
+            conn = listener.accept()
+            try:
+                request = conn.recv()
+                if request['cmd'] == 'run':
+                    reply = worker.run(request['script'], request.get('args', []))
+                elif request['cmd'] == 'status':
+                    reply = worker.status()
+                elif request['cmd'] == 'stop':
+                    conn.send({'stopped': os.getpid()})
+                    return 0
+                else:
+                    reply = {'error': 'unknown command {}'.format(request['cmd'])}
+                recycle = worker.needs_recycle()
+                reply['recycle'] = recycle
+                conn.send(reply)
+                if recycle:
+                    print("recycling worker: {}".format(recycle))
+                    return RECYCLE_EXIT
+            except (EOFError, OSError) as e:
+                print("client went away: {}".format(e))
+            finally:
+                conn.close()
+    finally:
+        listener.close()
+
+
+#-----------------------------------------------------------------------------------------------
+# Supervisor - restarts the worker when it asks to be recycled
+#-----------------------------------------------------------------------------------------------
+def supervise(worker_args):
+    while True:
+        rc = subprocess.call([sys.executable, os.path.abspath(__file__), 'worker'] + worker_args)
+        if rc != RECYCLE_EXIT:
+            return rc
+        print("worker recycled, starting a fresh one")
+
+
+#-----------------------------------------------------------------------------------------------
+# Thin client
+#-----------------------------------------------------------------------------------------------
+def send(request, port=DEFAULT_PORT):
+    conn = Client(('localhost', port), authkey=_authkey())
+    try:
+        conn.send(request)
+        return conn.recv()
+    finally:
+        conn.close()
+
+
+def submit(script, args=(), port=DEFAULT_PORT):
+    reply = send({'cmd': 'run', 'script': os.path.abspath(script), 'args': list(args)}, port)
+    sys.stdout.write(reply['stdout'])
+    sys.stderr.write(reply['stderr'])
+    if reply['error']:
+        sys.stderr.write(reply['error'] + '\n')
+    sys.stderr.write("[warm driver] {} finished in {} s{}\n".format(
+        os.path.basename(script), reply['elapsed_secs'],
+        ' - worker recycled ({})'.format(reply['recycle']) if reply.get('recycle') else ''))
+    return 1 if reply['error'] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Warm SparkSession daemon and client')
+    parser.add_argument('cmd', choices=['start', 'worker', 'run', 'status', 'stop'])
+    parser.add_argument('script', nargs='?')
+    parser.add_argument('script_args', nargs=argparse.REMAINDER)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--hive', action='store_true')
+    parser.add_argument('--max-rss-mb', type=int, default=4096)
+    parser.add_argument('--max-heap-mb', type=int)
+    parser.add_argument('--max-requests', type=int)
+    args = parser.parse_args()
+
+    worker_args = ['--port', str(args.port), '--max-rss-mb', str(args.max_rss_mb)]
+    if args.hive:
+        worker_args.append('--hive')
+    if args.max_heap_mb:
+        worker_args += ['--max-heap-mb', str(args.max_heap_mb)]
+    if args.max_requests:
+        worker_args += ['--max-requests', str(args.max_requests)]
+
+    if args.cmd == 'start':
+        sys.exit(supervise(worker_args))
+    elif args.cmd == 'worker':
+        sys.exit(serve(args.port, args.hive, args.max_rss_mb, args.max_heap_mb, args.max_requests))
+    elif args.cmd == 'run':
+        sys.exit(submit(args.script, args.script_args, args.port))
+    else:
+        print(json.dumps(send({'cmd': args.cmd}, args.port), indent=2))
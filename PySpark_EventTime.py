@@ -0,0 +1,109 @@
+from pyspark.sql.functions import col, when, window, sum, coalesce, current_timestamp, \
+    input_file_name, regexp_extract, to_date, to_timestamp, unix_timestamp
+from PySpark_StockParsing import stock_csv_schema, parse_time_of_day
+
+#-----------------------------------------------------------------------------------------------
+'''
+Event time reconstruction + watermarking for time-of-day-only events
+--------------------------------------------------------------------
+The stock feed only has event_time = "HH:mm:ss". to_timestamp(col("event_time"),"HH:mm:ss")
+gives 1970-01-01 HH:mm:ss for EVERY day, so:
+- yesterday's 12:00 and today's 12:00 fall into the same window
+- the watermark (max event time - delay) never really moves, windows never close and the
+  aggregation state grows forever
+
+Fix: attach a date, then apply the watermark on the reconstructed timestamp.
+
+Reference timestamp (where the date comes from):
+- 'ingest' > current_timestamp(). In Structured Streaming this is the BATCH timestamp, so a
+             replay of the same batch after a restart gets the same value.
+- 'file'   > a timestamp found in the file name (e.g. stock-data-20200501T1305.csv) using a regex
+             and format, falling back to the ingest time for files without one.
+
+Midnight rollover: of the three candidates (reference day - 1, reference day, reference day + 1)
+at HH:mm:ss, pick the one closest to the reference. An event at 23:59:50 ingested at 00:00:05
+belongs to YESTERDAY, not to 23:59:50 today (which would be 24 hours in the future).
+Works as long as events arrive less than 12 hours late.
+
+Watermark: withWatermark('event_ts', delay) before groupBy(window(...)). State for windows older
+than (max event_ts - delay) is finalized (emitted in append mode) and dropped, so state rows stay
+flat. state_rows() reads it from the query progress.
+'''
+#-----------------------------------------------------------------------------------------------
+
+HALF_DAY = 12 * 3600
+ONE_DAY = 24 * 3600
+
+
+def ingest_reference():
+    return current_timestamp()
+
+
+def file_reference(pattern=r'(\d{8}T\d{4})', fmt='yyyyMMdd\'T\'HHmm'):
+    from_file = to_timestamp(regexp_extract(input_file_name(), pattern, 1), fmt)
+    return coalesce(from_file, current_timestamp())
+
+
+def reconstruct_event_time(df, time_col='event_time', reference=None, out_col='event_ts'):
+    reference = reference if reference is not None else ingest_reference()
+    event_secs = parse_time_of_day(col(time_col))
+    ref_day_start = unix_timestamp(to_date(reference).cast('timestamp'))
+    ref_secs = unix_timestamp(reference) - ref_day_start
+
+    diff = event_secs - ref_secs
+    day_offset = when(diff > HALF_DAY, -1).when(diff < -HALF_DAY, 1).otherwise(0)
+    event_ts = (ref_day_start + day_offset * ONE_DAY + event_secs).cast('timestamp')
+    return df.withColumn(out_col, event_ts)
+
+
+def windowed_units(df, window_duration='2 minutes', slide_duration=None, watermark='10 minutes',
+                   event_col='event_ts'):
+    w = window(col(event_col), window_duration, slide_duration) if slide_duration \
+        else window(col(event_col), window_duration)
+    return df.withWatermark(event_col, watermark) \
+             .groupBy(w, 'ticker') \
+             .agg(sum('units_bought').alias('units_bought'), sum('units_sold').alias('units_sold'))
+
+
+def state_rows(query):
+    progress = query.lastProgress
+    if not progress:
+        return None
+    operators = progress.get('stateOperators', [])
+    return {'batchId': progress['batchId'],
+            'watermark': progress.get('eventTime', {}).get('watermark'),
+            'state_rows': sum_rows(operators, 'numRowsTotal'),
+            'state_bytes': sum_rows(operators, 'memoryUsedBytes')}
+
+
+def sum_rows(operators, key):
+    total = 0
+    for operator in operators:
+        total += operator.get(key, 0)
+    return total
+
+
+if __name__ == "__main__":
+    import time
+    from PySpark_Session import get_session
+
+    spark = get_session('EventTime')
+
+    stock_json = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/streaming-stock-data-json/'
+
+    fileStreaming = spark.readStream.format("json") \
+                                    .schema(stock_csv_schema) \
+                                    .option("maxFilesPerTrigger", 1) \
+                                    .load(stock_json)
+
+    df1 = reconstruct_event_time(fileStreaming, 'event_time', ingest_reference())
+    df2 = windowed_units(df1, "10 minutes", "2 minutes", watermark="10 minutes")
+
+    query = df2.writeStream.format("console") \
+                           .outputMode("append") \
+                           .option("truncate", "false") \
+                           .trigger(processingTime="30 seconds") \
+                           .start()
+    while query.isActive:
+        time.sleep(30)
+        print(state_rows(query))
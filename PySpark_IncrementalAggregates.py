@@ -0,0 +1,216 @@
+from pyspark.sql.functions import col, sum, min, max
+from pyspark.sql.utils import AnalysisException
+from datetime import datetime
+import json
+import os
+import re
+
+#-----------------------------------------------------------------------------------------------
+'''
+Incrementally maintained aggregate tables for append-only saveAsTable() targets
+-------------------------------------------------------------------------------
+carDf.write.mode('append').saveAsTable("intellipaat.car_table") adds new files to the table
+and every report then re-aggregates the WHOLE table.
+
+agg = AggregateTable(ss, 'intellipaat.car_by_country', 'intellipaat.car_table',
+                     """select country_sold_in, sum(quantity_sold) as quantity, count(*) as sales,
+                               max(quantity_sold) as biggest_sale
+                        from {source} where quantity_sold > 0 group by country_sold_in""")
+carDf.write.mode('append').saveAsTable('intellipaat.car_table')
+agg.refresh()                               # or append_and_refresh(carDf, 'intellipaat.car_table', [agg])
+
+refresh():
+1. list the files of the source table (ss.table(source).inputFiles())
+2. new files = files not in the processed-files watermark (_incremental_state.json inside the
+   aggregate table's own directory)
+3. run the GROUP BY query on ONLY the new files (registered as a temp view in place of {source})
+4. merge with the current aggregate table: union + groupBy(keys) with the merge function of each
+   column - sum -> sum, count -> sum, min -> min, max -> max
+5. write to <name>__next with the new watermark INSIDE its directory, swap it in (drop + rename)
+   - the table and its watermark are replaced together: a crash before the rename keeps the old
+   pair, a crash after the drop leaves no table and the next refresh rebuilds from scratch, so
+   files are never folded in twice
+Cost = new files + the (small) aggregate table, not the source table.
+
+Only aggregates that can be merged from partial results work (sum, count, min, max - no avg,
+use sum and count and divide in the report, no count(distinct)). The merge function of each
+column is taken from the select list, or passed as merge={'quantity': 'sum', ...}. Any other
+aggregate, or an aggregate without an alias, raises ValueError. Every other output column is a
+group key.
+If a processed file is missing from the source (the table was overwritten, not appended) the
+aggregate is rebuilt from scratch.
+Data source tables only (saveAsTable() default parquet/orc/json...), not Hive serde tables.
+'''
+#-----------------------------------------------------------------------------------------------
+
+MERGE_FUNCS = {'sum': sum, 'count': sum, 'min': min, 'max': max}
+AGGREGATE_FUNCS = {'sum', 'count', 'min', 'max', 'avg', 'mean', 'stddev', 'stddev_samp', 'stddev_pop',
+                   'std', 'variance', 'var_samp', 'var_pop', 'collect_list', 'collect_set', 'first',
+                   'last', 'first_value', 'last_value', 'approx_count_distinct', 'percentile',
+                   'percentile_approx', 'approx_percentile', 'corr', 'covar_pop', 'covar_samp',
+                   'skewness', 'kurtosis', 'count_min_sketch', 'every', 'any', 'some', 'bool_and',
+                   'bool_or'}
+SQL_KEYWORDS = {'from', 'where', 'group', 'order', 'having', 'limit', 'union', 'join', 'on', 'and', 'or'}
+# func( [distinct] args with one level of nested parentheses ) [[as] alias]
+SELECT_FUNC = re.compile(r'\b(\w+)\s*\((\s*distinct\b)?[^()]*(?:\([^()]*\)[^()]*)*\)'
+                         r'(?:\s+(?:as\s+)?`?(\w+)`?)?', re.I)
+STATE_FILE = '_incremental_state.json'       # "_" files are ignored by the table's readers
+
+
+def infer_merge(query):
+    merge = {}
+    for func, distinct, alias in SELECT_FUNC.findall(query):
+        func = func.lower()
+        if func not in AGGREGATE_FUNCS:
+            continue            # cast(), substr() ... - part of a group key expression
+        if func not in MERGE_FUNCS or distinct:
+            raise ValueError('{}({}...) cannot be merged incrementally - use sum/count/min/max'.format(
+                func, 'distinct ' if distinct else ''))
+        if not alias or alias.lower() in SQL_KEYWORDS:
+            raise ValueError('give every aggregate an alias: {}(...) has none'.format(func))
+        merge[alias] = func
+    return merge
+
+
+def table_info(ss, table):
+    rows = ss.sql('describe formatted {}'.format(table)).collect()
+    info = dict((r['col_name'].strip(), (r['data_type'] or '').strip()) for r in rows if r['col_name'])
+    return {'location': info.get('Location'), 'provider': info.get('Provider', 'parquet')}
+
+
+def read_table_files(ss, table, files):
+    # Only the given data files of a saveAsTable() table, with the table schema and partition columns
+    info = table_info(ss, table)
+    return ss.read.format(info['provider']).schema(ss.table(table).schema) \
+             .option('basePath', info['location']).load(*files)
+
+
+def _file_bytes(uri):
+    path = re.sub(r'^file:(//)?', '', uri)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+class AggregateTable(object):
+
+    def __init__(self, ss, name, source, query, merge=None):
+        self.ss = ss
+        self.name = name
+        self.source = source
+        self.query = query
+        self.merge = merge or infer_merge(query)
+        for out_col, func in self.merge.items():
+            if func not in MERGE_FUNCS:
+                raise ValueError('{} ({}) cannot be merged incrementally'.format(out_col, func))
+
+    #-------------------------------------------------------------------------------------------
+    # Processed files watermark - lives in the aggregate table's directory
+    #-------------------------------------------------------------------------------------------
+    def _state_path(self, table):
+        return os.path.join(re.sub(r'^file:(//)?', '', table_info(self.ss, table)['location']), STATE_FILE)
+
+    def read_state(self):
+        path = self._state_path(self.name) if self.exists() else None
+        if path is None or not os.path.exists(path):
+            return {'processed_files': [], 'refreshes': []}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_state(self, table, state):
+        path = self._state_path(table)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.rename(path + '.tmp', path)
+
+    #-------------------------------------------------------------------------------------------
+    # Refresh
+    #-------------------------------------------------------------------------------------------
+    def _aggregate(self, files):
+        delta = read_table_files(self.ss, self.source, files)
+        view = '_delta_' + re.sub(r'\W', '_', self.name)
+        delta.createOrReplaceTempView(view)
+        try:
+            result = self.ss.sql(self.query.format(source=view))
+        finally:
+            self.ss.catalog.dropTempView(view)
+        missing = [c for c in self.merge if c not in result.columns]
+        if missing:
+            raise ValueError('merge columns {} are not in the query output'.format(missing))
+        return result
+
+    def _merge(self, current, delta):
+        keys = [c for c in delta.columns if c not in self.merge]
+        exprs = [MERGE_FUNCS[self.merge[c]](col(c)).alias(c) for c in delta.columns if c in self.merge]
+        merged = current.unionByName(delta).groupBy(*keys).agg(*exprs)
+        return merged.select(*delta.columns)
+
+    def _swap(self, df, state):
+        next_table = self.name + '__next'
+        self.ss.sql('drop table if exists {}'.format(next_table))
+        df.write.mode('overwrite').saveAsTable(next_table)
+        self._write_state(next_table, state)
+        self.ss.sql('drop table if exists {}'.format(self.name))
+        self.ss.sql('alter table {} rename to {}'.format(next_table, self.name))
+
+    def exists(self):
+        try:
+            self.ss.table(self.name)
+            return True
+        except AnalysisException:
+            return False
+
+    def refresh(self):
+        start_time = datetime.now()
+        state = self.read_state()
+        processed = set(state['processed_files'])
+        self.ss.catalog.refreshTable(self.source)
+        files = set(self.ss.table(self.source).inputFiles())
+
+        if not self.exists() or not processed <= files:
+            mode, new_files = 'full', sorted(files)
+            result = self._aggregate(new_files) if new_files else None
+        else:
+            mode, new_files = 'incremental', sorted(files - processed)
+            result = self._merge(self.ss.table(self.name), self._aggregate(new_files)) if new_files else None
+        record = {'refreshed_at': start_time.strftime('%Y-%m-%d %H:%M:%S'), 'mode': mode if result is not None else 'noop',
+                  'new_files': len(new_files), 'new_bytes': sum_bytes(new_files)}
+        if result is not None:
+            state['processed_files'] = sorted(files)
+            state['refreshes'] = (state['refreshes'] + [record])[-50:]
+            self._swap(result, state)
+        record['elapsed_ms'] = int((datetime.now() - start_time).total_seconds() * 1000)
+        mode = record['mode']
+        print("{} refresh of {}: {}".format(mode, self.name, record))
+        return record
+
+
+def sum_bytes(files):
+    total = 0
+    for f in files:
+        total += _file_bytes(f)
+    return total
+
+
+def append_and_refresh(df, source, aggregates, fmt=None):
+    writer = df.write.mode('append')
+    if fmt:
+        writer = writer.format(fmt)
+    writer.saveAsTable(source)
+    return [agg.refresh() for agg in aggregates]
+
+
+if __name__ == "__main__":
+    from PySpark_Session import get_session
+
+    ss = get_session('IncrementalAggregates', hive=True)
+
+    car_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/car_sales_information.json'
+    carDf = ss.read.format('json').option('inferSchema', 'true').load(car_file)
+
+    ss.sql('create database if not exists intellipaat')
+    by_country = AggregateTable(ss, 'intellipaat.car_by_country', 'intellipaat.car_table',
+                                """select country_sold_in, sum(quantity_sold) as quantity, count(*) as sales,
+                                          max(quantity_sold) as biggest_sale
+                                   from {source} group by country_sold_in""")
+    for i in range(3):
+        append_and_refresh(carDf, 'intellipaat.car_table', [by_country])
+    ss.table('intellipaat.car_by_country').orderBy(col('quantity').desc()).show(10)
@@ -0,0 +1,285 @@
+from PySpark_ConcurrentQueries import finished_stage_attempts, rest_json
+from PySpark_PartitionPlanner import stage_summary
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.error import HTTPError
+import json
+import os
+import threading
+import time
+
+#-----------------------------------------------------------------------------------------------
+'''
+Per-job memory / spill / GC profiling
+-------------------------------------
+When Demo 4 (PySpark_BatchPerf.py) or a big join gets slow, the Spark UI that could tell spill
+from GC from skew is gone as soon as spark-submit exits. The profiler keeps a compact record:
+
+profiler = JobProfiler(ss)
+with profiler.profile('demo4', output_path=out_dir):
+    df7.write.parquet(out_dir)
+-> <out_dir>/_profile.json (+ _profile.txt). Files starting with "_" are ignored by Spark readers,
+   so the report can live inside the output directory. Without output_path it goes to report_dir.
+
+Profiling mode: maybe_profile(ss, name, output_path) only profiles when PYSPARK_PROFILE_JOBS=1,
+so the scripts can keep the call in and pay nothing normally.
+
+Per stage (UI REST API, all tasks of the stage; on top of PartitionPlanner's stage_summary()):
+  memory spill / disk spill bytes, GC time (and % of task time), peak execution memory (max
+  task), shuffle fetch wait, task time median / max (max >> median = skew)
+Per executor: GC time during the job, storage memory
+Driver JVM heap snapshots every heap_interval seconds, on a py4j client of their own:
+  heap used / committed / max, non-heap used, GC collections and time per collector
+  (local mode: the driver JVM IS the executor, so this is the heap the tasks run in)
+  The sampler thread must not share the session's py4j connections: with PySpark 2.4's
+  unpinned threads the job group could then be set on one JVM thread and the job submitted
+  from another, and the job would fall out of the profile.
+
+Flags in the text report: SPILL (any disk spill), GC (> 10% of task time), SKEW (slowest task >
+3 x median and > 1 s), FETCH (fetch wait > 10% of task time).
+'''
+#-----------------------------------------------------------------------------------------------
+
+MB = 1024 * 1024
+GC_FLAG_RATIO = 0.10
+FETCH_FLAG_RATIO = 0.10
+SKEW_FLAG_RATIO = 3.0
+
+
+def profiling_enabled():
+    return os.environ.get('PYSPARK_PROFILE_JOBS', '0') == '1'
+
+
+#-----------------------------------------------------------------------------------------------
+# Driver JVM heap through py4j
+#-----------------------------------------------------------------------------------------------
+def heap_snapshot(sc):
+    management = sc._jvm.java.lang.management.ManagementFactory
+    memory = management.getMemoryMXBean()
+    heap, non_heap = memory.getHeapMemoryUsage(), memory.getNonHeapMemoryUsage()
+    collectors = {}
+    for gc in management.getGarbageCollectorMXBeans():
+        collectors[gc.getName()] = {'count': gc.getCollectionCount(), 'time_ms': gc.getCollectionTime()}
+    return {'at': time.time(), 'heap_used_mb': heap.getUsed() // MB, 'heap_committed_mb': heap.getCommitted() // MB,
+            'heap_max_mb': heap.getMax() // MB, 'non_heap_used_mb': non_heap.getUsed() // MB,
+            'gc': collectors}
+
+
+def _own_gateway(sc):
+    # second client of the same gateway server: own connections, so own JVM threads
+    from py4j.java_gateway import JavaGateway, GatewayParameters
+
+    params = sc._gateway.gateway_parameters
+    return JavaGateway(gateway_parameters=GatewayParameters(address=params.address, port=params.port,
+                                                            auth_token=params.auth_token,
+                                                            auto_convert=True))
+
+
+class _GatewayContext(object):
+    # what heap_snapshot needs from a SparkContext: _jvm
+    def __init__(self, gateway):
+        self._jvm = gateway.jvm
+
+
+class HeapSampler(object):
+
+    def __init__(self, sc, interval=1.0):
+        self.gateway = _own_gateway(sc)
+        self.sc = _GatewayContext(self.gateway)
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='jvm-heap-sampler')
+        self._thread.daemon = True
+
+    def _loop(self):
+        while True:
+            try:
+                self.samples.append(heap_snapshot(self.sc))
+            except Exception as e:      # gateway busy/closing - keep the job running
+                print("heap snapshot failed: {}".format(e))
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.samples.append(heap_snapshot(self.sc))
+        self.gateway.close()        # client connections only, the server is the session's
+        return self.samples
+
+
+def heap_summary(samples):
+    if not samples:
+        return {}
+    first, last = samples[0], samples[-1]
+    gc = {}
+    for name, end in last['gc'].items():
+        start = first['gc'].get(name, {'count': 0, 'time_ms': 0})
+        gc[name] = {'collections': end['count'] - start['count'], 'time_ms': end['time_ms'] - start['time_ms']}
+    return {'samples': len(samples),
+            'heap_used_peak_mb': max(s['heap_used_mb'] for s in samples),
+            'heap_committed_peak_mb': max(s['heap_committed_mb'] for s in samples),
+            'heap_max_mb': last['heap_max_mb'],
+            'non_heap_used_peak_mb': max(s['non_heap_used_mb'] for s in samples),
+            'driver_gc': gc}
+
+
+#-----------------------------------------------------------------------------------------------
+# Stage / executor metrics from the REST API
+#-----------------------------------------------------------------------------------------------
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else 0
+
+
+def stage_profile(sc, attempt, max_tasks=100000):
+    path = 'stages/{}/{}/taskList?length={}'.format(attempt['stageId'], attempt['attemptId'], max_tasks)
+    try:
+        tasks = [t for t in rest_json(sc, path) if t.get('taskMetrics')]
+    except HTTPError:
+        tasks = []
+    metrics = [t['taskMetrics'] for t in tasks]
+    run_times = [m['executorRunTime'] for m in metrics]
+    run_total = sum(run_times)
+    gc_total = sum(m['jvmGcTime'] for m in metrics)
+    fetch_wait = sum(m.get('shuffleReadMetrics', {}).get('fetchWaitTime', 0) for m in metrics)
+    profile = stage_summary(attempt)
+    profile.update({'attempt': attempt['attemptId'],
+                    'memory_spill_bytes': attempt.get('memoryBytesSpilled', 0),
+                    'disk_spill_bytes': attempt.get('diskBytesSpilled', 0),
+                    'task_time_ms': run_total, 'gc_time_ms': gc_total,
+                    'gc_ratio': round(float(gc_total) / run_total, 3) if run_total else 0,
+                    'peak_execution_memory_bytes': max([m['peakExecutionMemory'] for m in metrics] or [0]),
+                    'shuffle_fetch_wait_ms': fetch_wait,
+                    'task_ms_median': _median(run_times), 'task_ms_max': max(run_times or [0])})
+    flags = []
+    if profile['disk_spill_bytes']:
+        flags.append('SPILL')
+    if profile['gc_ratio'] > GC_FLAG_RATIO:
+        flags.append('GC')
+    if profile['task_ms_max'] > 1000 and profile['task_ms_max'] > SKEW_FLAG_RATIO * max(profile['task_ms_median'], 1):
+        flags.append('SKEW')
+    if run_total and float(fetch_wait) / run_total > FETCH_FLAG_RATIO:
+        flags.append('FETCH')
+    profile['flags'] = flags
+    return profile
+
+
+def executor_snapshot(sc):
+    return dict((e['id'], {'gc_time_ms': e.get('totalGCTime', 0), 'memory_used_bytes': e.get('memoryUsed', 0),
+                           'max_memory_bytes': e.get('maxMemory', 0)})
+                for e in rest_json(sc, 'executors'))
+
+
+def executor_delta(before, after):
+    result = {}
+    for executor_id, end in after.items():
+        start = before.get(executor_id, {'gc_time_ms': 0})
+        result[executor_id] = dict(end, gc_time_ms=end['gc_time_ms'] - start['gc_time_ms'])
+    return result
+
+
+#-----------------------------------------------------------------------------------------------
+# Profiler
+#-----------------------------------------------------------------------------------------------
+class JobProfiler(object):
+
+    def __init__(self, ss, report_dir=None, heap_interval=1.0):
+        self.ss = ss
+        self.report_dir = report_dir
+        self.heap_interval = heap_interval
+
+    @contextmanager
+    def profile(self, name, output_path=None):
+        sc = self.ss.sparkContext
+        group = 'profile-{}-{}'.format(name, int(time.time() * 1000))
+        executors_before = executor_snapshot(sc)
+        sampler = HeapSampler(sc, self.heap_interval)
+        start = time.time()
+        sc.setJobGroup(group, name)
+        sampler.start()
+        try:
+            yield
+        finally:
+            sc.setLocalProperty('spark.jobGroup.id', None)
+            elapsed = time.time() - start
+            samples = sampler.stop()
+            report = {'name': name, 'at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                      'elapsed_ms': int(elapsed * 1000), 'app_id': sc.applicationId,
+                      'stages': [stage_profile(sc, a) for a in finished_stage_attempts(sc, group)],
+                      'executors': executor_delta(executors_before, executor_snapshot(sc)),
+                      'driver_heap': heap_summary(samples), 'heap_samples': samples}
+            self.write_report(report, output_path)
+
+    def _report_base(self, name, output_path):
+        if output_path and os.path.isdir(output_path):
+            return os.path.join(output_path, '_profile')
+        if output_path:
+            return output_path.rstrip('/') + '.profile'
+        report_dir = self.report_dir or os.getcwd()
+        if not os.path.isdir(report_dir):
+            os.makedirs(report_dir)
+        return os.path.join(report_dir, '{}-{}.profile'.format(name, datetime.now().strftime('%Y%m%d%H%M%S')))
+
+    def write_report(self, report, output_path=None):
+        base = self._report_base(report['name'], output_path)
+        with open(base + '.json', 'w') as f:
+            json.dump(report, f, indent=1)
+        text = format_report(report)
+        with open(base + '.txt', 'w') as f:
+            f.write(text)
+        print(text)
+        return base + '.json'
+
+
+def format_report(report):
+    lines = ['{} - {} ms - {}'.format(report['name'], report['elapsed_ms'], report['at']),
+             '{:>5} {:28} {:>6} {:>9} {:>9} {:>8} {:>9} {:>8} {:>8} {:>8}  {}'.format(
+                 'stage', 'name', 'tasks', 'spillMem', 'spillDisk', 'gc ms', 'peakMem', 'fetch', 'med ms', 'max ms', 'flags')]
+    for s in report['stages']:
+        lines.append('{:>5} {:28} {:>6} {:>8}M {:>8}M {:>8} {:>8}M {:>8} {:>8} {:>8}  {}'.format(
+            s['stage_id'], s['name'][:28], s['tasks'], s['memory_spill_bytes'] // MB, s['disk_spill_bytes'] // MB,
+            s['gc_time_ms'], s['peak_execution_memory_bytes'] // MB, s['shuffle_fetch_wait_ms'],
+            s['task_ms_median'], s['task_ms_max'], ','.join(s['flags'])))
+    heap = report['driver_heap']
+    if heap:
+        lines.append('driver heap peak {} MB of {} MB (committed {} MB), non-heap {} MB, gc {}'.format(
+            heap['heap_used_peak_mb'], heap['heap_max_mb'], heap['heap_committed_peak_mb'],
+            heap['non_heap_used_peak_mb'], heap['driver_gc']))
+    for executor_id, e in sorted(report['executors'].items()):
+        lines.append('executor {:8} gc {} ms, storage memory {} / {} MB'.format(
+            executor_id, e['gc_time_ms'], e['memory_used_bytes'] // MB, e['max_memory_bytes'] // MB))
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def maybe_profile(ss, name, output_path=None, report_dir=None):
+    if not profiling_enabled():
+        yield
+        return
+    with JobProfiler(ss, report_dir).profile(name, output_path):
+        yield
+
+
+if __name__ == "__main__":
+    from pyspark.sql.functions import col, regexp_replace
+    from PySpark_Session import get_session
+
+    ss = get_session('JobProfiler')
+
+    car_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/car_sales_information.json'
+    out_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/OutputFile/demo4_profiled'
+
+    carDf = ss.read.format('json').option('inferSchema', 'true').load(car_file)
+    df1 = carDf.filter(col('quantity_sold') > 100000).repartition(4)
+    df2 = df1.select('credit_card_type', regexp_replace(col('price'), "\\$", "").alias('price'),
+                     'product_make', 'product_name', 'quantity_sold', 'state_sold_in')
+    df3 = df2.groupBy('product_make', 'product_name', 'credit_card_type', 'state_sold_in') \
+             .agg({'quantity_sold': 'sum', 'price': 'sum'})
+
+    with JobProfiler(ss).profile('demo4', output_path=out_dir):
+        df3.write.mode('overwrite').parquet(out_dir)
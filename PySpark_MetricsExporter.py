@@ -0,0 +1,203 @@
+from pyspark.streaming.listener import StreamingListener
+from datetime import datetime
+import json
+import os
+import threading
+import time
+
+#-----------------------------------------------------------------------------------------------
+'''
+Per-batch streaming metrics -> Prometheus text file + JSON lines
+----------------------------------------------------------------
+Spark UI (http://localhost:4040) is gone as soon as the job stops and nobody can alert on it.
+Every completed batch is exported to:
+- <metrics_dir>/spark_streaming.prom  Prometheus text format, replaced atomically after each
+                                      batch (point node_exporter's textfile collector at it)
+- <metrics_dir>/spark_streaming.jsonl one JSON record per batch, for history/capacity planning
+
+Metrics (label query="<name>"):
+  spark_stream_input_rows            rows in the batch
+  spark_stream_input_rows_per_sec    input rate
+  spark_stream_processed_rows_per_sec processing rate
+  spark_stream_batch_duration_ms     batch duration (DStreams: processing delay)
+  spark_stream_scheduling_delay_ms   DStreams only - time the batch waited to start
+  spark_stream_state_rows            Structured Streaming only - rows in all state stores
+  spark_stream_watermark_lag_sec     Structured Streaming only - batch time minus watermark
+
+Structured Streaming: PySpark 2.4 has no Python StreamingQueryListener (it is Scala/Java only),
+so StructuredProgressExporter polls query.recentProgress from a daemon thread and exports every
+NEW progress once - same data the listener's onQueryProgress would get.
+DStreams: DStreamMetricsListener is a real StreamingListener (ssc.addStreamingListener).
+'''
+#-----------------------------------------------------------------------------------------------
+
+METRICS = [
+    ('input_rows', 'Rows in the last batch'),
+    ('input_rows_per_sec', 'Input rate of the last batch'),
+    ('processed_rows_per_sec', 'Processing rate of the last batch'),
+    ('batch_duration_ms', 'Duration of the last batch'),
+    ('scheduling_delay_ms', 'Time the last batch waited before it started'),
+    ('state_rows', 'Rows held in state stores'),
+    ('watermark_lag_sec', 'Batch time minus event time watermark'),
+]
+
+
+class MetricsExporter(object):
+
+    def __init__(self, metrics_dir, prefix='spark_stream'):
+        self.metrics_dir = metrics_dir
+        self.prefix = prefix
+        self.latest = {}            # query name -> last record
+        self._lock = threading.Lock()
+        if not os.path.isdir(metrics_dir):
+            os.makedirs(metrics_dir)
+
+    def export(self, name, record):
+        record = dict(record, query=name, exported_at=time.time())
+        with self._lock:
+            self.latest[name] = record
+            with open(os.path.join(self.metrics_dir, 'spark_streaming.jsonl'), 'a') as f:
+                f.write(json.dumps(record) + '\n')
+            self._write_prometheus()
+
+    def _write_prometheus(self):
+        lines = []
+        for metric, help_text in METRICS:
+            full_name = '{}_{}'.format(self.prefix, metric)
+            values = [(q, r[metric]) for q, r in sorted(self.latest.items()) if r.get(metric) is not None]
+            if not values:
+                continue
+            lines.append('# HELP {} {}'.format(full_name, help_text))
+            lines.append('# TYPE {} gauge'.format(full_name))
+            for query, value in values:
+                lines.append('{}{{query="{}"}} {}'.format(full_name, query, value))
+        path = os.path.join(self.metrics_dir, 'spark_streaming.prom')
+        with open(path + '.tmp', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.rename(path + '.tmp', path)
+
+
+#-----------------------------------------------------------------------------------------------
+# Structured Streaming
+#-----------------------------------------------------------------------------------------------
+EPOCH = datetime(1970, 1, 1)
+
+
+def _parse_time(text):
+    return datetime.strptime(text, '%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def progress_record(progress):
+    operators = progress.get('stateOperators', [])
+    watermark = progress.get('eventTime', {}).get('watermark')
+    lag = None
+    # Until the first batch with data sets it, the watermark is reported as the epoch
+    if watermark and _parse_time(watermark) > EPOCH:
+        lag = (_parse_time(progress['timestamp']) - _parse_time(watermark)).total_seconds()
+    state_rows = 0
+    for operator in operators:
+        state_rows += operator.get('numRowsTotal', 0)
+    return {'batch_id': progress['batchId'],
+            'timestamp': progress['timestamp'],
+            'input_rows': progress.get('numInputRows'),
+            'input_rows_per_sec': progress.get('inputRowsPerSecond'),
+            'processed_rows_per_sec': progress.get('processedRowsPerSecond'),
+            'batch_duration_ms': progress.get('durationMs', {}).get('triggerExecution'),
+            'state_rows': state_rows if operators else None,
+            'watermark_lag_sec': lag}
+
+
+class StructuredProgressExporter(object):
+
+    def __init__(self, exporter, poll_secs=5):
+        self.exporter = exporter
+        self.poll_secs = poll_secs
+        self.queries = {}
+        self._seen = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='streaming-metrics-exporter')
+        self._thread.daemon = True
+
+    def watch(self, query, name=None):
+        name = name or query.name or query.id
+        self.queries[name] = query
+        self._seen.setdefault(name, set())
+        if not self._thread.is_alive():
+            self._thread.start()
+        return query
+
+    def poll(self):
+        for name, query in list(self.queries.items()):
+            recent = query.recentProgress
+            for progress in recent:
+                key = (progress['runId'], progress['batchId'])
+                if key not in self._seen[name]:
+                    self.exporter.export(name, progress_record(progress))
+            # recentProgress only keeps the last few batches, so only those need remembering
+            self._seen[name] = set((p['runId'], p['batchId']) for p in recent)
+
+    def _loop(self):
+        while not self._stop.wait(self.poll_secs):
+            try:
+                self.poll()
+            except Exception as e:
+                print("metrics export failed: {}".format(e))
+
+    def stop(self):
+        self._stop.set()
+        self.poll()
+
+
+#-----------------------------------------------------------------------------------------------
+# DStreams
+#-----------------------------------------------------------------------------------------------
+def _millis(value):
+    # JavaBatchInfo delays are plain longs in PySpark 2.4, -1 when not known yet
+    return value if value is not None and value >= 0 else None
+
+
+class DStreamMetricsListener(StreamingListener):
+
+    def __init__(self, exporter, name='dstream'):
+        StreamingListener.__init__(self)
+        self.exporter = exporter
+        self.name = name
+
+    def onBatchCompleted(self, batchCompleted):
+        info = batchCompleted.batchInfo()
+        rows = info.numRecords()
+        processing = _millis(info.processingDelay())
+        rate = float(rows) * 1000 / processing if processing else None
+        self.exporter.export(self.name, {
+            'batch_time': info.batchTime().milliseconds(),
+            'input_rows': rows,
+            'input_rows_per_sec': None,
+            'processed_rows_per_sec': rate,
+            'batch_duration_ms': processing,
+            'scheduling_delay_ms': _millis(info.schedulingDelay()),
+        })
+
+
+if __name__ == "__main__":
+    from PySpark_StockParsing import stock_csv_schema
+    from PySpark_EventTime import reconstruct_event_time, windowed_units
+    from PySpark_Session import get_session
+
+    spark = get_session('MetricsExporter')
+
+    stock_json = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/streaming-stock-data-json/'
+    metrics_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/metrics'
+
+    fileStreaming = spark.readStream.format("json").schema(stock_csv_schema).option("maxFilesPerTrigger", 1).load(stock_json)
+    df1 = windowed_units(reconstruct_event_time(fileStreaming), "2 minutes")
+
+    exporter = StructuredProgressExporter(MetricsExporter(metrics_dir))
+    query = df1.writeStream.queryName('stock_units').format("console").outputMode("update") \
+               .trigger(processingTime="10 seconds").start()
+    exporter.watch(query)
+    query.awaitTermination(120)
+    query.stop()
+    exporter.stop()
+
+    # DStreams:
+    # ssc.addStreamingListener(DStreamMetricsListener(MetricsExporter(metrics_dir), 'car_sales_socket'))
@@ -1,7 +1,10 @@
 from pyspark import SparkContext, SparkConf
 
-conf = SparkConf().setAppName('IntellipaatPairRDD').setMaster('local[4]')
-sc = SparkContext.getOrCreate(conf=conf)
+from PySpark_Session import get_context
+
+# conf = SparkConf().setAppName('IntellipaatPairRDD').setMaster('local[4]')
+# sc = SparkContext.getOrCreate(conf=conf)
+sc = get_context('IntellipaatPairRDD')
 #-----------------------------------------------------------------------------------------------
 '''
 Pair RDDs are RDDs with Key-Value pairs. It is needed most of the cases than normal RDDs.
@@ -156,6 +159,10 @@ sc.textFile("/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/
 # carKvRdd4 = carKvRdd3.filter(lambda x: convert_to_int(x))
 # carKvRdd5 = carKvRdd4.map(lambda x: (x[0], int(x[1])))
 # carKvRdd6 = carKvRdd5.reduceByKey(lambda x,y: x+y)
+## Note: the ((model, country), qty) pairs are shuffled as pickle. For a known record shape the
+##       compact serializer is much smaller (PySpark_Serializers.py, benchmark() compares them) >>>
+# from PySpark_Serializers import CompactSerializer, reduce_by_key
+# carKvRdd6 = reduce_by_key(carKvRdd5, lambda x,y: x+y, CompactSerializer((('s','s'),'i')))
 # carKvRdd7 = carKvRdd6.sortBy(lambda x: x[1],ascending=False)
 #
 # for i in carKvRdd7.take(25):
@@ -253,6 +260,13 @@ sc.textFile("/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/
 
 #?? QNS 13 >>> Given the sales person id, find his/her sale credentials
 #-----------------------------------------------------------------------
+# carPairRdd = carRDD.keyBy(lambda x: x.split(',')[1])
+# print(carPairRdd.lookup('845774333-3'))       # scans every file
+#
+# Point lookup using the Bloom filter sidecar index (see PySpark_BloomIndex.py)
+# from PySpark_BloomIndex import BloomIndex
+# index = BloomIndex('/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/OutputFile/car_sales_bloom')
+# print(index.candidate_files('sales_person_id', '845774333-3'))  # only these files need to be opened
 
 
 
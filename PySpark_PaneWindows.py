@@ -0,0 +1,170 @@
+from pyspark.sql.functions import col, lit, floor, explode, array, struct, window, \
+    sum, count, min, max
+
+#-----------------------------------------------------------------------------------------------
+'''
+Pane-based sliding windows
+--------------------------
+groupBy(window(col('event_time'),"10 minutes","2 minutes")) puts EVERY event into 10/2 = 5
+overlapping windows - 5x the rows in the shuffle and 5x the state.
+
+Panes: cut the time line into non-overlapping panes of the SLIDE size (2 minutes). Every window is
+exactly 5 consecutive panes, so:
+  Step 1 - aggregate events into panes (each event goes to ONE pane)
+  Step 2 - copy each PANE AGGREGATE (not each event) into the 5 windows it belongs to and combine
+Shuffle and state are now proportional to the no. of panes, not events x 5.
+
+Only works for aggregates that can be combined from partial results:
+  sum -> sum of pane sums, count -> sum of pane counts, min -> min of mins, max -> max of maxes
+Window length must be a multiple of the slide. Windows are aligned to the epoch, same as window(),
+so the results (and the window struct column) are the same as today's API.
+
+Batch DataFrames  > pane_sliding_window(df, 'event_ts', '10 minutes', '2 minutes', ['ticker'], aggs)
+Streaming         > chained aggregations are not allowed on a streaming DataFrame (Spark 2.4), so
+                    the pane aggregation is the streaming (stateful, watermarked) part and
+                    PaneWindowAssembler builds the windows in foreachBatch from a bounded pane store.
+
+aggs = {'units_bought': ('sum', 'units_bought'), 'events': ('count', 'ticker'), ...}
+'''
+#-----------------------------------------------------------------------------------------------
+
+UNITS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400, 'week': 604800}
+PANE_FUNCS = {'sum': sum, 'count': count, 'min': min, 'max': max}
+MERGE_FUNCS = {'sum': sum, 'count': sum, 'min': min, 'max': max}
+
+
+def parse_duration(text):
+    number, unit = text.strip().split()
+    unit = unit.lower().rstrip('s')
+    if unit not in UNITS:
+        raise ValueError('Unsupported duration unit in {}'.format(text))
+    return int(number) * UNITS[unit]
+
+
+def _check(window_duration, slide_duration, aggs):
+    window_secs, slide_secs = parse_duration(window_duration), parse_duration(slide_duration)
+    if window_secs % slide_secs:
+        raise ValueError('Window {} is not a multiple of the slide {}'.format(window_duration, slide_duration))
+    for out_col, (func, _) in aggs.items():
+        if func not in PANE_FUNCS:
+            raise ValueError('{} for {} cannot be combined from panes (use sum, count, min or max)'.format(func, out_col))
+    return window_secs, slide_secs
+
+
+def pane_start_col(time_col, slide_secs):
+    return (floor(col(time_col).cast('double') / slide_secs) * slide_secs).cast('long')
+
+
+def aggregate_panes(df, time_col, slide_secs, group_cols, aggs):
+    exprs = [PANE_FUNCS[func](col(in_col)).alias(out_col) for out_col, (func, in_col) in aggs.items()]
+    return df.withColumn('pane_start', pane_start_col(time_col, slide_secs)) \
+             .groupBy(*(group_cols + ['pane_start'])).agg(*exprs)
+
+
+def assemble_windows(panes, window_secs, slide_secs, group_cols, aggs):
+    panes_per_window = window_secs // slide_secs
+    exprs = [MERGE_FUNCS[func](col(out_col)).alias(out_col) for out_col, (func, _) in aggs.items()]
+    windows = panes.withColumn('_j', explode(array(*[lit(j) for j in range(panes_per_window)]))) \
+                   .withColumn('_window_start', col('pane_start') - col('_j') * slide_secs) \
+                   .groupBy(*(group_cols + ['_window_start'])).agg(*exprs)
+    return windows.withColumn('window', struct(col('_window_start').cast('timestamp').alias('start'),
+                                               (col('_window_start') + window_secs).cast('timestamp').alias('end'))) \
+                  .select(*(['window'] + group_cols + list(aggs.keys())))
+
+
+def pane_sliding_window(df, time_col, window_duration, slide_duration, group_cols, aggs):
+    window_secs, slide_secs = _check(window_duration, slide_duration, aggs)
+    panes = aggregate_panes(df, time_col, slide_secs, group_cols, aggs)
+    return assemble_windows(panes, window_secs, slide_secs, group_cols, aggs)
+
+
+def builtin_sliding_window(df, time_col, window_duration, slide_duration, group_cols, aggs):
+    # Today's API - used to check the pane results are the same
+    exprs = [PANE_FUNCS[func](col(in_col)).alias(out_col) for out_col, (func, in_col) in aggs.items()]
+    return df.groupBy(*([window(col(time_col), window_duration, slide_duration)] + group_cols)).agg(*exprs)
+
+
+#-----------------------------------------------------------------------------------------------
+# Streaming - panes are the streaming state, windows are built in foreachBatch
+#-----------------------------------------------------------------------------------------------
+def streaming_panes(stream_df, time_col, slide_duration, group_cols, aggs, watermark='10 minutes'):
+    slide_secs = parse_duration(slide_duration)
+    exprs = [PANE_FUNCS[func](col(in_col)).alias(out_col) for out_col, (func, in_col) in aggs.items()]
+    return stream_df.withWatermark(time_col, watermark) \
+                    .groupBy(*([window(col(time_col), slide_duration)] + group_cols)).agg(*exprs) \
+                    .withColumn('pane_start', col('window.start').cast('long')) \
+                    .drop('window')
+
+
+class PaneWindowAssembler(object):
+    # foreachBatch function for outputMode("update") of streaming_panes(): keeps the latest value of
+    # every pane that can still be part of an open window and emits the windows touched by the batch
+
+    def __init__(self, ss, window_duration, slide_duration, group_cols, aggs, sink, retain_panes=None):
+        self.ss = ss
+        self.window_secs, self.slide_secs = _check(window_duration, slide_duration, aggs)
+        self.group_cols = group_cols
+        self.aggs = aggs
+        self.sink = sink
+        # window/slide panes + some slack for late panes still inside the watermark
+        self.retain_secs = (retain_panes or 2 * self.window_secs // self.slide_secs) * self.slide_secs
+        self.store = None
+        self.store_rdd = None       # JVM RDD holding the local checkpoint blocks of self.store
+
+    def __call__(self, updated_panes, batch_id):
+        keys = self.group_cols + ['pane_start']
+        if self.store is None:
+            store = updated_panes
+        else:
+            # Updated panes replace the stored version of the same pane
+            store = self.store.join(updated_panes.select(*keys), keys, 'left_anti').unionByName(updated_panes)
+        newest = store.agg(max('pane_start')).collect()[0][0]
+        if newest is not None:
+            store = store.filter(col('pane_start') > newest - self.retain_secs)
+        store = store.localCheckpoint()         # cut the lineage, the store is rebuilt every batch
+        # the checkpoint blocks belong to the RDD under the LogicalRDD, not to a cached
+        # DataFrame - store.unpersist() would not free them
+        store_rdd = store._jdf.queryExecution().logical().rdd()
+
+        touched = updated_panes.select(*keys) \
+                               .withColumn('_j', explode(array(*[lit(j) for j in range(self.window_secs // self.slide_secs)]))) \
+                               .select(*(self.group_cols + [(col('pane_start') - col('_j') * self.slide_secs).alias('_window_start')])) \
+                               .distinct()
+        windows = assemble_windows(store, self.window_secs, self.slide_secs, self.group_cols, self.aggs)
+        windows = windows.withColumn('_window_start', col('window.start').cast('long')) \
+                         .join(touched, self.group_cols + ['_window_start'], 'left_semi') \
+                         .drop('_window_start')
+        self.sink(windows, batch_id)
+        if self.store_rdd is not None:
+            self.store_rdd.unpersist(False)
+        self.store, self.store_rdd = store, store_rdd
+        print("batch {} panes in store: {}".format(batch_id, store.count()))
+
+
+if __name__ == "__main__":
+    from PySpark_StockParsing import stock_csv_schema
+    from PySpark_EventTime import reconstruct_event_time
+    from PySpark_Session import get_session
+
+    spark = get_session('PaneWindows')
+
+    stock_json = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/streaming-stock-data-json/'
+    aggs = {'units_bought': ('sum', 'units_bought'), 'units_sold': ('sum', 'units_sold'),
+            'events': ('count', 'ticker'), 'min_sold': ('min', 'units_sold'), 'max_sold': ('max', 'units_sold')}
+
+    # Batch - compare with today's window() API
+    stockDf = reconstruct_event_time(spark.read.format('json').schema(stock_csv_schema).load(stock_json))
+    panes = pane_sliding_window(stockDf, 'event_ts', '10 minutes', '2 minutes', ['ticker'], aggs)
+    today = builtin_sliding_window(stockDf, 'event_ts', '10 minutes', '2 minutes', ['ticker'], aggs)
+    print("rows only in one of the two results: ",
+          panes.subtract(today.select(*panes.columns)).count() + today.select(*panes.columns).subtract(panes).count())
+
+    # Streaming
+    stockStream = reconstruct_event_time(spark.readStream.format('json').schema(stock_csv_schema)
+                                         .option('maxFilesPerTrigger', 1).load(stock_json))
+    paneStream = streaming_panes(stockStream, 'event_ts', '2 minutes', ['ticker'], aggs, watermark='10 minutes')
+    assembler = PaneWindowAssembler(spark, '10 minutes', '2 minutes', ['ticker'], aggs,
+                                    lambda df, batch_id: df.orderBy('window', 'ticker').show(10, False))
+    query = paneStream.writeStream.foreachBatch(assembler).outputMode('update') \
+                      .trigger(processingTime='10 seconds').start()
+    query.awaitTermination()
@@ -0,0 +1,224 @@
+from pyspark.sql import DataFrame, SparkSession
+from PySpark_ConcurrentQueries import finished_stage_attempts
+from PySpark_Session import total_cores
+from datetime import datetime
+import json
+import math
+import os
+import re
+import time
+
+#-----------------------------------------------------------------------------------------------
+'''
+Input-size-driven shuffle partitions for Spark 2.4 (no adaptive query execution)
+-------------------------------------------------------------------------------
+spark.sql.shuffle.partitions is one number for every query: 200 tiny tasks for the sample files,
+too few tasks for big inputs. Spark 2.4 has no AQE to coalesce/split shuffle partitions at run
+time, so the count has to be right BEFORE the query is planned.
+
+planner = PartitionPlanner(ss, target_bytes=64 MB, log_path='<dir>/partition_plans.jsonl')
+rows = planner.run('top_sales', df, lambda d: d.collect())     # plans with its own count, runs, logs
+out  = planner.for_write('car_by_country', df, ['country_sold_in'])
+out.write.partitionBy('country_sold_in').parquet(...)          # files of <= ~target_file_bytes
+
+Estimates:
+- input bytes  = size of every input file of the plan (df.inputFiles()), x shuffle_expansion for
+                 compressed columnar formats (parquet/orc are ~2-4x bigger once decoded)
+- output bytes = optimizedPlan().stats().sizeInBytes (projection aware, filters not - an upper
+                 bound without CBO)
+shuffle partitions = ceil(bytes / target_bytes), within [min_partitions, max_partitions], and
+rounded up to a multiple of the cores (executor cores, not defaultParallelism) when it is
+above them (no half-empty last wave).
+Write partitions   = ceil(output bytes / target_file_bytes); coalesce() when it only reduces the
+                     partitions and no partition columns are given (no shuffle), else repartition().
+File size cap      = spark.sql.files.maxRecordsPerFile = target_file_bytes / estimated row size
+                     (plan size / row count, or the schema's default size), set on the cloned
+                     session of the returned DataFrame. With partition columns,
+                     repartition(n, *cols) sends every row of one key to ONE task - without the
+                     cap that is one file per directory whatever n is. The cap splits a big key
+                     into several files, but a skewed key is still written by a single task.
+
+run() does not touch ss.conf: the query is planned again in a clone of df's session
+(cloneSession - same confs and temp views, own SQLConf) with the planned shuffle partitions, as a
+new Dataset over df's logical plan. So concurrent runners do not change each other's count, and
+a df that was already planned (an earlier action, explain()) still gets the new count. The
+action gets that new DataFrame - run the action on d, not on the outer df.
+
+Every decision is appended to log_path (JSON lines) together with the measured stages of the run
+(tasks, duration, executor run time, input/shuffle bytes) from the UI REST API, so the target can
+be tuned from real numbers.
+'''
+#-----------------------------------------------------------------------------------------------
+
+MB = 1024 * 1024
+SHUFFLE_EXPANSION = {'parquet': 3.0, 'orc': 3.0}
+
+
+def _local_path(uri):
+    path = re.sub(r'^file:(//)?', '', uri)
+    return path if '://' not in path else None
+
+
+def input_bytes(df):
+    total = 0
+    for uri in df.inputFiles():
+        path = _local_path(uri)
+        if path and os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+def plan_bytes(df):
+    return int(df._jdf.queryExecution().optimizedPlan().stats().sizeInBytes().toString())
+
+
+FILE_RELATION = re.compile(r'Relation\[[^\]]*\]\s+(\w+)')     # Relation[a#1,b#2] parquet
+
+
+def _input_format(df):
+    plan = df._jdf.queryExecution().optimizedPlan().toString()
+    formats = set(fmt.lower() for fmt in FILE_RELATION.findall(plan))
+    for fmt in SHUFFLE_EXPANSION:
+        if fmt in formats:
+            return fmt
+    return None
+
+
+def with_conf(df, conf):
+    # df planned again in a clone of its session with conf on top (own SQLConf)
+    ss = df.sql_ctx.sparkSession
+    jclone = ss._jsparkSession.cloneSession()
+    for key, value in conf.items():
+        jclone.conf().set(key, str(value))
+    clone = SparkSession(ss.sparkContext, jclone)
+    jdf = ss._jvm.org.apache.spark.sql.Dataset.ofRows(jclone, df._jdf.queryExecution().logical())
+    return DataFrame(jdf, clone._wrapped)
+
+
+def row_bytes(df):
+    stats = df._jdf.queryExecution().optimizedPlan().stats()
+    if stats.rowCount().isDefined() and int(stats.rowCount().get().toString()) > 0:
+        return max(1, int(stats.sizeInBytes().toString()) // int(stats.rowCount().get().toString()))
+    return max(1, df._jdf.schema().defaultSize())
+
+
+def _stage_time(text):
+    return datetime.strptime(text, '%Y-%m-%dT%H:%M:%S.%fGMT') if text else None
+
+
+def stage_summary(attempt):
+    start, end = _stage_time(attempt.get('submissionTime')), _stage_time(attempt.get('completionTime'))
+    return {'stage_id': attempt['stageId'], 'name': attempt.get('name', '').split(' at ')[0],
+            'status': attempt.get('status'), 'tasks': attempt.get('numTasks') or 0,
+            'duration_ms': int((end - start).total_seconds() * 1000) if start and end else None,
+            'executor_run_ms': attempt.get('executorRunTime'), 'input_bytes': attempt.get('inputBytes'),
+            'shuffle_read_bytes': attempt.get('shuffleReadBytes'),
+            'shuffle_write_bytes': attempt.get('shuffleWriteBytes')}
+
+
+class PartitionPlanner(object):
+
+    def __init__(self, ss, target_bytes=64 * MB, target_file_bytes=128 * MB, min_partitions=1,
+                 max_partitions=2000, log_path=None):
+        self.ss = ss
+        self.target_bytes = target_bytes
+        self.target_file_bytes = target_file_bytes
+        self.min_partitions = min_partitions
+        self.max_partitions = max_partitions
+        self.log_path = log_path
+        self.cores = total_cores(ss.sparkContext)
+
+    #-------------------------------------------------------------------------------------------
+    # Decisions
+    #-------------------------------------------------------------------------------------------
+    def partitions_for(self, nbytes, target):
+        n = int(math.ceil(float(nbytes) / target)) if nbytes else 1
+        n = max(self.min_partitions, min(self.max_partitions, n))
+        if n > self.cores:
+            n = int(math.ceil(float(n) / self.cores)) * self.cores
+        return min(n, self.max_partitions)
+
+    def shuffle_decision(self, df):
+        raw = input_bytes(df)
+        fmt = _input_format(df)
+        estimated = int(raw * SHUFFLE_EXPANSION.get(fmt, 1.0)) if raw else plan_bytes(df)
+        return {'input_bytes': raw, 'input_format': fmt, 'estimated_bytes': estimated,
+                'target_bytes': self.target_bytes,
+                'shuffle_partitions': self.partitions_for(estimated, self.target_bytes)}
+
+    #-------------------------------------------------------------------------------------------
+    # Run a query with its own shuffle partition count
+    #-------------------------------------------------------------------------------------------
+    def run(self, name, df, action=lambda d: d.collect()):
+        sc = self.ss.sparkContext
+        decision = self.shuffle_decision(df)
+        planned = with_conf(df, {'spark.sql.shuffle.partitions': decision['shuffle_partitions']})
+        group = 'planner-{}-{}'.format(name, int(time.time() * 1000))
+        start = time.time()
+        try:
+            sc.setJobGroup(group, name)
+            result = action(planned)
+        finally:
+            sc.setLocalProperty('spark.jobGroup.id', None)
+        self._log(name, 'query', decision, time.time() - start, group)
+        return result
+
+    def for_write(self, name, df, partition_cols=None):
+        estimated = plan_bytes(df)
+        n = self.partitions_for(estimated, self.target_file_bytes)
+        max_records = max(1, self.target_file_bytes // row_bytes(df))
+        current = df.rdd.getNumPartitions()
+        if partition_cols:
+            out, how = df.repartition(n, *partition_cols), 'repartition'
+        elif n < current:
+            out, how = df.coalesce(n), 'coalesce'
+        else:
+            out, how = df.repartition(n), 'repartition'
+        self._log(name, 'write', {'estimated_bytes': estimated, 'target_bytes': self.target_file_bytes,
+                                  'current_partitions': current, 'write_partitions': n, 'how': how,
+                                  'max_records_per_file': max_records,
+                                  'partition_cols': partition_cols or []})
+        return with_conf(out, {'spark.sql.files.maxRecordsPerFile': max_records})
+
+    def write(self, name, df, write_action, partition_cols=None):
+        # for_write() + run the write (write_action(df) does df.write...save()) with planned shuffles
+        return self.run(name, self.for_write(name, df, partition_cols), write_action)
+
+    #-------------------------------------------------------------------------------------------
+    # Log decision + measured stages
+    #-------------------------------------------------------------------------------------------
+    def _log(self, name, kind, decision, elapsed=None, group=None):
+        record = dict(decision, name=name, kind=kind, at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        if elapsed is not None:
+            record['elapsed_ms'] = int(elapsed * 1000)
+        if group is not None:
+            record['stages'] = [stage_summary(a) for a in finished_stage_attempts(self.ss.sparkContext, group)]
+        print("partition plan {} ({}): {}".format(name, kind, dict((k, v) for k, v in record.items() if k != 'stages')))
+        for stage in record.get('stages', []):
+            print("    stage {stage_id:>4} {name:30} tasks {tasks:>5}  {duration_ms} ms".format(**stage))
+        if self.log_path:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        return record
+
+
+if __name__ == "__main__":
+    from pyspark.sql.functions import col
+    from PySpark_Session import get_session
+
+    ss = get_session('PartitionPlanner')
+
+    car_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/car_sales_information.json'
+    out_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/OutputFile/car_by_country_planned'
+    log_path = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/partition_plans.jsonl'
+
+    planner = PartitionPlanner(ss, target_bytes=16 * 1024 * 1024, log_path=log_path)
+    carDf = ss.read.format('json').option('inferSchema', 'true').load(car_file)
+
+    top = carDf.select('product_name', 'quantity_sold').filter(col('quantity_sold') > 100000) \
+               .orderBy(col('quantity_sold').desc())
+    planner.run('top_sales', top, lambda d: d.collect())
+    by_country = carDf.groupBy('country_sold_in', 'product_name').sum('quantity_sold')
+    planner.write('car_by_country', by_country,
+                  lambda d: d.write.mode('overwrite').partitionBy('country_sold_in').parquet(out_dir),
+                  partition_cols=['country_sold_in'])
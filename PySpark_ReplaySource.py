@@ -0,0 +1,216 @@
+import argparse
+import glob
+import json
+import os
+import socket
+import time
+
+#-----------------------------------------------------------------------------------------------
+'''
+Rate-controlled local replay source for load testing the streaming jobs
+-----------------------------------------------------------------------
+Instead of typing into "nc -lk 20000" or copying files into streamFiles/ by hand, replay a sample
+file (car_sales_data.csv, streaming-stock-data-csv/*) at a fixed rate, with optional bursts:
+
+  Socket   > python PySpark_ReplaySource.py socket  <files> --port 20000 --rate 500
+  Directory> python PySpark_ReplaySource.py dir     <files> --out-dir <watched dir> --rate 500 --lines-per-file 1000
+  Sweep    > python PySpark_ReplaySource.py sweep   <files> --rates 100,500,1000,5000 --metrics <jsonl>
+
+--burst-lines N --burst-every S  > every S seconds N extra lines are sent at once
+--stamp                          > appends ",<epoch millis when sent>" to every line, so the job can
+                                   measure end to end latency (see add_latency_probe()). Remember
+                                   to add a "sent_ts" LongType column to the schema of file sources.
+
+Max sustainable throughput: the sweep replays each rate for --duration seconds while the job
+writes per-batch latency to a JSON lines file (add_latency_probe). A rate is sustainable if the
+p95 latency stays under --max-latency and does not keep growing batch after batch.
+
+Files in the watched directory are written to a temp name first and then renamed, because file
+sources must see each file complete and only once.
+'''
+#-----------------------------------------------------------------------------------------------
+
+
+def read_lines(paths, loop=True):
+    while True:
+        for path in paths:
+            with open(path) as f:
+                for line in f:
+                    line = line.rstrip('\n')
+                    if line:
+                        yield line
+        if not loop:
+            return
+
+
+def paced(lines, rate, burst_lines=0, burst_every=0, duration=None, stamp=False):
+    # Simple pacing: line i is due at start + i/rate; bursts are sent on top of the base rate
+    start = time.time()
+    next_burst = start + burst_every if burst_every else None
+    sent = 0
+    for line in lines:
+        now = time.time()
+        if duration is not None and now - start >= duration:
+            return
+        due = start + float(sent) / rate
+        if due > now:
+            time.sleep(due - now)
+        batch = [line]
+        if next_burst is not None and now >= next_burst:
+            batch.extend(next(lines, None) for _ in range(burst_lines))
+            batch = [l for l in batch if l is not None]
+            next_burst += burst_every
+        for l in batch:
+            yield l + ',' + str(int(time.time() * 1000)) if stamp else l
+        sent += 1
+
+
+def replay_socket(paths, port=20000, rate=100, burst_lines=0, burst_every=0, duration=None, stamp=False):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('localhost', port))
+    server.listen(1)
+    print("Waiting for the streaming job to connect on port {} ...".format(port))
+    conn, addr = server.accept()
+    sent = 0
+    try:
+        for line in paced(read_lines(paths), rate, burst_lines, burst_every, duration, stamp):
+            conn.sendall((line + '\n').encode('utf-8'))
+            sent += 1
+    except (BrokenPipeError, ConnectionResetError):
+        print("Streaming job disconnected")
+    finally:
+        conn.close()
+        server.close()
+    return sent
+
+
+def replay_directory(paths, out_dir, rate=100, lines_per_file=1000, burst_lines=0, burst_every=0,
+                     duration=None, stamp=False):
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    chunk, file_no, sent = [], 0, 0
+
+    def flush(chunk, file_no):
+        tmp = os.path.join(out_dir, '.replay-{:06d}.tmp'.format(file_no))
+        with open(tmp, 'w') as f:
+            f.write('\n'.join(chunk) + '\n')
+        os.rename(tmp, os.path.join(out_dir, 'replay-{}-{:06d}.csv'.format(int(time.time()), file_no)))
+
+    for line in paced(read_lines(paths), rate, burst_lines, burst_every, duration, stamp):
+        chunk.append(line)
+        sent += 1
+        if len(chunk) >= lines_per_file:
+            flush(chunk, file_no)
+            chunk, file_no = [], file_no + 1
+    if chunk:
+        flush(chunk, file_no)
+    return sent
+
+
+#-----------------------------------------------------------------------------------------------
+# Job side - latency probe (DStreams and Structured Streaming)
+#-----------------------------------------------------------------------------------------------
+def add_latency_probe(dstream, metrics_file):
+    # Last field of every stamped line is the send time in epoch millis
+    def probe(batch_time, rdd):
+        now_ms = int(time.time() * 1000)
+        latencies = rdd.map(lambda l: now_ms - int(l.rsplit(',', 1)[1])).collect()
+        if not latencies:
+            return
+        latencies.sort()
+        record = {'batch_time': str(batch_time), 'ts': now_ms / 1000.0, 'rows': len(latencies),
+                  'p50_ms': latencies[len(latencies) // 2],
+                  'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                  'max_ms': latencies[-1]}
+        with open(metrics_file, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    dstream.foreachRDD(probe)
+
+
+def latency_col(sent_ts_col='sent_ts'):
+    # Structured Streaming: df.withColumn('latency_ms', latency_col())
+    from pyspark.sql.functions import col, current_timestamp
+    return (current_timestamp().cast('double') * 1000 - col(sent_ts_col)).cast('long')
+
+
+#-----------------------------------------------------------------------------------------------
+# Sweep - find the max sustainable rate
+#-----------------------------------------------------------------------------------------------
+def read_metrics(metrics_file, since):
+    if not os.path.exists(metrics_file):
+        return []
+    with open(metrics_file) as f:
+        records = [json.loads(l) for l in f if l.strip()]
+    return [r for r in records if r['ts'] >= since]
+
+
+GROWTH_FLOOR_MS = 1000
+
+
+def is_sustainable(records, max_latency_ms):
+    if len(records) < 3:
+        return False
+    p95 = [r['p95_ms'] for r in records]
+    # Growing latency means a backlog is building, even if it is still under the limit. The
+    # floor keeps a first half of ~0 ms from flagging any latency at all as growth.
+    half = len(p95) // 2
+    first = sum(p95[:half]) / float(half)
+    second = sum(p95[half:]) / float(len(p95) - half)
+    growing = second > max(1.5 * first, first + GROWTH_FLOOR_MS)
+    return max(p95) <= max_latency_ms and not growing
+
+
+def sweep(paths, rates, metrics_file, mode='socket', port=20000, out_dir=None, duration=300,
+          max_latency_ms=120000, cool_down=60):
+    best = None
+    for rate in rates:
+        since = time.time()
+        if mode == 'socket':
+            sent = replay_socket(paths, port, rate, duration=duration, stamp=True)
+        else:
+            sent = replay_directory(paths, out_dir, rate, duration=duration, stamp=True)
+        time.sleep(cool_down)       # let the job drain the last batches
+        records = read_metrics(metrics_file, since)
+        ok = is_sustainable(records, max_latency_ms)
+        p95 = max([r['p95_ms'] for r in records]) if records else None
+        print("rate {:>7}/s | sent {:>9} | batches {:>4} | worst p95 {} ms | {}".format(
+            rate, sent, len(records), p95, 'OK' if ok else 'NOT sustainable'))
+        if ok:
+            best = rate
+    print("Max sustainable rate: {}".format(best))
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay sample files into the streaming jobs')
+    parser.add_argument('mode', choices=['socket', 'dir', 'sweep'])
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--port', type=int, default=20000)
+    parser.add_argument('--out-dir')
+    parser.add_argument('--rate', type=float, default=100, help='lines per second')
+    parser.add_argument('--rates', default='100,500,1000,5000')
+    parser.add_argument('--lines-per-file', type=int, default=1000)
+    parser.add_argument('--burst-lines', type=int, default=0)
+    parser.add_argument('--burst-every', type=float, default=0)
+    parser.add_argument('--duration', type=float)
+    parser.add_argument('--stamp', action='store_true')
+    parser.add_argument('--metrics', help='JSON lines file written by add_latency_probe()')
+    parser.add_argument('--sweep-mode', choices=['socket', 'dir'], default='socket')
+    parser.add_argument('--max-latency', type=int, default=120000, help='p95 latency limit in ms')
+    args = parser.parse_args()
+    if args.mode == 'sweep' and not args.metrics:
+        parser.error('sweep needs --metrics (the file written by add_latency_probe())')
+    if (args.mode == 'dir' or (args.mode == 'sweep' and args.sweep_mode == 'dir')) and not args.out_dir:
+        parser.error('--out-dir is required for dir mode')
+
+    files = sorted(f for pattern in args.files for f in glob.glob(pattern))
+    if args.mode == 'socket':
+        replay_socket(files, args.port, args.rate, args.burst_lines, args.burst_every, args.duration, args.stamp)
+    elif args.mode == 'dir':
+        replay_directory(files, args.out_dir, args.rate, args.lines_per_file, args.burst_lines,
+                         args.burst_every, args.duration, args.stamp)
+    else:
+        sweep(files, [float(r) for r in args.rates.split(',')], args.metrics, args.sweep_mode, args.port,
+              args.out_dir, args.duration or 300, args.max_latency)
@@ -0,0 +1,149 @@
+from PySpark_ArrowConvert import collect_arrow, table_rows
+from PySpark_DatasetCache import DatasetCache
+import hashlib
+import json
+import os
+import re
+import time
+
+#-----------------------------------------------------------------------------------------------
+'''
+Result cache for SQL queries over temp views, keyed by plan fingerprint
+-----------------------------------------------------------------------
+carDf.createOrReplaceTempView("car_table")
+ss.sql("select product_name, quantity_sold from car_table where quantity_sold > 100000 order by ...")
+is run again and again from notebooks/dashboards and every run scans the files again.
+
+cache = ResultCache(cache_dir, max_bytes=512 MB)
+table = cache.sql_arrow(ss, query)      -> pyarrow.Table   (no Spark job on a hit)
+df    = cache.sql(ss, query)            -> DataFrame built from the cached Arrow data
+The result is collected as Arrow batches (df._collectAsArrow(), PySpark_ArrowConvert.py) - no
+pandas step, so nullable ints stay ints and timestamps keep their values.
+
+Fingerprint = sha1 of
+- the OPTIMIZED logical plan as text, with expression ids (#123) removed. Different SQL text that
+  optimizes to the same plan (aliases, extra parentheses, pushed filters...) shares an entry
+- every input file of the plan (df.inputFiles(), directories are walked) with size + mtime
+- spark.sql.session.timeZone (changes timestamp results)
+
+Not cached (counted as 'uncacheable', the query just runs):
+- plans without input files or over local data / RDDs (LocalRelation, LogicalRDD) - there is
+  no file to tell us the data changed
+- inputs that are not on the local file system (hdfs://, s3://)
+- plans whose text was shortened by spark.debug.maxToStringFields ("... n more fields"),
+  since two different queries could print the same - raise that conf if this happens a lot
+
+Storage, size cap (max_bytes), LRU eviction and hit/miss counters come from DatasetCache:
+results are Arrow IPC files, memory-mapped on a hit. Meant for small/medium RESULTS (reports,
+dashboards) - the result goes through the driver once on a miss.
+'''
+#-----------------------------------------------------------------------------------------------
+
+EXPR_ID = re.compile(r'#\d+L?(?![A-Za-z0-9_])')
+UNCACHEABLE_NODES = ('LocalRelation', 'LogicalRDD', 'ExternalRDD')
+TRUNCATED = re.compile(r'\.\.\. \d+ more fields')
+
+
+def normalized_plan(df):
+    return EXPR_ID.sub('', df._jdf.queryExecution().optimizedPlan().toString())
+
+
+def _local_path(uri):
+    if uri.startswith('file:'):
+        return re.sub(r'^file:(//)?', '', uri)
+    if '://' in uri:
+        return None
+    return uri
+
+
+def input_signature(files):
+    # [(path, size, mtime), ...] for every input file, None when a file cannot be checked
+    signature = []
+    for uri in sorted(files):
+        path = _local_path(uri)
+        if path is None or not os.path.exists(path):
+            return None
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                for name in sorted(names):
+                    if not name.startswith('.'):
+                        full = os.path.join(root, name)
+                        signature.append((full, os.path.getsize(full), os.path.getmtime(full)))
+        else:
+            signature.append((path, os.path.getsize(path), os.path.getmtime(path)))
+    return signature
+
+
+class ResultCache(DatasetCache):
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        DatasetCache.__init__(self, cache_dir, max_bytes)
+        self.uncacheable = 0
+
+    def fingerprint(self, df):
+        plan = normalized_plan(df)
+        if TRUNCATED.search(plan) or any(node in plan for node in UNCACHEABLE_NODES):
+            return None
+        files = df.inputFiles()
+        signature = input_signature(files) if files else None
+        if not signature:
+            return None
+        parts = [plan, json.dumps(signature), df.sql_ctx.sparkSession.conf.get('spark.sql.session.timeZone')]
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def put_result(self, key, table, schema, description):
+        self._write_entry(key, table, description, time.time(), schema)
+        self._evict(keep=key)       # LRU only - a changed input gives a new key and the old
+        self._save_index()          # entry simply ages out
+
+    #-------------------------------------------------------------------------------------------
+    # Query API
+    #-------------------------------------------------------------------------------------------
+    def collect_arrow(self, df, description=None):
+        # Arrow batches straight from Spark (no pandas step, no session conf change)
+        key = self.fingerprint(df)
+        if key is None:
+            self.uncacheable += 1
+            return collect_arrow(df)
+        table = self.get_table(key)
+        if table is not None:
+            return table
+        table = collect_arrow(df)
+        self.put_result(key, table, df.schema, description or normalized_plan(df)[:200])
+        return table
+
+    def sql_arrow(self, ss, query):
+        return self.collect_arrow(ss.sql(query), query)
+
+    def sql(self, ss, query):
+        df = ss.sql(query)
+        table = self.collect_arrow(df, query)
+        return ss.createDataFrame(table_rows(table, df.schema), schema=df.schema)
+
+    def stats(self):
+        stats = DatasetCache.stats(self)
+        stats['uncacheable'] = self.uncacheable
+        return stats
+
+
+if __name__ == "__main__":
+    from datetime import datetime
+    from PySpark_Session import get_session
+
+    ss = get_session('ResultCache')
+
+    cache_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/ResultCache'
+    car_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/car_sales_information.json'
+
+    ss.read.format('json').option('inferSchema', 'true').load(car_file).createOrReplaceTempView('car_table')
+    cache = ResultCache(cache_dir, max_bytes=128 * 1024 * 1024)
+    queries = ["select product_name, quantity_sold from car_table where quantity_sold > 100000 order by quantity_sold desc",
+               "select product_name, quantity_sold from car_table where (quantity_sold > 100000) order by quantity_sold desc",
+               "select country_sold_in, sum(quantity_sold) as quantity from car_table group by country_sold_in"]
+    for run in range(2):
+        for query in queries:
+            start_time = datetime.now()
+            table = cache.sql_arrow(ss, query)
+            print("run {} - {} rows in {}".format(run, table.num_rows, datetime.now() - start_time))
+    print(cache.stats())
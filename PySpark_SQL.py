@@ -1,6 +1,8 @@
 from pyspark.sql import SparkSession
+from PySpark_Session import get_session
 
-ss = SparkSession.builder.appName('SparkSQL1').enableHiveSupport().master('local').getOrCreate()
+# ss = SparkSession.builder.appName('SparkSQL1').enableHiveSupport().master('local').getOrCreate()
+ss = get_session('SparkSQL', hive=True)         # one shared session (see PySpark_Session.py)
 # ss1 = SparkSession.builder.appName('SparkSQL1').master('local').getOrCreate()
 # print(ss1.sparkContext.getConf().getAll())
 
@@ -21,8 +23,8 @@ Set up some configuration properties in '$SPARK_HOME/conf'
 ## Note: Change default SQL Warehouse Directory for the application
 #--------------------------------------------------------------------------------------------------------------------------------------------------
 # ss = SparkSession.builder.appName('SparkSQL').config('spark.sql.warehouse.dir','/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/SparkSqlDataDir').master('local').getOrCreate()
-ss = SparkSession.builder.appName('SparkSQL').master('local').getOrCreate()
-ss.sparkContext.setLogLevel("ERROR")
+# ss = SparkSession.builder.appName('SparkSQL').master('local').getOrCreate()
+# ss.sparkContext.setLogLevel("ERROR")
 
 # ss.sql("show databases").show()
 # ss.sql("create database hivedb")
@@ -42,13 +44,30 @@ ss.sparkContext.setLogLevel("ERROR")
 #-----------------------------------------------------------------------------------------------
 # car_file='/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/car_sales_information.json'
 # carDf = ss.read.format('json').option('inferSchema','true').load(car_file)
+# from PySpark_DatasetCache import DatasetCache      # parse once, memory-map on later runs
+# carDf = DatasetCache('/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/DatasetCache').read(ss, car_file, 'json', inferSchema='true')
 # carDf.createOrReplaceTempView("car_table")
 
 from pyspark.sql.functions import col
 # carSql = ss.sql("select product_name, quantity_sold from car_table where quantity_sold > 100000 order by quantity_sold desc")
 # ss.sql("select product_name, quantity_sold from car_table where quantity_sold > 100000 order by quantity_sold desc").show()
+# Same query again and again (notebooks/dashboards) > serve it from the plan-fingerprint result cache (PySpark_ResultCache.py)
+# from PySpark_ResultCache import ResultCache
+# resultCache = ResultCache('/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/ResultCache')
+# resultCache.sql(ss, "select product_name, quantity_sold from car_table where quantity_sold > 100000 order by quantity_sold desc").show()
+# print(resultCache.stats())
 # carSql.write.mode('append').saveAsTable("intellipaat.car_table")
 # carDf.write.mode('append').saveAsTable("intellipaat.car_table")
+# Reports over the appended table > keep the GROUP BY result up to date from the new files only (PySpark_IncrementalAggregates.py)
+# from PySpark_IncrementalAggregates import AggregateTable, append_and_refresh
+# byCountry = AggregateTable(ss, 'intellipaat.car_by_country', 'intellipaat.car_table',
+#                            "select country_sold_in, sum(quantity_sold) as quantity, count(*) as sales from {source} group by country_sold_in")
+# append_and_refresh(carDf, 'intellipaat.car_table', [byCountry])
+# saveAsTable() collects no statistics > refresh table/column stats (+ value counts of skewed columns) after each write (PySpark_TableStats.py)
+# from PySpark_TableStats import TableStats, enable_cbo, save_table_with_stats
+# enable_cbo(ss)
+# carStats = TableStats(ss, 'intellipaat.car_table', histogram_columns=['quantity_sold'], skew_columns=['country_sold_in'])
+# save_table_with_stats(carDf, 'intellipaat.car_table', carStats, mode='append')
 
 # carDf.select('product_name', 'quantity_sold').filter(col('quantity_sold') > 100000).orderBy(col('quantity_sold').desc()).show()
 
@@ -101,4 +120,20 @@ from pyspark.sql.functions import col
 ## "bucketBy" operation while saving as table"
 ## df.format().bucketBy(<no. of buckets>,<list of cols>).saveAsTable(<table name>)
 #-----------------------------------------------------------------------------------------------
+# carDf.write.format('parquet').bucketBy(8,'product_name').sortBy('product_name').saveAsTable('hivedb.car_table_bucketed')
+#
+# Bucketed emp/dept (dept_id) and inspections/violations (location_id, date) with matching
+# no. of buckets, so the joins plan without an Exchange (see PySpark_BucketedTables.py)
+# from PySpark_BucketedTables import publish_join_tables, compare_joins, has_shuffle
+# publish_join_tables(ss, '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata')
+# joinDf = ss.table('bucketdb.emp').join(ss.table('bucketdb.dept'), ['dept_id'], 'inner')
+# print(has_shuffle(joinDf))
 
+#-----------------------------------------------------------------------------------------------
+## Independent queries > run them together in FAIR scheduler pools and compare with serial (PySpark_ConcurrentQueries.py)
+## (fair_session() has to create the session - spark.scheduler.mode is read when the SparkContext starts)
+#-----------------------------------------------------------------------------------------------
+# from PySpark_ConcurrentQueries import Query, fair_session, compare
+# queries = [Query('top_sales', "select product_name, quantity_sold from car_table where quantity_sold > 100000 order by quantity_sold desc", 'interactive'),
+#            Query('by_country', "select country_sold_in, sum(quantity_sold) from car_table group by country_sold_in", 'batch')]
+# compare(ss, queries)
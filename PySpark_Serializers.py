@@ -0,0 +1,364 @@
+from pyspark import SparkConf, SparkContext
+from pyspark.rdd import RDD, Partitioner, portable_hash
+from pyspark.serializers import FramedSerializer, BatchedSerializer, PickleSerializer, MarshalSerializer, \
+    pack_long
+from array import array
+from collections import defaultdict
+from datetime import datetime
+import os
+import pickle
+import struct
+import time
+
+#-----------------------------------------------------------------------------------------------
+'''
+Serializers for Python RDD pipelines
+------------------------------------
+Every record that crosses the Python <-> JVM boundary (shuffle, cache, collect) is serialized
+by the SparkContext serializer: pickle, in batches sized automatically (AutoBatchedSerializer).
+For the pair RDDs of PySpark_PairRDD.py - ('Camry', 12), (('Camry', 'Japan'), 12) - pickle
+writes opcodes + memo entries for every tuple, which costs more than the data itself.
+
+Context wide (every RDD and every shuffle of that SparkContext):
+SparkContext(conf, serializer=MarshalSerializer(), batchSize=0|1|n)
+  batchSize 0 = auto-batched (default), 1 = one frame per record, n = n records per frame
+
+Per RDD, for records of a KNOWN shape:
+shape = (('s', 's'), 'i')                   s = str, i = int (64 bit), f = float, nested tuples
+compact = CompactSerializer(shape)
+totals = reduce_by_key(pairs, lambda x, y: x + y, compact)     # shuffle data in compact form
+rows = with_serializer(pairs, compact).cache()                 # cached/collected in compact form
+
+CompactSerializer writes a batch column by column: ints as one packed array of the smallest
+integer type that fits the batch, floats as doubles, strings dictionary encoded (every distinct
+string once + a 1/2/4 byte code per record - product names, countries, states repeat a lot).
+Native byte order, like the rest of the Python <-> JVM protocol on one cluster. A batch that
+does not fit the shape (None, a wrong type - a bool in an int column, an int in a float column,
+a list/Row/namedtuple where a tuple is expected) is pickled instead, so a bad record costs
+speed, never correctness.
+reduce_by_key() is PairRDD.reduceByKey with its own shuffle serializer - map-side combine, hash
+partitioning with portable_hash - without the spill to disk of the built-in one (the combined
+keys of one partition must fit in the Python worker).
+
+benchmark() runs QNS 1, 2, 4 and 5 of the car sales pair-RDD questions under every serializer
+and batch size and reports time, shuffle write bytes (UI REST API) and whether the answer is the
+same as with the default. serializer_costs() measures bytes and time per record in Python only.
+Each context-wide configuration needs a new SparkContext - run it as its own script.
+'''
+#-----------------------------------------------------------------------------------------------
+
+COMPACT, PICKLED = b'C', b'P'
+INT_TYPES = [('b', 1 << 7), ('h', 1 << 15), ('i', 1 << 31), ('q', 1 << 63)]
+BUCKET_RECORDS = 1000
+COLUMN_TYPES = {'s': str, 'i': int, 'f': float}
+
+
+#-----------------------------------------------------------------------------------------------
+# Compact typed encoding
+#-----------------------------------------------------------------------------------------------
+def _leaves(shape):
+    if isinstance(shape, tuple):
+        return [leaf for part in shape for leaf in _leaves(part)]
+    if shape not in ('s', 'i', 'f'):
+        raise ValueError('unknown field type {!r} - use s, i, f or a tuple of them'.format(shape))
+    return [shape]
+
+
+def _flatten(record, shape, out):
+    if isinstance(shape, tuple):
+        # plain tuples only: loads() rebuilds tuples, a list/Row/namedtuple would come back changed
+        if type(record) is not tuple or len(record) != len(shape):
+            raise TypeError('record {!r} does not have shape {!r}'.format(record, shape))
+        for value, part in zip(record, shape):
+            _flatten(value, part, out)
+    else:
+        out.append(record)
+    return out
+
+
+def _int_type(largest, smallest):
+    # smallest array typecode that holds every value of the column
+    for code, limit in INT_TYPES:
+        if -limit <= smallest and largest < limit:
+            return code
+    raise OverflowError('{} does not fit in 64 bits'.format(largest if largest >= limit else smallest))
+
+
+def _build(shape, columns, i):
+    # one record from the leaf columns, consuming them in order
+    if isinstance(shape, tuple):
+        return tuple(_build(part, columns, i) for part in shape)
+    return next(columns)[i]
+
+
+class CompactSerializer(FramedSerializer):
+
+    def __init__(self, shape):
+        FramedSerializer.__init__(self)
+        self.shape = shape
+        self.leaves = _leaves(shape)
+
+    def _encode_column(self, kind, values):
+        # exact types only: array() takes True for an int and 1 for a float, and both would come
+        # back as another type - the TypeError makes dumps() pickle the batch instead
+        expected = COLUMN_TYPES[kind]
+        for v in values:
+            if type(v) is not expected:
+                raise TypeError('{!r} in a {!r} column'.format(v, kind))
+        if kind == 's':
+            # dictionary encoded: distinct strings once + one small integer code per record
+            distinct = {}
+            codes = [distinct.setdefault(v, len(distinct)) for v in values]
+            encoded = [v.encode('utf-8') for v in distinct]
+            lengths = array('I', [len(v) for v in encoded]).tobytes()
+            code_type = _int_type(len(distinct) - 1, 0)
+            return code_type.encode() + struct.pack('<II', len(encoded), len(lengths)) + lengths + \
+                b''.join(encoded) + array(code_type, codes).tobytes()
+        if kind == 'i':
+            int_type = _int_type(max(values or [0]), min(values or [0]))
+            return int_type.encode() + array(int_type, values).tobytes()
+        return array('d', values).tobytes()
+
+    def _decode_column(self, kind, data):
+        if kind == 's':
+            code_type = data[:1].decode()
+            count, size = struct.unpack_from('<II', data, 1)
+            lengths = array('I')
+            lengths.frombytes(data[9:9 + size])
+            distinct, offset = [], 9 + size
+            for length in lengths:
+                distinct.append(data[offset:offset + length].decode('utf-8'))
+                offset += length
+            codes = array(code_type)
+            codes.frombytes(data[offset:])
+            return [distinct[c] for c in codes]
+        values = array(data[:1].decode()) if kind == 'i' else array('d')
+        values.frombytes(data[1:] if kind == 'i' else data)
+        return values.tolist()
+
+    def dumps(self, records):
+        try:
+            flat = [_flatten(r, self.shape, []) for r in records]
+            columns = list(zip(*flat)) if flat else [() for _ in self.leaves]
+            parts = [self._encode_column(kind, values) for kind, values in zip(self.leaves, columns)]
+        except (TypeError, AttributeError, OverflowError):
+            return PICKLED + pickle.dumps(records, pickle.HIGHEST_PROTOCOL)
+        header = struct.pack('<I', len(records)) + b''.join(struct.pack('<I', len(p)) for p in parts)
+        return COMPACT + header + b''.join(parts)
+
+    def loads(self, data):
+        if data[:1] == PICKLED:
+            return pickle.loads(data[1:])
+        n = struct.unpack_from('<I', data, 1)[0]
+        sizes = struct.unpack_from('<{}I'.format(len(self.leaves)), data, 5)
+        offset = 5 + 4 * len(self.leaves)
+        columns = []
+        for kind, size in zip(self.leaves, sizes):
+            columns.append(self._decode_column(kind, data[offset:offset + size]))
+            offset += size
+        return [_build(self.shape, iter(columns), i) for i in range(n)]
+
+    def __repr__(self):
+        return 'CompactSerializer({!r})'.format(self.shape)
+
+
+#-----------------------------------------------------------------------------------------------
+# Per RDD serializers
+#-----------------------------------------------------------------------------------------------
+def _ship(sc):
+    # the Python workers unpickle CompactSerializer, so they need this module
+    if os.path.basename(__file__) not in sc._python_includes:
+        sc.addPyFile(os.path.abspath(__file__))
+
+
+def with_serializer(rdd, serializer, batch_size=BUCKET_RECORDS):
+    # the records of rdd leave Python (cache, collect, union) in this format
+    _ship(rdd.ctx)
+    if isinstance(serializer, CompactSerializer):
+        serializer = BatchedSerializer(serializer, batch_size)
+    return rdd._reserialize(serializer)
+
+
+def partition_by(rdd, num_partitions, serializer, partition_func=portable_hash, batch_size=BUCKET_RECORDS):
+    # RDD.partitionBy with the shuffle data written by serializer (frames of batch_size pairs)
+    _ship(rdd.ctx)
+
+    def add_shuffle_key(split, iterator):
+        buckets = defaultdict(list)
+        for k, v in iterator:
+            bucket = partition_func(k) % num_partitions
+            buckets[bucket].append((k, v))
+            if len(buckets[bucket]) >= batch_size:
+                yield pack_long(bucket)
+                yield serializer.dumps(buckets.pop(bucket))
+        for bucket, pairs in buckets.items():
+            yield pack_long(bucket)
+            yield serializer.dumps(pairs)
+
+    ctx = rdd.ctx
+    keyed = rdd.mapPartitionsWithIndex(add_shuffle_key, preservesPartitioning=True)
+    keyed._bypass_serializer = True
+    pairs = ctx._jvm.PairwiseRDD(keyed._jrdd.rdd()).asJavaPairRDD()
+    partitioner = ctx._jvm.PythonPartitioner(num_partitions, id(partition_func))
+    jrdd = ctx._jvm.PythonRDD.valueOfPair(pairs.partitionBy(partitioner))
+    shuffled = RDD(jrdd, ctx, BatchedSerializer(serializer))
+    shuffled.partitioner = Partitioner(num_partitions, partition_func)
+    return shuffled
+
+
+def reduce_by_key(rdd, func, serializer, num_partitions=None, batch_size=BUCKET_RECORDS):
+    def combine(iterator):
+        merged = {}
+        for k, v in iterator:
+            merged[k] = func(merged[k], v) if k in merged else v
+        return iter(merged.items())
+
+    num_partitions = num_partitions or rdd._defaultReducePartitions()
+    combined = rdd.mapPartitions(combine, preservesPartitioning=True)
+    return partition_by(combined, num_partitions, serializer, batch_size=batch_size) \
+        .mapPartitions(combine, preservesPartitioning=True)
+
+
+#-----------------------------------------------------------------------------------------------
+# Pair RDD questions of PySpark_PairRDD.py (car_sales_data.csv)
+#-----------------------------------------------------------------------------------------------
+def _quantity_pairs(key_columns, require=None):
+    def parse(line):
+        fields = line.split(',')
+        if require is not None and not fields[require]:
+            return []
+        try:
+            quantity = int(fields[5])
+        except (ValueError, IndexError):
+            return []
+        key = tuple(fields[c] for c in key_columns)
+        return [(key[0] if len(key) == 1 else key, quantity)]
+    return parse
+
+
+def _add(x, y):
+    return x + y
+
+
+def _top(rdd, n):
+    return rdd.takeOrdered(n, key=lambda kv: (-kv[1], kv[0]))
+
+
+def qns1_product_occurrence(lines, reduce):
+    return _top(reduce(lines.map(lambda x: (x.split(',')[3], 1)), _add), 10)
+
+
+def qns2_product_quantity(lines, reduce):
+    return _top(reduce(lines.flatMap(_quantity_pairs([3])), _add), 5)
+
+
+def qns4_model_country(lines, reduce):
+    return _top(reduce(lines.flatMap(_quantity_pairs([3, 11])), _add), 25)
+
+
+def qns5_state_country(lines, reduce):
+    return sorted(reduce(lines.flatMap(_quantity_pairs([11, 10], require=10)), _add).collect())
+
+
+QUESTIONS = [('QNS 1 product occurrence', qns1_product_occurrence, ('s', 'i')),
+             ('QNS 2 product quantity', qns2_product_quantity, ('s', 'i')),
+             ('QNS 4 model x country', qns4_model_country, (('s', 's'), 'i')),
+             ('QNS 5 country x state', qns5_state_country, (('s', 's'), 'i'))]
+
+
+#-----------------------------------------------------------------------------------------------
+# Benchmarks
+#-----------------------------------------------------------------------------------------------
+def serializer_costs(records, serializers, batch_size=BUCKET_RECORDS):
+    # Python only: bytes and microseconds per record to dumps + loads batches of records
+    results = []
+    batches = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+    for name, serializer in serializers:
+        start = time.time()
+        frames = [serializer.dumps(b) for b in batches]
+        middle = time.time()
+        for frame in frames:
+            serializer.loads(frame)
+        end = time.time()
+        n = float(len(records)) or 1.0
+        results.append({'serializer': name, 'bytes_per_record': round(sum(len(f) for f in frames) / n, 1),
+                        'dumps_us': round((middle - start) * 1e6 / n, 2),
+                        'loads_us': round((end - middle) * 1e6 / n, 2)})
+        print("{:28} {:>8} bytes/record  dumps {:>6} us  loads {:>6} us".format(
+            name, results[-1]['bytes_per_record'], results[-1]['dumps_us'], results[-1]['loads_us']))
+    return results
+
+
+def _context(app_name, serializer, batch_size):
+    from PySpark_Session import session_defaults, detect_cores, detect_memory_mb, stop_session
+
+    stop_session()      # one SparkContext per process - the serializer is fixed when it starts
+    conf = SparkConf().setAppName(app_name)
+    for key, value in session_defaults(conf.get('spark.master', 'local[*]'), detect_cores(),
+                                       detect_memory_mb()).items():
+        conf.setIfMissing(key, value)
+    sc = SparkContext(conf=conf, serializer=serializer, batchSize=batch_size)
+    sc.setLogLevel('ERROR')
+    return sc
+
+
+def _run(sc, lines, name, question, reduce, label):
+    # imported here: the workers import this module for CompactSerializer and need none of it
+    from PySpark_ConcurrentQueries import finished_stage_attempts
+
+    group = 'serializer-{}-{}'.format(label, name)
+    sc.setJobGroup(group, name)
+    start_time = datetime.now()
+    try:
+        answer = question(lines, reduce)
+    finally:
+        sc.setLocalProperty('spark.jobGroup.id', None)
+    elapsed = (datetime.now() - start_time).total_seconds()
+    shuffle_bytes = sum(a.get('shuffleWriteBytes', 0) for a in finished_stage_attempts(sc, group))
+    return answer, elapsed, shuffle_bytes
+
+
+CONTEXT_SERIALIZERS = [('pickle auto-batched', PickleSerializer, 0),
+                       ('pickle batch 1', PickleSerializer, 1),
+                       ('pickle batch 100', PickleSerializer, 100),
+                       ('pickle batch 10000', PickleSerializer, 10000),
+                       ('marshal auto-batched', MarshalSerializer, 0),
+                       ('marshal batch 1000', MarshalSerializer, 1000)]
+COMPACT_BATCH_SIZES = [100, 1000, 10000]
+
+
+def benchmark(path, copies=20, questions=QUESTIONS):
+    results, expected = [], {}
+
+    def report(label, name, answer, elapsed, shuffle_bytes):
+        same = expected.setdefault(name, answer) == answer
+        results.append({'config': label, 'question': name, 'secs': round(elapsed, 3),
+                        'shuffle_write_bytes': shuffle_bytes, 'same_answer': same})
+        print("{:24} {:28} {:>8.3f} s  shuffle {:>12} bytes{}".format(
+            label, name, elapsed, shuffle_bytes, '' if same else '  DIFFERENT ANSWER'))
+
+    for label, serializer_class, batch_size in CONTEXT_SERIALIZERS:
+        sc = _context('Serializers', serializer_class(), batch_size)
+        lines = sc.union([sc.textFile(path)] * copies).cache()
+        lines.count()
+        for name, question, shape in questions:
+            report(label, name, *_run(sc, lines, name, question, lambda rdd, f: rdd.reduceByKey(f), label))
+
+        if label == CONTEXT_SERIALIZERS[0][0]:
+            # per RDD compact shuffle in the default context
+            for batch in COMPACT_BATCH_SIZES:
+                compact_label = 'compact batch {}'.format(batch)
+                for name, question, shape in questions:
+                    reduce = lambda rdd, f, s=shape, b=batch: reduce_by_key(rdd, f, CompactSerializer(s), batch_size=b)
+                    report(compact_label, name, *_run(sc, lines, name, question, reduce, compact_label))
+            sample = lines.flatMap(_quantity_pairs([3, 11])).take(100000)
+            serializer_costs(sample, [('pickle', PickleSerializer()), ('marshal', MarshalSerializer()),
+                                      ('compact', CompactSerializer((('s', 's'), 'i')))])
+        sc.stop()
+    return results
+
+
+if __name__ == "__main__":
+    car_file = "/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/car_sales_data.csv"
+
+    benchmark(car_file)
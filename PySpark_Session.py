@@ -0,0 +1,207 @@
+from pyspark import SparkConf, SparkContext
+from pyspark.sql import SparkSession
+from contextlib import contextmanager
+import os
+import re
+import threading
+
+#-----------------------------------------------------------------------------------------------
+'''
+One shared SparkSession for every script
+----------------------------------------
+Every script used to build its own SparkConf/SparkContext + SparkSession with master('local'),
+i.e. ONE core, and PySpark_SQL.py even built two sessions back to back.
+
+from PySpark_Session import get_session, get_context
+ss = get_session('SparkSQL', hive=True)
+sc = get_context()                          # same SparkContext as ss.sparkContext
+
+- Lazy: nothing starts until the first get_session()/get_context() call
+- Once: later calls (from any module, any thread) get the SAME session back
+- Sized to the machine:
+  local   > master local[<cores>], driver memory ~ half of the physical memory
+            spark.default.parallelism / spark.sql.shuffle.partitions = 2 x cores (instead of 200)
+  cluster > spark-submit --master yarn/spark://... decides the master; partitions are sized
+            from spark.executor.instances x spark.executor.cores (or spark.cores.max)
+  both    > Arrow for toPandas()/createDataFrame(pandas) with fallback to the non-Arrow path,
+            ARROW_PRE_0_15_IPC_FORMAT=1 for the driver and the Python workers (pyarrow 0.16 with
+            Spark 2.4 - the driver writes the batches of createDataFrame(pandas_df))
+- Anything passed in conf={...} (or already set by spark-submit --conf) wins over the defaults
+
+Environment overrides: SPARK_MASTER=local[2] / SPARK_DRIVER_MEMORY=2g
+Hive support can only be switched on by the FIRST call, so scripts that need the metastore
+ask for hive=True.
+
+use_session(other) makes get_session() return another session (e.g. ss.newSession()) in the
+current thread - the warm driver daemon (PySpark_DriverDaemon.py) uses it to isolate requests.
+'''
+#-----------------------------------------------------------------------------------------------
+
+PARTITIONS_PER_CORE = 2
+DRIVER_MEMORY_SHARE = 0.5
+MIN_DRIVER_MEMORY_MB = 1024
+MAX_DRIVER_MEMORY_MB = 16384
+
+_lock = threading.Lock()
+_session = None
+_settings = {}
+_local = threading.local()
+LOCAL_MASTER = re.compile(r'^local(?:\[(\*|\d+)(?:,(\d+))?\])?$')      # local, local[N|*], local[N|*,F]
+
+
+def detect_cores():
+    try:
+        return len(os.sched_getaffinity(0))     # honours taskset / container cpu sets
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def detect_memory_mb():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _under_spark_submit():
+    # spark-submit starts the JVM first and tells Python where to find it
+    return 'PYSPARK_GATEWAY_PORT' in os.environ
+
+
+def _cluster_cores(conf):
+    if conf.get('spark.cores.max', None):
+        return int(conf.get('spark.cores.max'))
+    instances = conf.get('spark.executor.instances', None)
+    if instances:
+        return int(instances) * int(conf.get('spark.executor.cores', '1'))
+    return None
+
+
+def total_cores(sc):
+    # cores the tasks really run on - defaultParallelism is PARTITIONS_PER_CORE x this here
+    local = LOCAL_MASTER.match(sc.master)
+    if local:
+        threads = local.group(1)
+        return 1 if threads is None else detect_cores() if threads == '*' else int(threads)
+    cores = _cluster_cores(sc.getConf())
+    if cores:
+        return cores
+    from PySpark_ConcurrentQueries import executor_totals        # dynamic allocation: ask the UI
+
+    return executor_totals(sc)[1] or sc.defaultParallelism
+
+
+def session_defaults(master, cores, memory_mb, submitted_conf=None):
+    defaults = {'spark.sql.execution.arrow.enabled': 'true',
+                'spark.sql.execution.arrow.fallback.enabled': 'true',
+                'spark.sql.execution.arrow.maxRecordsPerBatch': '10000',
+                'spark.executorEnv.ARROW_PRE_0_15_IPC_FORMAT': '1'}
+    local = LOCAL_MASTER.match(master)
+    if local:                                   # local-cluster[...] is a cluster
+        threads, failures = local.groups()
+        local_cores = cores if threads in (None, '*') else int(threads)
+        master = 'local[{}{}]'.format(local_cores, ',' + failures if failures else '')
+        partitions = local_cores * PARTITIONS_PER_CORE
+        defaults['spark.master'] = master
+        if memory_mb:
+            driver_mb = int(memory_mb * DRIVER_MEMORY_SHARE)
+            driver_mb = max(MIN_DRIVER_MEMORY_MB, min(MAX_DRIVER_MEMORY_MB, driver_mb))
+            defaults['spark.driver.memory'] = os.environ.get('SPARK_DRIVER_MEMORY', '{}m'.format(driver_mb))
+    else:
+        total = _cluster_cores(submitted_conf) if submitted_conf is not None else None
+        partitions = total * PARTITIONS_PER_CORE if total else None
+    if partitions:
+        defaults['spark.default.parallelism'] = str(partitions)
+        defaults['spark.sql.shuffle.partitions'] = str(partitions)
+    return defaults
+
+
+def _build(app_name, hive, log_level, conf):
+    # the driver writes Arrow batches too (createDataFrame(pandas_df)) - before the JVM starts
+    os.environ.setdefault('ARROW_PRE_0_15_IPC_FORMAT', '1')
+    submitted = None
+    if _under_spark_submit():
+        SparkContext._ensure_initialized()      # connect to the JVM so SparkConf sees --master/--conf
+        submitted = SparkConf()
+        master = submitted.get('spark.master', 'local[*]')
+        if master == 'local':
+            master = 'local[1]'                 # asked for explicitly, keep it
+    else:
+        master = os.environ.get('SPARK_MASTER', 'local[*]')
+
+    settings = session_defaults(master, detect_cores(), detect_memory_mb(), submitted)
+    if submitted is None:
+        settings.setdefault('spark.master', master)     # SPARK_MASTER=local-cluster[...] / spark://...
+    else:
+        # spark-submit --conf / spark-defaults.conf win over the defaults
+        settings = dict((k, v) for k, v in settings.items() if not submitted.contains(k))
+    settings.update(conf)
+
+    builder = SparkSession.builder.appName(app_name)
+    for key, value in settings.items():
+        builder = builder.config(key, value)
+    if hive:
+        builder = builder.enableHiveSupport()
+    ss = builder.getOrCreate()
+    if log_level:
+        ss.sparkContext.setLogLevel(log_level)
+
+    _settings.clear()
+    _settings.update(settings, hive=hive, app_name=app_name, master=ss.sparkContext.master)
+    print("SparkSession {} on {} - default parallelism {}, shuffle partitions {}".format(
+        app_name, ss.sparkContext.master, ss.sparkContext.defaultParallelism,
+        ss.conf.get('spark.sql.shuffle.partitions')))
+    return ss
+
+
+def get_session(app_name='PySparkCodes', hive=False, conf=None, log_level='ERROR'):
+    global _session
+    conf = conf or {}
+    override = getattr(_local, 'session', None)
+    if override is not None:
+        for key, value in conf.items():
+            if key.startswith('spark.sql.'):
+                override.conf.set(key, value)
+        return override
+    with _lock:
+        if _session is None or _session.sparkContext._jsc is None:     # first call, or stopped
+            _session = _build(app_name, hive, log_level, conf)
+        else:
+            if hive and not _settings.get('hive'):
+                print("get_session(hive=True): session already started without Hive support")
+            for key, value in conf.items():
+                if key.startswith('spark.sql.'):        # runtime SQL confs can still be changed
+                    _session.conf.set(key, value)
+        return _session
+
+
+def get_context(app_name='PySparkCodes', conf=None):
+    return get_session(app_name, conf=conf).sparkContext
+
+
+@contextmanager
+def use_session(ss):
+    previous = getattr(_local, 'session', None)
+    _local.session = ss
+    try:
+        yield ss
+    finally:
+        _local.session = previous
+
+
+def session_settings():
+    return dict(_settings)
+
+
+def stop_session():
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.stop()
+            _session = None
+
+
+if __name__ == "__main__":
+    ss = get_session('Session')
+    print(session_settings())
+    print(get_session() is ss, get_context() is ss.sparkContext)
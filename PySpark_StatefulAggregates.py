@@ -0,0 +1,170 @@
+from pyspark import StorageLevel
+from pyspark.streaming import StreamingContext
+from pyspark.streaming.dstream import DStream
+from pyspark.streaming.util import TransformFunction
+import time
+import zlib
+
+#-----------------------------------------------------------------------------------------------
+'''
+Stateful running aggregates with TTL (idle timeout) eviction - DStreams
+-----------------------------------------------------------------------
+updateStateByKey(updateFunc) keeps a state per key across batches, but updateFunc only sees ONE
+key at a time and does not know the batch time. Keys that go cold stay in the state forever and
+every batch gets slower.
+
+running_totals() uses the same building block as updateStateByKey (PythonStateDStream - the
+state RDD of the previous batch + the new batch -> state RDD of this batch) but the function sees
+the WHOLE state RDD and the batch time, so it can:
+- evict keys idle for more than ttl_secs (based on batch time, not wall clock, so replays after a
+  restart from the checkpoint evict the same keys)
+- bound memory: if more than max_keys keys are left, keep at most max_keys, the most recently
+  seen first
+- count evictions and report state size every batch
+
+Both decisions come from ONE small job per batch: a histogram of (last_seen, key bucket) ->
+keys over the merged state (countByValue, an action, so retries do not count twice). last_seen
+is a batch time, so the histogram has a few entries per live batch. The driver picks the cut
+from it: idle groups go, then whole groups from the least recently seen end until max_keys fit
+(CAP_BUCKETS buckets per batch time, so the cap keeps max_keys minus less than one bucket).
+Eviction counts come from the same histogram - no count() or sort jobs.
+
+The update function is pickled into every DStream checkpoint together with the StateStats it
+closes over, so StateStats leaves its RDD handles out of the pickle (__getstate__).
+
+State per key = (total_quantity, no_of_events, last_seen_epoch_secs)
+Checkpointing is mandatory (ssc.checkpoint(<dir>)) just like updateStateByKey.
+Works with any DStream of (key, value) - socketTextStream or textFileStream below.
+'''
+#-----------------------------------------------------------------------------------------------
+
+PRODUCT_NAME, QUANTITY_SOLD = 3, 5
+
+
+def parse_car_sale(line):
+    fields = line.split(',')
+    try:
+        return [(fields[PRODUCT_NAME], int(fields[QUANTITY_SOLD]))]
+    except (IndexError, ValueError):
+        return []
+
+
+CAP_BUCKETS = 64
+
+
+def _bucket(key):
+    # stable across processes (hash() of a str is not)
+    return zlib.crc32(repr(key).encode('utf-8')) % CAP_BUCKETS
+
+
+class StateStats(object):
+
+    def __init__(self):
+        self.ttl_evicted = 0
+        self.cap_evicted = 0
+        self.total_ttl_evicted = 0
+        self.total_cap_evicted = 0
+        self.persisted = []         # driver-side RDD handles, never pickled
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['persisted'] = []
+        return state
+
+
+def eviction_cut(histogram, cutoff, max_keys):
+    # histogram {(last_seen, bucket): keys} -> (ttl evicted, cap evicted, first dropped group)
+    ttl_evicted = sum(n for (seen, _), n in histogram.items() if seen < cutoff)
+    live = sorted(((group, n) for group, n in histogram.items() if group[0] >= cutoff),
+                  key=lambda group_n: (-group_n[0][0], group_n[0][1]))     # most recent first
+    kept, floor = 0, None
+    for group, n in live:
+        if max_keys is not None and kept + n > max_keys:
+            floor = group
+            break
+        kept += n
+    return ttl_evicted, sum(n for _, n in live) - kept, floor
+
+
+def running_totals(pairs, ttl_secs=1800, max_keys=None, num_partitions=None):
+    sc = pairs.context().sparkContext
+    num_partitions = num_partitions or sc.defaultParallelism
+    stats = StateStats()
+
+    def update(t, state, batch):
+        now = int(time.mktime(t.timetuple()))
+        batch_totals = batch.mapValues(lambda v: (v, 1)) \
+                            .reduceByKey(lambda x, y: (x[0] + y[0], x[1] + y[1]), num_partitions)
+
+        if state is None:
+            merged = batch_totals.mapValues(lambda v: (v[0], v[1], now))
+        else:
+            def merge(old_new):
+                old, new = old_new
+                if new is None:
+                    return old
+                if old is None:
+                    return (new[0], new[1], now)
+                return (old[0] + new[0], old[1] + new[1], now)
+            merged = state.fullOuterJoin(batch_totals, num_partitions).mapValues(merge)
+
+        # Our copies of older batches are only needed to recompute the previous state, until
+        # that state has been checkpointed
+        if state is not None and state.isCheckpointed():
+            for rdd in stats.persisted:
+                rdd.unpersist()
+            stats.persisted = []
+        merged.persist(StorageLevel.MEMORY_AND_DISK)
+        stats.persisted.append(merged)
+
+        cutoff = now - ttl_secs
+        histogram = merged.map(lambda kv: (kv[1][2], _bucket(kv[0]))).countByValue()
+        stats.ttl_evicted, stats.cap_evicted, floor = eviction_cut(histogram, cutoff, max_keys)
+        if floor is None:
+            return merged.filter(lambda kv: kv[1][2] >= cutoff)
+        floor_rank = (-floor[0], floor[1])
+        return merged.filter(lambda kv: kv[1][2] >= cutoff and (-kv[1][2], _bucket(kv[0])) < floor_rank)
+
+    jfunc = TransformFunction(sc, update, sc.serializer, pairs._jrdd_deserializer)
+    jstate = sc._jvm.PythonStateDStream(pairs._jdstream.dstream(), jfunc)
+    return DStream(jstate.asJavaDStream(), pairs._ssc, sc.serializer), stats
+
+
+def report_state(state, stats):
+    def report(time, rdd):
+        keys = rdd.count()
+        stats.total_ttl_evicted += stats.ttl_evicted
+        stats.total_cap_evicted += stats.cap_evicted
+        print("{} | state keys: {} | evicted idle: {} | evicted over cap: {} | evicted so far: {}".format(
+            time, keys, stats.ttl_evicted, stats.cap_evicted, stats.total_ttl_evicted + stats.total_cap_evicted))
+
+    state.foreachRDD(report)
+
+
+def create_context(sc, checkpoint_dir, source='socket', stream_dir=None, batch_secs=60,
+                   ttl_secs=1800, max_keys=10000):
+    ssc = StreamingContext(sc, batch_secs)
+    ssc.checkpoint(checkpoint_dir)
+    if source == 'socket':
+        lines = ssc.socketTextStream("localhost", 20000)
+    else:
+        lines = ssc.textFileStream(stream_dir)
+    state, stats = running_totals(lines.flatMap(parse_car_sale), ttl_secs, max_keys)
+    state.checkpoint(batch_secs * 10)
+    state.pprint()
+    report_state(state, stats)
+    return ssc
+
+
+if __name__ == "__main__":
+    from PySpark_Session import get_context
+
+    sc = get_context('StatefulAggregates')
+
+    checkpoint_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/checkPointDir/dstream_state'
+    stream_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/streamFiles/'
+
+    ssc = create_context(sc, checkpoint_dir, 'socket', stream_dir)
+    # ssc = create_context(sc, checkpoint_dir, 'file', stream_dir)
+    ssc.start()
+    ssc.awaitTermination()
@@ -0,0 +1,151 @@
+from pyspark.sql.types import StructType, StructField, IntegerType, StringType, DoubleType
+from pyspark.sql.functions import col, when, regexp_extract, regexp_replace, udf
+import re
+
+#-----------------------------------------------------------------------------------------------
+'''
+Vectorized parsing of the stock feed fields
+-------------------------------------------
+stock_value      "$134.13"                  -> 134.13
+stock_market_cap "$3.6B" | "$208.28M" | "n/a" -> 3600000000.0 | 208280000.0 | null
+event_time       "12:58:51"                 -> 46731 (seconds since midnight)
+
+Three ways to do it:
+1. Native expressions (parse_stock_fields) - regexp_extract/when/cast run inside the JVM on whole
+   columns, nothing goes to Python. Works the same on ss.read and ss.readStream DataFrames.
+   ALWAYS prefer this one.
+2. pandas_udf (pandas_parsers) - vectorized, rows go to Python in Arrow batches
+   (spark.sql.execution.arrow.maxRecordsPerBatch, default 10000) and are parsed with pandas
+   string methods.
+3. Plain Python udf (row_parsers) - one Python call per row per column. The benchmark shows why
+   this is the slowest.
+'''
+#-----------------------------------------------------------------------------------------------
+
+stock_csv_schema = StructType(
+    [
+        StructField("ticker", StringType(), True),
+        StructField("stock_value", StringType(), True),
+        StructField("stock_market_cap", StringType(), True),
+        StructField("units_sold", IntegerType(), True),
+        StructField("units_bought", IntegerType(), True),
+        StructField("event_time", StringType(), True)
+    ]
+)
+
+MULTIPLIERS = {'': 1.0, 'K': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12}
+MARKET_CAP_PATTERN = r'^\$?([0-9.,]+)([KMBT]?)$'
+TIME_PATTERN = r'^(\d{1,2}):(\d{2}):(\d{2})$'
+
+
+#-----------------------------------------------------------------------------------------------
+# 1. Native column expressions
+#-----------------------------------------------------------------------------------------------
+def parse_money(c):
+    # "n/a", "" and anything not numeric become null after the cast
+    return regexp_replace(c, r'[$,]', '').cast(DoubleType())
+
+
+def parse_market_cap(c):
+    number = regexp_replace(regexp_extract(c, MARKET_CAP_PATTERN, 1), ',', '').cast(DoubleType())
+    suffix = regexp_extract(c, MARKET_CAP_PATTERN, 2)
+    multiplier = when(suffix == 'K', MULTIPLIERS['K']) \
+                .when(suffix == 'M', MULTIPLIERS['M']) \
+                .when(suffix == 'B', MULTIPLIERS['B']) \
+                .when(suffix == 'T', MULTIPLIERS['T']) \
+                .otherwise(1.0)
+    return when(number.isNull(), None).otherwise(number * multiplier)
+
+
+def parse_time_of_day(c):
+    hours = regexp_extract(c, TIME_PATTERN, 1).cast(IntegerType())
+    minutes = regexp_extract(c, TIME_PATTERN, 2).cast(IntegerType())
+    seconds = regexp_extract(c, TIME_PATTERN, 3).cast(IntegerType())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def parse_stock_fields(df):
+    return df.withColumn('stock_value', parse_money(col('stock_value'))) \
+             .withColumn('stock_market_cap', parse_market_cap(col('stock_market_cap'))) \
+             .withColumn('event_seconds', parse_time_of_day(col('event_time')))
+
+
+#-----------------------------------------------------------------------------------------------
+# 2. pandas_udf (needs pyarrow) and 3. row-at-a-time Python udf - used for the benchmark
+#-----------------------------------------------------------------------------------------------
+def parse_market_cap_value(text):
+    if text is None:
+        return None
+    m = re.match(MARKET_CAP_PATTERN, text)
+    if m is None:
+        return None
+    return float(m.group(1).replace(',', '')) * MULTIPLIERS[m.group(2)]
+
+
+def pandas_parsers():
+    from pyspark.sql.functions import pandas_udf, PandasUDFType
+    import pandas as pd
+
+    @pandas_udf(DoubleType(), PandasUDFType.SCALAR)
+    def money(s):
+        return pd.to_numeric(s.str.replace(r'[$,]', ''), errors='coerce')
+
+    @pandas_udf(DoubleType(), PandasUDFType.SCALAR)
+    def market_cap(s):
+        parts = s.str.extract(MARKET_CAP_PATTERN, expand=True)
+        number = pd.to_numeric(parts[0].str.replace(',', ''), errors='coerce')
+        return number * parts[1].map(MULTIPLIERS).fillna(1.0)
+
+    return money, market_cap
+
+
+def row_parsers():
+    def money(text):
+        try:
+            return float(text.replace('$', '').replace(',', ''))
+        except (AttributeError, ValueError):
+            return None
+
+    return udf(money, DoubleType()), udf(parse_market_cap_value, DoubleType())
+
+
+def benchmark(ss, df, copies=200):
+    from datetime import datetime
+    from pyspark.sql.functions import sum
+
+    big = df.crossJoin(ss.range(copies).withColumnRenamed('id', '_copy')).cache()
+    print("Rows in benchmark: ", big.count())
+
+    pandas_money, pandas_cap = pandas_parsers()
+    row_money, row_cap = row_parsers()
+    candidates = [
+        ('native expressions', parse_money, parse_market_cap),
+        ('pandas_udf', pandas_money, pandas_cap),
+        ('python udf (per row)', row_money, row_cap),
+    ]
+    for name, money, market_cap in candidates:
+        start_time = datetime.now()
+        result = big.select(sum(money(col('stock_value'))).alias('value'),
+                            sum(market_cap(col('stock_market_cap'))).alias('cap')).collect()[0]
+        print("{:22} {}  value={:.2f} cap={:.0f}".format(name, datetime.now() - start_time,
+                                                           result['value'], result['cap']))
+    big.unpersist()
+
+
+if __name__ == "__main__":
+    from PySpark_Session import get_session
+
+    ss = get_session('StockParsing')            # Arrow is on by default there (pandas_udf path)
+
+    stock_csv = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/streaming-stock-data-csv/'
+    stock_json = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/streaming-stock-data-json/'
+
+    # Batch reader
+    stockDf = ss.read.format('csv').schema(stock_csv_schema).load(stock_csv)
+    parse_stock_fields(stockDf).show(5)
+
+    # Streaming reader - the same expressions work unchanged
+    stockStream = ss.readStream.format('json').schema(stock_csv_schema).option('maxFilesPerTrigger', 1).load(stock_json)
+    parsedStream = parse_stock_fields(stockStream)
+
+    benchmark(ss, stockDf)
@@ -0,0 +1,202 @@
+from pyspark.sql.functions import broadcast, col, count, lit, sum, when
+from datetime import datetime
+import os
+import threading
+import time
+
+#-----------------------------------------------------------------------------------------------
+'''
+Stream-static enrichment with a cached, periodically refreshed reference table
+------------------------------------------------------------------------------
+Naive stream-static join: streamDf.join(ss.read.csv(<reference>), 'ticker')
+The static side is a plan, not data - it is re-read and re-planned on EVERY micro-batch.
+
+ReferenceTable keeps the reference data loaded ONCE:
+- DataFrame side: cached (persist) and joined with a broadcast() hint, so no shuffle is needed
+  for the join and the source is not re-read. The broadcast hash table itself is still built
+  from the cached rows and shipped again for every micro-batch's join - what is saved is the
+  read + parse, not the broadcast.
+- RDD / DStream side: a broadcast Python dict {key: (values...)} for map-side lookups, shipped
+  once per refresh and reused by every batch.
+
+Refresh: before each batch, current() checks the clock and the source mtime (max mtime of all files
+when the path is a directory). It reloads if refresh_secs passed or the file changed, then the old
+copy is unpersisted/destroyed. Refresh cost (ms) and lookup hits/misses are kept in stats(). Hits/misses are counted with
+actions on the driver (an accumulator inside map() counts again on every retry/recomputation).
+
+Structured Streaming: use enrich_foreach_batch(ref, on, sink) with writeStream.foreachBatch(...),
+because the refresh has to run on the driver between micro-batches.
+DStreams: dstream.transform(rdd_enricher(ref, key_func)). The transform function only carries
+the table's settings (the session, the lock and the broadcast cannot be pickled into a DStream
+checkpoint) and finds the ReferenceTable in a per-process registry - after a restart from the
+checkpoint the table is loaded again on first use. The executor side only sees the broadcast.
+'''
+#-----------------------------------------------------------------------------------------------
+
+
+def _source_mtime(path):
+    if os.path.isdir(path):
+        mtimes = [os.path.getmtime(os.path.join(path, f)) for f in os.listdir(path)
+                  if not f.startswith('.') and not f.startswith('_')]
+        return max(mtimes) if mtimes else 0
+    return os.path.getmtime(path)
+
+
+class ReferenceTable(object):
+
+    def __init__(self, ss, path, key_cols, value_cols, fmt='csv', schema=None, refresh_secs=600, **options):
+        self.ss = ss
+        self.path = path
+        self.key_cols = [key_cols] if isinstance(key_cols, str) else list(key_cols)
+        self.value_cols = list(value_cols)
+        self.fmt = fmt
+        self.schema = schema
+        self.options = options
+        self.refresh_secs = refresh_secs
+        self._lock = threading.Lock()
+        self._df = None
+        self._bc = None
+        self._loaded_at = 0
+        self._loaded_mtime = None
+        self.refreshes = 0
+        self.last_refresh_ms = None
+        self.total_refresh_ms = 0
+        self.hits = 0
+        self.misses = 0
+        _tables[self.spec_key()] = self
+
+    def spec(self):
+        return {'path': self.path, 'key_cols': self.key_cols, 'value_cols': self.value_cols,
+                'fmt': self.fmt, 'schema': self.schema, 'refresh_secs': self.refresh_secs,
+                'options': self.options}
+
+    def spec_key(self):
+        return self.path, tuple(self.key_cols), tuple(self.value_cols)
+
+    @classmethod
+    def from_spec(cls, ss, spec):
+        return cls(ss, spec['path'], spec['key_cols'], spec['value_cols'], spec['fmt'], spec['schema'],
+                   spec['refresh_secs'], **spec['options'])
+
+    def _needs_refresh(self):
+        if self._df is None:
+            return True
+        if time.time() - self._loaded_at >= self.refresh_secs:
+            return True
+        return _source_mtime(self.path) != self._loaded_mtime
+
+    def _load(self):
+        start_time = datetime.now()
+        mtime = _source_mtime(self.path)
+        reader = self.ss.read.format(self.fmt).options(**self.options)
+        if self.schema is not None:
+            reader = reader.schema(self.schema)
+        df = reader.load(self.path).select(*(self.key_cols + self.value_cols)) \
+                   .dropDuplicates(self.key_cols).cache()
+        rows = df.collect()         # materializes the cache and gives the dict for the RDD path
+        n = len(self.key_cols)
+        lookup = dict((tuple(r[:n]) if n > 1 else r[0], tuple(r[n:])) for r in rows)
+        bc = self.ss.sparkContext.broadcast(lookup)
+
+        old_df, old_bc = self._df, self._bc
+        self._df, self._bc = df, bc
+        self._loaded_at, self._loaded_mtime = time.time(), mtime
+        if old_df is not None:
+            old_df.unpersist()
+        if old_bc is not None:
+            old_bc.unpersist()
+
+        self.refreshes += 1
+        self.last_refresh_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+        self.total_refresh_ms += self.last_refresh_ms
+        print("reference {} loaded: {} rows in {} ms".format(self.path, len(lookup), self.last_refresh_ms))
+
+    def current(self):
+        with self._lock:
+            if self._needs_refresh():
+                self._load()
+            return self._df, self._bc
+
+    #-------------------------------------------------------------------------------------------
+    # DataFrame enrichment
+    #-------------------------------------------------------------------------------------------
+    def enrich_df(self, df, on=None, how='left'):
+        ref_df, _ = self.current()
+        on = on or self.key_cols
+        return df.join(broadcast(ref_df.withColumn('_ref_hit', lit(True))), on, how)
+
+    def count_hits(self, enriched_df):
+        row = enriched_df.agg(count(lit(1)).alias('total'),
+                              sum(when(col('_ref_hit').isNull(), 1).otherwise(0)).alias('misses')).collect()[0]
+        misses = row['misses'] or 0
+        self.hits += row['total'] - misses
+        self.misses += misses
+
+    #-------------------------------------------------------------------------------------------
+    # RDD enrichment - record -> (record, values or None)
+    #-------------------------------------------------------------------------------------------
+    def enrich_rdd(self, rdd, key_func):
+        # persisted, so the count below and the caller's action compute it once (a DStream
+        # unpersists the RDDs it generated once they are old)
+        _, bc = self.current()
+        enriched = rdd.map(lambda record: (record, bc.value.get(key_func(record)))).persist()
+        found = enriched.map(lambda record_values: record_values[1] is not None).countByValue()
+        self.hits += found.get(True, 0)
+        self.misses += found.get(False, 0)
+        return enriched
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'refreshes': self.refreshes, 'last_refresh_ms': self.last_refresh_ms,
+                'total_refresh_ms': self.total_refresh_ms, 'hits': self.hits,
+                'misses': self.misses, 'hit_rate': float(self.hits) / total if total else None}
+
+
+_tables = {}
+
+
+def rdd_enricher(ref, key_func):
+    # dstream.transform() function that can be pickled into a DStream checkpoint
+    spec, key = ref.spec(), ref.spec_key()
+
+    def enrich(rdd):
+        table = _tables.get(key)
+        if table is None:
+            from PySpark_Session import get_session
+            table = ReferenceTable.from_spec(get_session(), spec)
+        return table.enrich_rdd(rdd, key_func)
+    return enrich
+
+
+def enrich_foreach_batch(ref, on, sink):
+    # foreachBatch function: refresh if needed, join, count hits, hand the result to sink(df, batch_id)
+    def process(batch_df, batch_id):
+        enriched = ref.enrich_df(batch_df, on).persist()
+        ref.count_hits(enriched)
+        sink(enriched.drop('_ref_hit'), batch_id)
+        enriched.unpersist()
+        print("batch {} reference stats: {}".format(batch_id, ref.stats()))
+    return process
+
+
+if __name__ == "__main__":
+    from PySpark_BucketedTables import emp_schema, dept_schema
+    from PySpark_Session import get_session
+
+    spark = get_session('StreamEnrichment')
+
+    dept_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/dept_data.csv'
+    emp_stream_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/empStreamFiles/'
+    # Stocks: ReferenceTable(spark, '<ticker_sector.csv>', 'ticker', ['sector'], header='true')
+
+    dept = ReferenceTable(spark, dept_file, 'dept_id', ['dept_name'], schema=dept_schema,
+                          refresh_secs=300, header='true')
+
+    empStream = spark.readStream.format('csv').schema(emp_schema).option('header', 'true').load(emp_stream_dir)
+
+    def show(df, batch_id):
+        df.show(5)
+
+    query = empStream.writeStream.foreachBatch(enrich_foreach_batch(dept, ['dept_id'], show)) \
+                                 .trigger(processingTime='10 seconds').start()
+    query.awaitTermination()
@@ -4,8 +4,11 @@ from pyspark.streaming import StreamingContext
 from pyspark.sql.types import StructType, StructField, IntegerType, StringType
 from pyspark.sql.functions import col, sum
 
-conf = SparkConf().setMaster('local[4]').setAppName('Streaming')
-sc = SparkContext(conf=conf)
+from PySpark_Session import get_context
+
+# conf = SparkConf().setMaster('local[4]').setAppName('Streaming')
+# sc = SparkContext(conf=conf)
+sc = get_context('Streaming')
 ssc = StreamingContext(sc,60)
 
 
@@ -16,6 +19,8 @@ Sources: Kafka, AWS Kinesis, Continuous files in a directory, Socket source (tes
 Sinks: Kafka, Files, BigQuery, Google Pub/Sub, Console sink (testing), Memory sink (testing)
 
 Spark Streaming using DStreams (with Socket Streams > use nc -lk 8000)
+Load testing > python PySpark_ReplaySource.py socket sampledata/car_sales_data.csv --port 20000 --rate 500 --stamp
+               replays the file at a fixed rate (with bursts) instead of typing into nc
 Available Tranformations: map(), flatMap(), filter(), repartition(), union(), count(), reduce(), countByValue(), 
                           reduceByKey(), join()
 Output Operations: pprint(), saveAsTextFiles(), saveAsObjectFiles()
@@ -31,6 +36,22 @@ carRdd3 = carRdd2.map(lambda x: (x[0],int(x[1][1])))
 carRdd4 = carRdd3.reduceByKey(lambda x,y: x+y)
 carRdd4.pprint()
 
+# 10 minute running totals per (product_name, model_year), updated every batch - adds the new batch
+# and subtracts the expired one instead of re-reducing the whole window (see PySpark_StreamingWindows.py)
+# ssc.checkpoint('/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/checkPointDir/dstream_windows')
+# carRdd5 = carRdd3.reduceByKeyAndWindow(lambda x,y: x+y, lambda x,y: x-y, 600, 60, filterFunc=lambda x: x[1] != 0)
+# carRdd5.pprint()
+
+# Running totals per product kept across batches, with idle keys evicted after 30 minutes and the
+# state capped at 10000 keys (see PySpark_StatefulAggregates.py)
+# from PySpark_StatefulAggregates import running_totals, report_state, parse_car_sale
+# carState, carStateStats = running_totals(socketStreaming.flatMap(parse_car_sale), ttl_secs=1800, max_keys=10000)
+# report_state(carState, carStateStats)
+
+# Per-batch metrics to a Prometheus text file + JSON lines (see PySpark_MetricsExporter.py)
+# from PySpark_MetricsExporter import MetricsExporter, DStreamMetricsListener
+# ssc.addStreamingListener(DStreamMetricsListener(MetricsExporter('/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/metrics'), 'car_sales_socket'))
+
 ssc.start()
 ssc.awaitTermination()
 
@@ -104,6 +125,8 @@ Streaming DataFrames can be registered as temporary view and then SQL can be app
 # df2 = df1.filter(col('model_year').cast(IntegerType()).__ge__(2000) & col('model_year').cast(IntegerType()).__le__(2010))
 # df3 = df2.groupBy("product_name","model_year","country_sold_in").agg(sum("quantity_sold").alias("tot_qty_sold"))
 #
+# # Note: maxFilesPerTrigger=1 drains a backlog one file per trigger. PySpark_AdaptiveTrigger.py restarts
+# #       the query from the same checkpoint with files-per-trigger/trigger sized from observed batch times.
 # # df3.createOrReplaceTempView("streaming_car_table")
 # writeStream = df3.writeStream\
 #                         .format("console")\
@@ -128,9 +151,17 @@ Streaming DataFrames can be registered as temporary view and then SQL can be app
 #                                  load("/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/streaming-stock-data-json/")
 #
 #
+# Note: to_timestamp(col("event_time"),"HH:mm:ss") pins every event to 1970-01-01, so windows never close and the
+#       state grows forever. Attach the ingest/file date (handles midnight rollover) and use a watermark instead:
+# from PySpark_EventTime import reconstruct_event_time, windowed_units
+# df3 = windowed_units(reconstruct_event_time(fileStreaming), "10 minutes", "2 minutes", watermark="10 minutes")
 # df1 = fileStreaming.select("ticker","stock_value", "stock_market_cap", "units_sold", "units_bought",to_timestamp(col("event_time"),"HH:mm:ss").alias("event_time"))
 # df2 = df1.select('ticker','stock_value','stock_market_cap','units_sold','units_bought', date_format('event_time','hh:mm:ss').alias('event_time'))
 #
+# # stock_value "$134.13" and stock_market_cap "$3.6B" / "$208.28M" / "n/a" as numbers (see PySpark_StockParsing.py)
+# from PySpark_StockParsing import parse_money, parse_market_cap
+# df2 = df2.withColumn('stock_value', parse_money(col('stock_value'))).withColumn('stock_market_cap', parse_market_cap(col('stock_market_cap')))
+#
 # #------------------
 # # Tumbling Window
 # #------------------
@@ -140,6 +171,8 @@ Streaming DataFrames can be registered as temporary view and then SQL can be app
 # # Sliding Window - Trigger window should always be smaller than Sliding window
 # #------------------------------------------------------------------------------
 # # df3 = df2.groupBy(window(col('event_time'),"10 minutes", "2 minutes"),'ticker').agg(sum('units_bought').alias('units_bought'), sum('units_sold').alias('units_sold'))
+# # Each event lands in 10/2 = 5 windows. Pane version (same result, 1 copy per event) - see PySpark_PaneWindows.py
+# # from PySpark_PaneWindows import streaming_panes, PaneWindowAssembler
 #
 # df3 = df2.groupBy('ticker').agg(sum('units_bought').alias('units_bought'), sum('units_sold').alias('units_sold'))
 #
@@ -148,6 +181,16 @@ Streaming DataFrames can be registered as temporary view and then SQL can be app
 # df4.awaitTermination()
 
 
+#-----------------------------------------------------------------------------------------------------------------------
+# ForeachBatch sink - write every micro-batch to partitioned Parquet, keyed by batchId so a replayed batch is not
+# written twice, with small outputs merged in the background (see PySpark_BatchSink.py)
+#-----------------------------------------------------------------------------------------------------------------------
+# from PySpark_BatchSink import ParquetBatchSink, read_sink
+# sink = ParquetBatchSink('/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/OutputFile/stock_units_sink')
+# sink.start_compactor(spark)
+# df4 = df3.writeStream.foreachBatch(sink).outputMode("update").option("checkpointLocation", "<checkpoint dir>").start()
+
+
 #-----------------------------------------------------------------------------------------------------------------------
 # Checkpoinitng
 # writeStream...option("checkpointLocation", "/path/of/location")...
@@ -0,0 +1,81 @@
+from pyspark.streaming import StreamingContext
+
+#-----------------------------------------------------------------------------------------------
+'''
+Incremental sliding-window aggregation (DStreams)
+-------------------------------------------------
+reduceByKeyAndWindow(func, invFunc, windowDuration, slideDuration)
+
+Without invFunc every slide re-reduces ALL the batches in the window (cost ~ window size).
+With invFunc Spark keeps the previous window's result and only does:
+    new window = previous window + batch(es) entering - batch(es) leaving   (cost ~ batch size)
+
+- func    = lambda x,y: x+y   (add the new batch)
+- invFunc = lambda x,y: x-y   (subtract the batch that slid out)
+- filterFunc drops keys whose running total went back to 0, otherwise keys that have left the
+  window stay in the state forever.
+- Checkpointing is MANDATORY with invFunc (ssc.checkpoint(<dir>)). The windowed DStream is also
+  checkpointed every checkpoint_batches slides to cut the lineage.
+
+State retained = keys in the current window + the window/batch RDDs Spark remembers so it can
+subtract them later. report_state() prints the keys and the RDDs the JVM actually holds
+persisted (sc._jsc.getPersistentRDDs()) every batch, next to the configured window length in
+batches.
+'''
+#-----------------------------------------------------------------------------------------------
+
+PRODUCT_NAME, QUANTITY_SOLD, MODEL_YEAR = 3, 5, 8
+
+
+def parse_car_sale(line):
+    # ((product_name, model_year), quantity_sold) - bad lines are dropped, not failed
+    fields = line.split(',')
+    try:
+        return [((fields[PRODUCT_NAME], fields[MODEL_YEAR]), int(fields[QUANTITY_SOLD]))]
+    except (IndexError, ValueError):
+        return []
+
+
+def windowed_totals(lines, window_secs=600, slide_secs=60, checkpoint_batches=10):
+    pairs = lines.flatMap(parse_car_sale)
+    totals = pairs.reduceByKeyAndWindow(lambda x, y: x + y,
+                                        lambda x, y: x - y,
+                                        window_secs, slide_secs,
+                                        filterFunc=lambda kv: kv[1] != 0)
+    totals.checkpoint(slide_secs * checkpoint_batches)
+    return totals
+
+
+def report_state(totals, window_secs=600, batch_secs=60):
+    window_batches = window_secs // batch_secs      # configured, not measured
+
+    def report(time, rdd):
+        keys = rdd.count()
+        persisted = rdd.context._jsc.getPersistentRDDs().size()
+        print("{} | keys in window: {} | persisted RDDs (measured): {} | window = {} batches (configured) "
+              "| partitions: {}".format(time, keys, persisted, window_batches, rdd.getNumPartitions()))
+
+    totals.foreachRDD(report)
+
+
+def create_context(sc, checkpoint_dir, host='localhost', port=20000, batch_secs=60, window_secs=600):
+    ssc = StreamingContext(sc, batch_secs)
+    ssc.checkpoint(checkpoint_dir)
+    lines = ssc.socketTextStream(host, port)
+    totals = windowed_totals(lines, window_secs, batch_secs)
+    totals.pprint()
+    report_state(totals, window_secs, batch_secs)
+    return ssc
+
+
+if __name__ == "__main__":
+    from PySpark_Session import get_context
+
+    sc = get_context('StreamingWindows')
+
+    checkpoint_dir = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/checkPointDir/dstream_windows'
+
+    # Restarts pick up the window state from the checkpoint instead of starting from zero
+    ssc = StreamingContext.getOrCreate(checkpoint_dir, lambda: create_context(sc, checkpoint_dir))
+    ssc.start()
+    ssc.awaitTermination()
@@ -0,0 +1,314 @@
+from pyspark.sql.functions import col, count, lit, min, max, approx_count_distinct
+from pyspark.sql.types import NumericType, DateType, TimestampType, StringType, BooleanType, BinaryType
+from PySpark_IncrementalAggregates import read_table_files, sum_bytes
+import builtins
+import json
+import os
+import re
+
+#-----------------------------------------------------------------------------------------------
+'''
+Automatic table / column statistics for the cost based optimizer (CBO)
+----------------------------------------------------------------------
+saveAsTable() does not collect statistics, so the optimizer only knows the file size and can
+not estimate row counts, filter selectivity or join sizes (broadcast side, join order).
+
+stats = TableStats(ss, 'intellipaat.car_table', histogram_columns=['quantity_sold'],
+                   skew_columns=['country_sold_in'])
+save_table_with_stats(carDf, 'intellipaat.car_table', stats, mode='append')
+print(stats.skew_report('country_sold_in'))
+
+enable_cbo(ss) > spark.sql.cbo.enabled, spark.sql.cbo.joinReorder.enabled, histograms, and
+                 spark.sql.statistics.size.autoUpdate.enabled (size updated on every append)
+
+refresh() after every write:
+- FULL  (first time, after an overwrite, or once the rows appended since the last full run are
+        more than full_refresh_ratio of the table):
+        ANALYZE TABLE t COMPUTE STATISTICS                       size + row count
+        ANALYZE TABLE t COMPUTE STATISTICS FOR COLUMNS ...       min/max/nulls/distinct/len
+        (histogram_columns again with spark.sql.statistics.histogram.enabled=true)
+- INCREMENTAL (the normal append): ONE aggregation over the NEW files only, merged into the
+        statistics of the last refresh: size and row count added, min/max widened, null counts
+        added, distinct counts = max(old, new) (exact for skew_columns). avg/max length and
+        histograms keep their values until the next full run.
+        An append resets the catalog statistics to the size only (row count and column stats are
+        gone), so every refresh keeps a copy of the statistics it wrote in the sidecar state and
+        the next incremental run merges into that copy.
+
+columns=None analyzes every column ANALYZE supports (numeric, date, timestamp, string, boolean,
+binary) - array/map/struct columns are skipped.
+
+Histograms: Spark 2.4 builds equi-height histograms for numeric/date/timestamp columns only. For
+skewed STRING columns like country_sold_in an exact value -> row count table is kept in the
+sidecar state (<warehouse>/_stats/<table>.json), merged on every append: exact distinct count
+for the CBO and skew_report() for salting / broadcast decisions.
+'''
+#-----------------------------------------------------------------------------------------------
+
+RANGE_TYPES = (NumericType, DateType, TimestampType)
+ANALYZE_TYPES = RANGE_TYPES + (StringType, BooleanType, BinaryType)
+NULL_KEY = '<null>'
+CATALOG = 'org.apache.spark.sql.catalyst.catalog'
+
+
+def enable_cbo(ss, histogram_bins=64):
+    ss.conf.set('spark.sql.cbo.enabled', 'true')
+    ss.conf.set('spark.sql.cbo.joinReorder.enabled', 'true')
+    ss.conf.set('spark.sql.statistics.histogram.numBins', str(histogram_bins))
+    ss.conf.set('spark.sql.statistics.size.autoUpdate.enabled', 'true')
+
+
+def _catalog(ss):
+    return ss._jsparkSession.sessionState().catalog()
+
+
+def _identifier(ss, table):
+    return ss._jsparkSession.sessionState().sqlParser().parseTableIdentifier(table)
+
+
+def _option_value(option):
+    return option.get() if option.isDefined() else None
+
+
+def _catalog_class(jvm, name):
+    return getattr(getattr(jvm, CATALOG), name)
+
+
+def _stats_snapshot(ss, table):
+    # catalog statistics -> JSON (CatalogColumnStat.toMap, histograms included)
+    stats = _option_value(_catalog(ss).getTableMetadata(_identifier(ss, table)).stats())
+    if stats is None or not stats.rowCount().isDefined():
+        return None
+    converters = ss._jvm.scala.collection.JavaConverters
+    columns = {}
+    for name, stat in converters.mapAsJavaMapConverter(stats.colStats()).asJava().items():
+        columns[name] = dict(converters.mapAsJavaMapConverter(stat.toMap(name)).asJava().items())
+    return {'size_bytes': stats.sizeInBytes().toString(), 'row_count': stats.rowCount().get().toString(),
+            'columns': columns}
+
+
+def _stats_restore(ss, table, snapshot):
+    # JSON -> CatalogStatistics (CatalogColumnStat.fromMap)
+    jvm = ss._jvm
+    col_stats = jvm.java.util.HashMap()
+    for name, values in snapshot['columns'].items():
+        stat = _option_value(_catalog_class(jvm, 'CatalogColumnStat').fromMap(table, name, jvm.PythonUtils.toScalaMap(values)))
+        if stat is not None:
+            col_stats.put(name, stat)
+    return _catalog_class(jvm, 'CatalogStatistics')(
+        jvm.scala.math.BigInt.apply(snapshot['size_bytes']),
+        jvm.scala.Option.apply(jvm.scala.math.BigInt.apply(snapshot['row_count'])),
+        jvm.PythonUtils.toScalaMap(col_stats))
+
+
+def describe_column(ss, table, column):
+    rows = ss.sql('describe extended {} {}'.format(table, column)).collect()
+    return dict((r['info_name'], r['info_value']) for r in rows)
+
+
+class TableStats(object):
+
+    def __init__(self, ss, table, columns=None, histogram_columns=(), skew_columns=(),
+                 full_refresh_ratio=0.5, state_dir=None):
+        self.ss = ss
+        self.table = table
+        self.columns = columns
+        self.histogram_columns = list(histogram_columns)
+        self.skew_columns = list(skew_columns)
+        self.full_refresh_ratio = full_refresh_ratio
+        warehouse = re.sub(r'^file:(//)?', '', ss.conf.get('spark.sql.warehouse.dir'))
+        self.state_dir = state_dir or os.path.join(warehouse, '_stats')
+        if not os.path.isdir(self.state_dir):
+            os.makedirs(self.state_dir)
+
+    #-------------------------------------------------------------------------------------------
+    # Sidecar state - processed files, rows since the last full run, skew column value counts
+    #-------------------------------------------------------------------------------------------
+    def _state_path(self):
+        return os.path.join(self.state_dir, self.table + '.json')
+
+    def read_state(self):
+        if not os.path.exists(self._state_path()):
+            return None
+        with open(self._state_path()) as f:
+            return json.load(f)
+
+    def _write_state(self, state):
+        tmp = self._state_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.rename(tmp, self._state_path())
+
+    def _stat_columns(self, df):
+        return self.columns or [f.name for f in df.schema.fields if isinstance(f.dataType, ANALYZE_TYPES)]
+
+    def _value_counts(self, df, column):
+        return dict((NULL_KEY if r[0] is None else str(r[0]), r[1])
+                    for r in df.groupBy(column).count().collect())
+
+    #-------------------------------------------------------------------------------------------
+    # Full refresh - Spark's own ANALYZE commands
+    #-------------------------------------------------------------------------------------------
+    def full_refresh(self, files):
+        df = self.ss.table(self.table)
+        columns = self._stat_columns(df)
+        histogram = [c for c in self.histogram_columns
+                     if isinstance(df.schema[c].dataType, RANGE_TYPES)]
+        plain = [c for c in columns if c not in histogram]
+
+        self.ss.sql('analyze table {} compute statistics'.format(self.table))
+        previous = self.ss.conf.get('spark.sql.statistics.histogram.enabled')
+        try:
+            if plain:
+                self.ss.conf.set('spark.sql.statistics.histogram.enabled', 'false')
+                self.ss.sql('analyze table {} compute statistics for columns {}'.format(self.table, ', '.join(plain)))
+            if histogram:
+                self.ss.conf.set('spark.sql.statistics.histogram.enabled', 'true')
+                self.ss.sql('analyze table {} compute statistics for columns {}'.format(self.table, ', '.join(histogram)))
+        finally:
+            self.ss.conf.set('spark.sql.statistics.histogram.enabled', previous)
+
+        rows = self.table_stats()['row_count']
+        return {'mode': 'full', 'processed_files': sorted(files), 'rows_at_full': rows,
+                'rows_since_full': 0,
+                'value_counts': dict((c, self._value_counts(df, c)) for c in self.skew_columns)}
+
+    #-------------------------------------------------------------------------------------------
+    # Incremental refresh - new files only, merged into the catalog statistics
+    #-------------------------------------------------------------------------------------------
+    def _delta_stats(self, delta, columns):
+        exprs = [count(lit(1)).alias('_rows')]
+        for c in columns:
+            exprs += [count(col(c)).alias(c + '__count'), approx_count_distinct(col(c)).alias(c + '__distinct')]
+            if isinstance(delta.schema[c].dataType, RANGE_TYPES):
+                exprs += [min(col(c)).alias(c + '__min'), max(col(c)).alias(c + '__max')]
+        return delta.agg(*exprs).collect()[0].asDict()
+
+    def _merge_column(self, jvm, old, column, delta_row, distinct_exact):
+        rows = delta_row['_rows']
+        nulls = rows - delta_row[column + '__count']
+        old_nulls = _option_value(old.nullCount())
+        old_distinct = _option_value(old.distinctCount())
+        distinct = distinct_exact if distinct_exact is not None else \
+            builtins.max(int(old_distinct.toString()) if old_distinct is not None else 0, delta_row[column + '__distinct'])
+
+        low, high = old.min(), old.max()
+        if delta_row.get(column + '__min') is not None:
+            new_low, new_high = delta_row[column + '__min'], delta_row[column + '__max']
+            low = jvm.scala.Option.apply(str(_widen(_option_value(low), new_low, builtins.min)))
+            high = jvm.scala.Option.apply(str(_widen(_option_value(high), new_high, builtins.max)))
+
+        null_count = jvm.scala.Option.apply(jvm.scala.math.BigInt.apply(
+            (int(old_nulls.toString()) if old_nulls is not None else 0) + nulls))
+        return old.copy(jvm.scala.Option.apply(jvm.scala.math.BigInt.apply(distinct)), low, high, null_count,
+                        old.avgLen(), old.maxLen(), old.histogram(), old.version())
+
+    def incremental_refresh(self, state, files, new_files):
+        jvm = self.ss._jvm
+        catalog, ident = _catalog(self.ss), _identifier(self.ss, self.table)
+        if not state.get('catalog_stats'):
+            return self.full_refresh(files)
+        old_stats = _stats_restore(self.ss, self.table, state['catalog_stats'])
+
+        delta = read_table_files(self.ss, self.table, new_files)
+        columns = [c for c in self._stat_columns(delta) if old_stats.colStats().contains(c)]
+        delta_row = self._delta_stats(delta, columns)
+
+        value_counts = state.get('value_counts', {})
+        for c in self.skew_columns:
+            counts = value_counts.setdefault(c, {})
+            for value, n in self._value_counts(delta, c).items():
+                counts[value] = counts.get(value, 0) + n
+
+        col_stats = old_stats.colStats()
+        for c in columns:
+            exact = len(value_counts[c]) - (NULL_KEY in value_counts[c]) if c in value_counts else None
+            merged = self._merge_column(jvm, col_stats.apply(c), c, delta_row, exact)
+            col_stats = col_stats.updated(c, merged)
+
+        rows = int(old_stats.rowCount().get().toString()) + delta_row['_rows']
+        new_stats = old_stats.copy(jvm.scala.math.BigInt.apply(sum_bytes(files)),
+                                   jvm.scala.Option.apply(jvm.scala.math.BigInt.apply(rows)), col_stats)
+        catalog.alterTableStats(ident, jvm.scala.Option.apply(new_stats))
+
+        state.update(mode='incremental', processed_files=sorted(files), value_counts=value_counts,
+                     rows_since_full=state.get('rows_since_full', 0) + delta_row['_rows'])
+        return state
+
+    #-------------------------------------------------------------------------------------------
+    # Entry points
+    #-------------------------------------------------------------------------------------------
+    def refresh(self):
+        self.ss.catalog.refreshTable(self.table)
+        files = set(self.ss.table(self.table).inputFiles())
+        state = self.read_state()
+        processed = set(state['processed_files']) if state else set()
+        new_files = sorted(files - processed)
+
+        if state is None or not processed <= files:
+            state = self.full_refresh(files)
+        elif not new_files:
+            return self.table_stats()
+        elif state['rows_since_full'] >= self.full_refresh_ratio * (state['rows_at_full'] or 0):
+            state = self.full_refresh(files)
+        else:
+            state = self.incremental_refresh(state, files, new_files)
+        state['catalog_stats'] = _stats_snapshot(self.ss, self.table)
+        self._write_state(state)
+        self.ss.catalog.refreshTable(self.table)
+        summary = self.table_stats()
+        print("{} statistics for {}: {} rows, {} bytes".format(state['mode'], self.table,
+                                                               summary['row_count'], summary['size_bytes']))
+        return summary
+
+    def table_stats(self):
+        stats = _option_value(_catalog(self.ss).getTableMetadata(_identifier(self.ss, self.table)).stats())
+        if stats is None:
+            return {'size_bytes': None, 'row_count': None}
+        rows = _option_value(stats.rowCount())
+        return {'size_bytes': int(stats.sizeInBytes().toString()),
+                'row_count': int(rows.toString()) if rows is not None else None}
+
+    def skew_report(self, column, top=10):
+        state = self.read_state() or {}
+        counts = state.get('value_counts', {}).get(column, {})
+        total = float(builtins.sum(counts.values())) or 1.0
+        heavy = sorted(counts.items(), key=lambda kv: -kv[1])[:top]
+        return [(value, n, round(n / total, 4)) for value, n in heavy]
+
+
+def _widen(old_value, new_value, pick):
+    # Catalog min/max are strings; dates/timestamps compare as ISO strings, numbers as numbers
+    if old_value is None:
+        return new_value
+    if isinstance(new_value, (int, float)) or new_value.__class__.__name__ == 'Decimal':
+        return pick(type(new_value)(old_value), new_value)
+    return pick(old_value, str(new_value))
+
+
+def save_table_with_stats(df, table, stats, mode='append', fmt=None, **options):
+    writer = df.write.mode(mode).options(**options)
+    if fmt:
+        writer = writer.format(fmt)
+    writer.saveAsTable(table)
+    return stats.refresh()
+
+
+if __name__ == "__main__":
+    from PySpark_Session import get_session
+
+    ss = get_session('TableStats', hive=True)
+    enable_cbo(ss)
+
+    car_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/car_sales_information.json'
+    carDf = ss.read.format('json').option('inferSchema', 'true').load(car_file)
+
+    ss.sql('create database if not exists intellipaat')
+    stats = TableStats(ss, 'intellipaat.car_table',
+                       columns=['product_name', 'quantity_sold', 'country_sold_in', 'model_year'],
+                       histogram_columns=['quantity_sold'], skew_columns=['country_sold_in'])
+    for i in range(3):
+        print(save_table_with_stats(carDf, 'intellipaat.car_table', stats))
+    print(stats.skew_report('country_sold_in'))
+    print(describe_column(ss, 'intellipaat.car_table', 'quantity_sold'))
+    ss.sql("select country_sold_in, count(*) from intellipaat.car_table where quantity_sold > 100000 group by country_sold_in").explain(True)
@@ -0,0 +1,171 @@
+from pyspark.sql.types import StructType, StructField, IntegerType, StringType, DoubleType
+from pyspark.sql.functions import col, to_date
+import codecs
+import os
+
+#-----------------------------------------------------------------------------------------------
+'''
+Streaming UTF-16 -> UTF-8 transcoding ingest
+--------------------------------------------
+sampledata/businesses_plus.csv is UTF-16 BE with a BOM (bytes FE FF). sc.textFile() and the CSV
+reader assume UTF-8 and split on the single byte "\n", so every character comes out with a NUL
+next to it.
+
+How this ingest works:
+1. detect_encoding() reads only the first 4 bytes and matches the BOM.
+2. The file is cut into byte ranges (splits), aligned to the code unit size (2 bytes for UTF-16).
+3. Every partition seeks to its own range and reads it in small blocks. A split owns each line
+   that STARTS inside it (same rule as Hadoop's LineRecordReader), so lines crossing a split
+   boundary are read completely by exactly one partition.
+4. Lines are decoded to Python (unicode) strings and handed to ss.read.csv(<RDD of strings>),
+   which parses them with an explicit schema and writes typed Parquet.
+
+Nothing is ever loaded into memory in one go - memory per task is one block + one line.
+The file has to be readable from every executor (local mode, NFS, or a mounted volume).
+Quoted fields containing newlines are not supported (same as sc.textFile).
+'''
+#-----------------------------------------------------------------------------------------------
+
+# (BOM, codec, code unit size) - longest BOMs first, UTF-32 LE starts with the UTF-16 LE BOM
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32-le', 4),
+    (codecs.BOM_UTF32_BE, 'utf-32-be', 4),
+    (codecs.BOM_UTF8, 'utf-8', 1),
+    (codecs.BOM_UTF16_LE, 'utf-16-le', 2),
+    (codecs.BOM_UTF16_BE, 'utf-16-be', 2),
+]
+
+BLOCK_SIZE = 1024 * 1024
+
+
+def detect_encoding(path, default='utf-8'):
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    for bom, codec, unit in BOMS:
+        if head.startswith(bom):
+            return codec, len(bom), unit
+    return default, 0, 1
+
+
+def compute_splits(path, split_bytes=64 * 1024 * 1024, bom_len=0, unit=1):
+    size = os.path.getsize(path)
+    split_bytes = max(split_bytes - split_bytes % unit, unit)
+    splits = []
+    start = bom_len
+    while start < size:
+        end = min(start + split_bytes, size)
+        splits.append((start, end))
+        start = end
+    return splits
+
+
+def read_split_lines(path, start, end, codec, bom_len, unit, block_size=BLOCK_SIZE):
+    newline = '\n'.encode(codec)
+    block_size = max(block_size - block_size % unit, unit)
+
+    def find_newline(buf, pos):
+        # A match has to start on a code unit boundary (0x0A00 inside a UTF-16 char is not a newline)
+        i = buf.find(newline, pos)
+        while i != -1 and i % unit:
+            i = buf.find(newline, i + 1)
+        return i
+
+    with open(path, 'rb') as f:
+        # Non-first splits back up one code unit and drop everything up to the first newline.
+        # If the previous split ended exactly on a newline, this split starts on a new line.
+        if start > bom_len:
+            f.seek(start - unit)
+            line_start = start - unit
+            skip_first = True
+        else:
+            f.seek(start)
+            line_start = start
+            skip_first = False
+
+        buf = b''
+        eof = False
+        while not eof:
+            block = f.read(block_size)
+            if not block:
+                eof = True
+            buf += block
+            pos = 0
+            while True:
+                i = find_newline(buf, pos)
+                if i == -1:
+                    break
+                line = buf[pos:i]
+                if skip_first:
+                    skip_first = False
+                else:
+                    if line_start >= end:
+                        return
+                    yield line.decode(codec).rstrip('\r')
+                line_start += i + len(newline) - pos
+                pos = i + len(newline)
+            buf = buf[pos:]
+            if line_start >= end:
+                return
+        # Last line of the file without a trailing newline
+        if buf and not skip_first and line_start < end:
+            yield buf.decode(codec).rstrip('\r')
+
+
+def transcoded_lines(sc, path, split_bytes=64 * 1024 * 1024, block_size=BLOCK_SIZE):
+    codec, bom_len, unit = detect_encoding(path)
+    splits = compute_splits(path, split_bytes, bom_len, unit)
+    return sc.parallelize(splits, len(splits)) \
+             .flatMap(lambda s: read_split_lines(path, s[0], s[1], codec, bom_len, unit, block_size))
+
+
+def ingest_to_parquet(ss, path, out_path, schema=None, split_bytes=64 * 1024 * 1024, mode='overwrite'):
+    lines = transcoded_lines(ss.sparkContext, path, split_bytes)
+    reader = ss.read.option('header', 'true')
+    if schema is not None:
+        reader = reader.schema(schema)
+    else:
+        reader = reader.option('inferSchema', 'true')
+    df = reader.csv(lines)
+    df.write.format('parquet').mode(mode).save(out_path)
+    return df
+
+
+business_schema = StructType(
+    [
+        StructField("business_id", IntegerType(), True),
+        StructField("name", StringType(), True),
+        StructField("address", StringType(), True),
+        StructField("city", StringType(), True),
+        StructField("postal_code", StringType(), True),
+        StructField("latitude", DoubleType(), True),
+        StructField("longitude", DoubleType(), True),
+        StructField("phone_number", StringType(), True),
+        StructField("TaxCode", StringType(), True),
+        StructField("business_certificate", IntegerType(), True),
+        StructField("application_date", StringType(), True),
+        StructField("owner_name", StringType(), True),
+        StructField("owner_address", StringType(), True),
+        StructField("owner_city", StringType(), True),
+        StructField("owner_state", StringType(), True),
+        StructField("owner_zip", StringType(), True)
+    ]
+)
+
+
+if __name__ == "__main__":
+    from PySpark_Session import get_session
+
+    ss = get_session('TranscodeIngest')
+
+    business_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/businesses_plus.csv'
+    out_file = '/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/OutputFile/businesses_plus_parquet'
+
+    print("Detected encoding: ", detect_encoding(business_file))
+
+    # Small splits just to see more than one partition on the sample file
+    businessDf = ingest_to_parquet(ss, business_file, out_file, business_schema, split_bytes=512 * 1024)
+    df1 = ss.read.format('parquet').load(out_file) \
+            .withColumn('application_date', to_date(col('application_date'), 'MM/dd/yyyy'))
+    df1.printSchema()
+    df1.show(5)
+    print("Rows ingested: ", df1.count())
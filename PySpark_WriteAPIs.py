@@ -1,9 +1,13 @@
 from pyspark import SparkConf, SparkContext
 from pyspark.sql import SparkSession
 
-conf = SparkConf().setAppName('WriteAPIs').setMaster('local')
-sc = SparkContext(conf=conf)
-ss = SparkSession.builder.appName('WriteAPIs').master('local').getOrCreate()
+from PySpark_Session import get_session
+
+# conf = SparkConf().setAppName('WriteAPIs').setMaster('local')
+# sc = SparkContext(conf=conf)
+# ss = SparkSession.builder.appName('WriteAPIs').master('local').getOrCreate()
+ss = get_session('WriteAPIs')
+sc = ss.sparkContext
 
 #-----------------------------------------------------------------------------------------------
 # Writing to files - RDD
@@ -63,3 +67,14 @@ df2 = df1.select('product_name','country_sold_in','quantity_sold','region_sold_i
 # df3 = ss.read.format('parquet').option('inferSchema','true').load("/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/IntellipaatSpark/OutputFile/car_sales_information_out/country_sold_in=*/region_sold_in=*/part-*")
 # print(df3.count())
 
+
+
+#-----------------------------------------------------------------------------------------------
+# Clustered writes - sort (linear) or Z-order rows before writing so that Parquet min/max
+# statistics per file and per row group are tight (see PySpark_ClusteredWrite.py)
+#-----------------------------------------------------------------------------------------------
+# from PySpark_ClusteredWrite import write_clustered, row_groups_skipped
+# df4 = df1.withColumn('model_year', col('model_year').cast('int'))
+# write_clustered(df4, out_file, ['quantity_sold','model_year'], mode='zorder', num_files=8)
+# print(row_groups_skipped(out_file, [('quantity_sold', 100001, None)]))
+# ss.read.format('parquet').load(out_file).filter(col('quantity_sold') > 100000).show()
@@ -3,9 +3,13 @@ from pyspark.sql import SparkSession
 from pyspark.sql.types import StructType, StructField
 from pyspark.sql.types import DataType, IntegerType, DecimalType, StringType, DateType
 
-conf = SparkConf().setAppName('ConvertCsvToParquet').setMaster('local')
-sc = SparkContext(conf=conf)
-spark = SparkSession.builder.master('local').getOrCreate()
+from PySpark_Session import get_session
+
+# conf = SparkConf().setAppName('ConvertCsvToParquet').setMaster('local')
+# sc = SparkContext(conf=conf)
+# spark = SparkSession.builder.master('local').getOrCreate()
+spark = get_session('ConvertCsvToParquet')
+sc = spark.sparkContext
 
 input_file_name = "/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/covid-19_patients_data_ORIG.csv"
 output_file_name = "/Users/soumyadeepdey/HDD_Soumyadeep/TECHNICAL/Training/Intellipaat/PySparkCodes/sampledata/covid-19_patients_data.parquet"